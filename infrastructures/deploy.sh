@@ -131,6 +131,7 @@ build_deploy() {
         TaskNameRegisterTasksPages="RegisterTasksPages${env^}" \
         TaskNameScrapingAbstract="ScrapingAbstract${env^}" \
         TaskNameScrapingDetail="ScrapingDetail${env^}" \
+        TaskNameBackfillGeocode="BackfillGeocode${env^}" \
         ArnAcmSslCertficateTokyo=$(get_certificated_arn "ap-northeast-1") \
         ArnAcmSslCertficateUsEast=$(get_certificated_arn "us-east-1") \
         ParameterStoreNameLineNotifyRestaurants="${PARAMETER_STORE_NAME_LINE_NOTIFY_RESTAURANTS}" \
@@ -143,8 +144,13 @@ build_deploy() {
         Domain="${DOMAIN}" \
         FrontendBasicAuthorization=$(get_basic_authorization) \
         S3BucketPrefix="$S3_BUCKET_PREFIX" \
+        ProfileSampleRate="${PROFILE_SAMPLE_RATE:-0}" \
         LambdaLayerHotpepperApiClient=${outputs["ArnHotpepperApiClient"]} \
-        LambdaLayerDbClient=${outputs["ArnDbClient"]}
+        LambdaLayerDbClient=${outputs["ArnDbClient"]} \
+        LambdaLayerHtmlParser=${outputs["ArnHtmlParser"]} \
+        LambdaLayerObservability=${outputs["ArnObservability"]} \
+        LambdaLayerGeo=${outputs["ArnGeo"]} \
+        LambdaLayerApiResponse=${outputs["ArnApiResponse"]}
 }
 
 # デプロイ処理
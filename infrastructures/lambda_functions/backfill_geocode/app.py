@@ -0,0 +1,564 @@
+import boto3
+import os
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+from db_client import DbClient
+from detail_document import DetailDocuments
+from address import normalize_address
+from geocoder import Geocoder
+from gazetteer import Gazetteer
+from grid import cell_id
+from tile_cache import TileCache
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
+
+
+class Restaurant(BaseModel):
+    """
+    緯度経度が未設定の飲食店構造体
+    """
+    id: str
+    address: str
+
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Scraping")
+
+# 住所から緯度経度の取得
+GEOCODER = Geocoder(
+    os.environ["NAME_TABLE_GCP_ADDRESS"],
+    os.environ["PARAMETER_STORE_NAME_GCP_API_KEY"],
+    gazetteer=Gazetteer.open(),
+)
+
+# 飲食店一覧のキャッシュ（無効化のみ）
+TILE_CACHE = TileCache(os.environ.get("NAME_TABLE_TILE_CACHE"))
+
+# 詳細のドキュメント（削除のみ）
+DETAIL_DOCUMENTS = DetailDocuments(
+    os.environ["NAME_BUCKET_FRONTEND"], os.environ["PREFIX_DETAILS"]
+)
+
+# 1回の取得で処理する飲食店の件数
+PAGE_SIZE = 500
+
+# 1回のUPDATEで更新する飲食店の件数
+UPDATE_CHUNK_SIZE = 100
+
+# 残り時間がこれを下回ったら次のページに進まない（ミリ秒）
+REMAINING_TIME_MARGIN = 120 * 1000
+
+# エラー通知に含める失敗住所の最大件数（全件はupdate_tasksに保存する）
+FAILED_ADDRESSES_MAX = 10
+
+# 失敗した飲食店を再試行中のチェックポイントの接頭辞
+CHECKPOINT_RETRY_PREFIX = "retry:"
+
+
+class RateLimiter:
+    """
+    スレッド間で共有する秒間リクエスト数の制限
+    """
+
+    def __init__(self, qps: float):
+        self._interval = 1 / qps
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """
+        次のリクエストを送ってよい時刻まで待つ
+        """
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next, now)
+            self._next = at + self._interval
+        if at > now:
+            time.sleep(at - now)
+
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
+def lambda_handler(event, context):
+
+    try:
+        # チェックポイントから再開（失敗した飲食店の再試行中は接頭辞付き）
+        checkpoint = get_checkpoint()
+        is_retry = checkpoint.startswith(CHECKPOINT_RETRY_PREFIX)
+        cursor = checkpoint.removeprefix(CHECKPOINT_RETRY_PREFIX)
+
+        limiter = RateLimiter(float(os.environ["GEOCODE_QPS"]))
+        failed: dict[str, Restaurant] = {}
+        api_calls = 0
+        is_finished = False
+        while context.get_remaining_time_in_millis() > REMAINING_TIME_MARGIN:
+
+            # 緯度経度が未設定の飲食店を取得
+            if is_retry:
+                restaurants = get_failed_restaurants(cursor)
+            else:
+                restaurants = get_restaurants(cursor)
+            if len(restaurants) == 0:
+                if is_retry:
+                    is_finished = True
+                    break
+
+                # 全件を処理したら、失敗した飲食店を先頭から1回ずつ再試行する
+                is_retry = True
+                cursor = ""
+                continue
+
+            # 緯度経度を取得して更新
+            misses, page_failed = backfill(restaurants, limiter)
+            api_calls += misses
+
+            # 失敗した飲食店を保存し、再試行で取得できた飲食店は削除
+            # （チェックポイントを進めても、全件の処理後・次回の実行で再試行される）
+            failed_ids = {r.id for r in page_failed}
+            if is_retry:
+                succeeded = [r.id for r in restaurants if r.id not in failed_ids]
+                delete_failed(succeeded)
+                for id in succeeded:
+                    failed.pop(id, None)
+            else:
+                put_failed(sorted(failed_ids))
+            failed.update((r.id, r) for r in page_failed)
+
+            # チェックポイントの保存
+            cursor = restaurants[-1].id
+            put_checkpoint(f"{CHECKPOINT_RETRY_PREFIX if is_retry else ''}{cursor}")
+
+        if is_finished:
+            # 完了したらチェックポイントとスケジュールを削除
+            # 再試行でも失敗した飲食店は残し、次回の実行で再試行する
+            delete_resolved_failed()
+            delete_checkpoint()
+            delete_schedule()
+        else:
+            # 続きは次回の起動で処理
+            register_schedule(context.invoked_function_arn)
+
+        STAGE_TIMER.put_metric("geocode_api_calls", api_calls)
+
+        # 取得できなかった住所はまとめて通知
+        if len(failed) > 0:
+            addresses = "\n".join(
+                f"{r.id} {r.address}" for r in list(failed.values())[:FAILED_ADDRESSES_MAX]
+            )
+            raise Exception(
+                f"緯度経度の取得に失敗。{len(failed)}件（update_tasksに保存し再試行）\n{addresses}"
+            )
+
+    except Exception as e:
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        put_geocode_metrics()
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
+
+    return {
+        "statusCode": 200,
+        "body": "Process Complete",
+    }
+
+
+def get_checkpoint() -> str:
+    """
+    チェックポイント（処理済みの最後の飲食店ID）を取得
+
+    Returns
+    -------
+    str
+        なければ空文字
+    """
+    sql = f"""
+SELECT
+    param
+FROM
+    update_tasks
+WHERE
+    kind = ?
+LIMIT
+    1;
+"""
+    params = [os.environ["NAME_TASK_BACKFILL_GEOCODE_DB"]]
+    with STAGE_TIMER.stage("database"):
+        res = DB_CLIENT.select(sql, params)
+
+    if len(res["data"]) == 0:
+        return ""
+
+    return res["data"][0]["param"]
+
+
+def put_checkpoint(cursor: str) -> None:
+    """
+    チェックポイントの保存
+
+    Parameters
+    ----------
+    cursor: str
+        処理済みの最後の飲食店ID（再試行中はCHECKPOINT_RETRY_PREFIXを付ける）
+    """
+    delete_checkpoint()
+
+    sql = f"""
+INSERT INTO
+    update_tasks(kind, param)
+VALUES
+    (?, ?);
+"""
+    params = [os.environ["NAME_TASK_BACKFILL_GEOCODE_DB"], cursor]
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+
+def delete_checkpoint() -> None:
+    """
+    チェックポイントの削除
+    """
+    sql = f"""
+DELETE FROM
+    update_tasks
+WHERE
+    kind = ?;
+"""
+    params = [os.environ["NAME_TASK_BACKFILL_GEOCODE_DB"]]
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+
+def get_restaurants(cursor: str) -> list[Restaurant]:
+    """
+    緯度経度が未設定の飲食店を取得
+
+    Parameters
+    ----------
+    cursor: str
+        処理済みの最後の飲食店ID
+
+    Returns
+    -------
+    list[Restaurant]
+    """
+    sql = f"""
+SELECT
+    id,
+    address
+FROM
+    restaurants
+WHERE
+    id > ?
+    AND address IS NOT NULL
+    AND address <> ''
+    AND (latitude IS NULL OR latitude = 0)
+ORDER BY
+    id ASC
+LIMIT
+    ?;
+"""
+    params = [cursor, PAGE_SIZE]
+    with STAGE_TIMER.stage("database"):
+        res = DB_CLIENT.select(sql, params)
+
+    return [Restaurant(**r) for r in res["data"]]
+
+
+def get_failed_restaurants(cursor: str) -> list[Restaurant]:
+    """
+    緯度経度の取得に失敗し、まだ未設定の飲食店を取得
+
+    Parameters
+    ----------
+    cursor: str
+        再試行済みの最後の飲食店ID
+
+    Returns
+    -------
+    list[Restaurant]
+    """
+    sql = f"""
+SELECT
+    r.id,
+    r.address
+FROM
+    update_tasks t
+    INNER JOIN restaurants r ON t.param = r.id
+WHERE
+    t.kind = ?
+    AND t.param > ?
+    AND r.address IS NOT NULL
+    AND r.address <> ''
+    AND (r.latitude IS NULL OR r.latitude = 0)
+ORDER BY
+    t.param ASC
+LIMIT
+    ?;
+"""
+    params = [os.environ["NAME_TASK_BACKFILL_GEOCODE_FAILED_DB"], cursor, PAGE_SIZE]
+    with STAGE_TIMER.stage("database"):
+        res = DB_CLIENT.select(sql, params)
+
+    return [Restaurant(**r) for r in res["data"]]
+
+
+def put_failed(ids: list[str]) -> None:
+    """
+    緯度経度の取得に失敗した飲食店の保存
+
+    Parameters
+    ----------
+    ids: list[str]
+        飲食店ID
+    """
+    if len(ids) == 0:
+        return
+
+    sql = f"""
+INSERT INTO
+    update_tasks (kind, param)
+VALUES
+    {', '.join(['(?, ?)'] * len(ids))}
+ON DUPLICATE KEY UPDATE kind = VALUES(kind), param = VALUES(param);
+"""
+    params = []
+    for id in ids:
+        params.extend([os.environ["NAME_TASK_BACKFILL_GEOCODE_FAILED_DB"], id])
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+
+def delete_failed(ids: list[str]) -> None:
+    """
+    再試行で緯度経度を取得できた飲食店の削除
+
+    Parameters
+    ----------
+    ids: list[str]
+        飲食店ID
+    """
+    if len(ids) == 0:
+        return
+
+    sql = f"""
+DELETE FROM
+    update_tasks
+WHERE
+    kind = ?
+    AND param IN ({', '.join(['?'] * len(ids))});
+"""
+    params = [os.environ["NAME_TASK_BACKFILL_GEOCODE_FAILED_DB"], *ids]
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+
+def delete_resolved_failed() -> None:
+    """
+    失敗した飲食店のうち、他の処理（詳細のスクレイピングなど）で緯度経度が設定されたものを削除
+    """
+    sql = f"""
+DELETE FROM
+    update_tasks
+WHERE
+    kind = ?
+    AND param NOT IN (
+        SELECT
+            id
+        FROM
+            restaurants
+        WHERE
+            address IS NOT NULL
+            AND address <> ''
+            AND (latitude IS NULL OR latitude = 0)
+    );
+"""
+    params = [os.environ["NAME_TASK_BACKFILL_GEOCODE_FAILED_DB"]]
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+
+def backfill(
+    restaurants: list[Restaurant], limiter: RateLimiter
+) -> tuple[int, list[Restaurant]]:
+    """
+    緯度経度を取得して飲食店テーブルを更新
+
+    Parameters
+    ----------
+    restaurants: list[Restaurant]
+        緯度経度が未設定の飲食店
+    limiter: RateLimiter
+        APIの秒間リクエスト数の制限
+
+    Returns
+    -------
+    tuple[int, list[Restaurant]]
+        APIの呼び出し数と、緯度経度を取得できなかった飲食店
+    """
+    # 正規化した住所ごとに飲食店をまとめる
+    groups: dict[str, list[Restaurant]] = {}
+    for r in restaurants:
+        groups.setdefault(normalize_address(r.address), []).append(r)
+
+    # キャッシュから取得
+    with STAGE_TIMER.stage("geocode"):
+        latlngs = GEOCODER.get_cached_latlngs([r.address for r in restaurants])
+
+    # キャッシュになければAPIから並列で取得
+    misses = [k for k in groups if k not in latlngs]
+    failed = []
+    if len(misses) > 0:
+
+        def fetch(address: str) -> dict | None:
+            limiter.wait()
+            try:
+                return GEOCODER.fetch_from_api(address)
+            except Exception:
+                return None
+
+        workers = int(os.environ["GEOCODE_WORKERS"])
+        with STAGE_TIMER.stage("geocode_api"):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(fetch, misses))
+
+        fetched = {}
+        for k, latlng in zip(misses, results):
+            if latlng is None:
+                failed.extend(groups[k])
+                continue
+            fetched[k] = latlng
+
+        # DynamoDBへ保存
+        if len(fetched) > 0:
+            with STAGE_TIMER.stage("dynamodb"):
+                GEOCODER.put_latlngs(fetched)
+        latlngs.update(fetched)
+
+    # 飲食店テーブルの更新
+    rows = [(r.id, latlngs[k]) for k, arr in groups.items() if k in latlngs for r in arr]
+    for i in range(0, len(rows), UPDATE_CHUNK_SIZE):
+        update_restaurants(rows[i : i + UPDATE_CHUNK_SIZE])
+
+    # 飲食店一覧のキャッシュを無効化
+    with STAGE_TIMER.stage("cache"):
+        TILE_CACHE.invalidate([(latlng["lat"], latlng["lng"]) for _, latlng in rows])
+
+    # 緯度経度が変わった詳細のドキュメントを削除（get_restaurant_detailで作り直される）
+    if len(rows) > 0:
+        with STAGE_TIMER.stage("s3"):
+            DETAIL_DOCUMENTS.delete([id for id, _ in rows])
+
+    return len(misses), failed
+
+
+def update_restaurants(rows: list[tuple[str, dict]]) -> None:
+    """
+    飲食店テーブルの緯度経度と範囲検索用のグリッドのセルをまとめて更新
+
+    Parameters
+    ----------
+    rows: list[tuple[str, dict]]
+        飲食店IDと緯度経度の組
+    """
+    cases = " ".join(["WHEN ? THEN ?"] * len(rows))
+    sql = f"""
+UPDATE
+    restaurants
+SET
+    latitude = CASE id {cases} END,
+    longitude = CASE id {cases} END,
+    grid_cell = CASE id {cases} END,
+    version = version + 1,
+    changed_at = NOW(6)
+WHERE
+    id IN ({', '.join(['?'] * len(rows))});
+"""
+    params = []
+    for id, latlng in rows:
+        params.extend([id, latlng["lat"]])
+    for id, latlng in rows:
+        params.extend([id, latlng["lng"]])
+    for id, latlng in rows:
+        params.extend([id, cell_id(latlng["lat"], latlng["lng"])])
+    params.extend([id for id, _ in rows])
+
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+
+def register_schedule(target_arn: str) -> None:
+    """
+    スケジュールの登録
+
+    自身のARNを環境変数で参照すると循環参照になるため、実行中のARNを受け取る
+
+    Parameters
+    ----------
+    target_arn: str
+        このLambdaのARN
+    """
+    payload = {
+        "task": "register",
+        "name": os.environ["NAME_TASK_BACKFILL_GEOCODE"],
+        "target_arn": target_arn,
+        "invoke_role_arn": os.environ["ARN_IAM_ROLE_INVOKE_BACKFILL_GEOCODE"],
+    }
+    with STAGE_TIMER.stage("schedule"):
+        boto3.client("lambda").invoke(
+            FunctionName=os.environ["ARN_LAMBDA_HANDLER_SCHEDULES"],
+            InvocationType="RequestResponse",
+            Payload=json.dumps(payload).encode("utf-8"),
+        )
+
+
+def delete_schedule() -> None:
+    """
+    スケジュールの削除
+    """
+    payload = {"task": "delete", "name": os.environ["NAME_TASK_BACKFILL_GEOCODE"]}
+    with STAGE_TIMER.stage("schedule"):
+        boto3.client("lambda").invoke(
+            FunctionName=os.environ["ARN_LAMBDA_HANDLER_SCHEDULES"],
+            InvocationType="RequestResponse",
+            Payload=json.dumps(payload).encode("utf-8"),
+        )
+
+
+def put_geocode_metrics() -> None:
+    """
+    緯度経度キャッシュのヒット状況を計測値に追加
+    """
+    stats = GEOCODER.stats()
+    GEOCODER.reset_stats()
+
+    # 住所を引いていなければ何もしない
+    if stats["lookups"] == 0:
+        return
+
+    STAGE_TIMER.put_metric("geocode_lookups", stats["lookups"])
+    STAGE_TIMER.put_metric("geocode_lru_hits", stats["lru_hits"])
+    STAGE_TIMER.put_metric("geocode_dynamodb_hits", stats["dynamodb_hits"])
+    STAGE_TIMER.put_metric("geocode_gazetteer_hits", stats["gazetteer_hits"])
+    STAGE_TIMER.put_metric("geocode_hit_rate", stats["hit_rate"], "Percent")
+    STAGE_TIMER.put_metric(
+        "geocode_dynamodb_unprocessed_reads", stats["dynamodb_unprocessed_reads"]
+    )
+    STAGE_TIMER.put_metric(
+        "geocode_dynamodb_unprocessed_writes", stats["dynamodb_unprocessed_writes"]
+    )
@@ -4,6 +4,7 @@ import os
 import time
 from datetime import datetime
 from dataclasses import dataclass, asdict
+from profiler import profile_handler
 
 
 @dataclass
@@ -16,25 +17,41 @@ class EventParams:
     msg: str
 
 
+@profile_handler
 def lambda_handler(event, context):
 
     try:
 
         # パラメータチェック
-        params = EventParams(**event)
+        # ErrorReporterからは{errors, dropped}でまとめて送られる。1件ずつの形式も受け付ける
+        if "errors" in event:
+            errors = [EventParams(**e) for e in event["errors"]]
+        else:
+            errors = [EventParams(**event)]
+        dropped = event.get("dropped", 0)
 
         # メッセージ内容
-        msg = f"""
+        msgs = [
+            f"""
 {params.msg}
 
 関数名：{params.function_name}
 イベント：{json.dumps(asdict(params))}
 """
-
-        # ログ記載
-        write_log(params.function_name, msg)
-
-        # line_notifyの実行
+            for params in errors
+        ]
+
+        # 関数ごとにログ記載
+        for function_name in dict.fromkeys(params.function_name for params in errors):
+            write_log(
+                function_name,
+                [m for params, m in zip(errors, msgs) if params.function_name == function_name],
+            )
+
+        # line_notifyの実行（まとめて1回）
+        msg = "".join(msgs)
+        if dropped > 0:
+            msg += f"\nほか{dropped}件のエラーは省略\n"
         line_notify(msg)
 
     except Exception as e:
@@ -47,7 +64,7 @@ def lambda_handler(event, context):
     }
 
 
-def write_log(function_name: str, msg: str) -> None:
+def write_log(function_name: str, msgs: list[str]) -> None:
     """
     CloudWatchログに記載
 
@@ -55,7 +72,7 @@ def write_log(function_name: str, msg: str) -> None:
     ----------
         function_name: str
             エラーが発生したLambda関数名
-        msg: str
+        msgs: list[str]
             メッセージ
     """
     # Boto3 クライアント
@@ -77,7 +94,9 @@ def write_log(function_name: str, msg: str) -> None:
     logs.put_log_events(
         logGroupName=os.environ["NAME_CLOUDWATCH_LOG_GROUP"],
         logStreamName=function_name,
-        logEvents=[{"timestamp": int(time.time()) * 1000, "message": msg}],
+        logEvents=[
+            {"timestamp": int(time.time()) * 1000, "message": msg} for msg in msgs
+        ],
     )
 
 
@@ -0,0 +1,232 @@
+import boto3
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from db_client import DbClient
+from snapshot import HEADER, build, read_version
+from tile_pyramid import digest, render
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
+
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Snapshot")
+
+# 1回の取得件数
+PAGE_SIZE = 5000
+
+# タイルを保存するキーの接頭辞
+PREFIX_TILES = os.environ["PREFIX_TILES"]
+
+# タイルの一覧（パス → ハッシュ）を保存するキー
+KEY_TILES_MANIFEST = f"{PREFIX_TILES}manifest.json"
+
+# タイルのブラウザ・CDNでのキャッシュ期間（秒）
+TILE_MAX_AGE = 300
+
+# タイルを並列で保存する数
+UPLOAD_WORKERS = 16
+
+# delete_objectsで一度に削除できる最大件数
+DELETE_MAX = 1000
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
+def lambda_handler(event, context):
+
+    try:
+        # 完了済みの飲食店を取得
+        restaurants = get_restaurants()
+
+        # スナップショットを作成し、内容が変わった場合のみS3へ保存
+        # （バージョン・ETagが変わらなければ、APIの再読み込み・キャッシュの無効化が起きない）
+        with STAGE_TIMER.stage("build"):
+            body = build(restaurants)
+        uploaded = export_snapshot(body)
+        STAGE_TIMER.put_metric("snapshot_restaurants", len(restaurants))
+        STAGE_TIMER.put_metric("snapshot_uploaded", int(uploaded))
+
+        # タイルピラミッドを作成し、変更されたタイルのみS3（フロントエンド）へ保存
+        with STAGE_TIMER.stage("tiles"):
+            tiles = render(restaurants)
+        uploaded, deleted = export_tiles(tiles)
+        STAGE_TIMER.put_metric("tiles_total", len(tiles))
+        STAGE_TIMER.put_metric("tiles_uploaded", uploaded)
+        STAGE_TIMER.put_metric("tiles_deleted", deleted)
+
+    except Exception as e:
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
+
+    return {
+        "statusCode": 200,
+        "body": "Process Complete",
+    }
+
+
+def get_restaurants() -> list[dict]:
+    """
+    完了済みの飲食店を取得
+
+    Returns
+    -------
+    list[dict]
+    """
+    sql = """
+SELECT
+    r.id,
+    r.name,
+    r.latitude,
+    r.longitude,
+    g.name AS genre_name,
+    r.parking,
+    r.is_thumbnail,
+    r.open_slots
+FROM
+    restaurants r
+    INNER JOIN genre_master g ON r.genre_code = g.code
+WHERE
+    r.is_complete = 1
+    AND r.grid_cell IS NOT NULL
+    AND r.id > ?
+ORDER BY
+    r.id ASC
+LIMIT
+    ?;
+"""
+
+    # IDの順にページごとに取得
+    results = []
+    cursor = ""
+    while True:
+        with STAGE_TIMER.stage("database"):
+            res = DB_CLIENT.select(sql, [cursor, PAGE_SIZE])
+        results.extend(res["data"])
+        if len(res["data"]) < PAGE_SIZE:
+            break
+        cursor = res["data"][-1]["id"]
+
+    return results
+
+
+def export_snapshot(body: bytes) -> bool:
+    """
+    保存済みのスナップショットとバージョン（内容のハッシュ）が異なる場合のみ保存
+
+    Parameters
+    ----------
+    body: bytes
+        スナップショット
+
+    Returns
+    -------
+    bool
+        保存したか
+    """
+    s3 = boto3.client("s3")
+    bucket = os.environ["NAME_BUCKET_DATA"]
+    key = os.environ["KEY_SNAPSHOT_RESTAURANTS"]
+
+    # 保存済みのバージョン（ヘッダーのみ取得）
+    with STAGE_TIMER.stage("s3"):
+        try:
+            res = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{HEADER.size - 1}")
+            current = read_version(res["Body"].read())
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            current = None
+
+    if current == read_version(body):
+        return False
+
+    with STAGE_TIMER.stage("s3") as st:
+        s3.put_object(Bucket=bucket, Key=key, Body=body)
+        st.add_bytes(len(body))
+
+    return True
+
+
+def export_tiles(tiles: dict[str, bytes]) -> tuple[int, int]:
+    """
+    前回の一覧と比べ、変更されたタイルを保存し、なくなったタイルを削除
+
+    Parameters
+    ----------
+    tiles: dict[str, bytes]
+        タイルのパス → 内容
+
+    Returns
+    -------
+    tuple[int, int]
+        保存した件数, 削除した件数
+    """
+    s3 = boto3.client("s3")
+    bucket = os.environ["NAME_BUCKET_FRONTEND"]
+
+    # 前回の一覧
+    with STAGE_TIMER.stage("s3"):
+        try:
+            res = s3.get_object(Bucket=bucket, Key=KEY_TILES_MANIFEST)
+            manifest = json.loads(res["Body"].read())
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            manifest = {}
+
+    digests = {path: digest(body) for path, body in tiles.items()}
+    changed = [path for path, d in digests.items() if manifest.get(path) != d]
+    removed = [path for path in manifest if path not in digests]
+
+    def upload(path: str) -> None:
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"{PREFIX_TILES}{path}",
+            Body=tiles[path],
+            ContentType="application/geo+json",
+            CacheControl=f"public, max-age={TILE_MAX_AGE}",
+        )
+
+    with STAGE_TIMER.stage("s3") as st:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            list(executor.map(upload, changed))
+        st.add_bytes(sum(len(tiles[path]) for path in changed))
+
+        for i in range(0, len(removed), DELETE_MAX):
+            s3.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    "Objects": [
+                        {"Key": f"{PREFIX_TILES}{path}"}
+                        for path in removed[i : i + DELETE_MAX]
+                    ],
+                    "Quiet": True,
+                },
+            )
+
+        # 保存が済んでから一覧を更新する（途中で失敗した場合は次回に再度保存される）
+        s3.put_object(
+            Bucket=bucket,
+            Key=KEY_TILES_MANIFEST,
+            Body=json.dumps(digests, separators=(",", ":")).encode("utf-8"),
+            ContentType="application/json",
+            CacheControl="no-store",
+        )
+
+    return len(changed), len(removed)
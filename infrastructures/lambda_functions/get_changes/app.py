@@ -0,0 +1,289 @@
+import os
+import json
+import base64
+from pydantic import BaseModel, ValidationError
+from db_client import DbClient
+from response_encoder import negotiate, request_body, serialize, set_body
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
+
+
+class EventParams(BaseModel):
+    """
+    イベントパラメータ
+    """
+
+    # 前回の応答のカーソル。未指定なら最初から
+    cursor: str | None = None
+
+    # 1ページの最大件数
+    limit: int = 500
+
+
+# 1ページの最大件数の上限
+CHANGES_LIMIT_MAX = 1000
+
+# これより新しい変更は返さない（秒）
+# 同時に書き込まれた変更が、後からカーソルより前の時刻で見えるようになるのを避ける
+CHANGES_SETTLE_SECONDS = 5
+
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Api")
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
+def lambda_handler(event, context):
+
+    response = {
+        "statusCode": 200,
+        "headers": {"Access-Control-Allow-Origin": "null"},
+        "body": "NG",
+    }
+
+    try:
+        # オリジンの設定
+        origin = set_origin(event)
+        if origin is None:
+            return response
+        response["headers"]["Access-Control-Allow-Origin"] = origin
+
+        # パラメータの取得
+        evt = get_params(event)
+
+        # カーソル以降の変更を取得
+        data = get_changes(evt)
+
+        # 応答の形式と圧縮方式
+        media_type, encoding = negotiate(event["headers"])
+        with STAGE_TIMER.stage("compress") as st:
+            set_body(response, serialize(data, media_type), media_type, encoding)
+            st.add_bytes(len(response["body"]))
+    except Exception as e:
+        response["statusCode"] = 500
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
+
+    return response
+
+
+def set_origin(evt: dict) -> str | None:
+    """
+    オリジンの取得
+
+    Parameters
+    ----------
+    evt: dict
+        イベントパラメータ
+
+    Returns
+    -------
+    str
+        オリジン名。不正ならNone
+    """
+    allowed_origins = os.environ["FRONTEND_DOMAIN"].split(",")
+
+    # Lambda単体のテストやコマンドライン対策
+    if "headers" not in evt:
+        return None
+
+    # 許可されていないオリジンであれば終了
+    origin = evt["headers"].get("origin", "")
+    if origin not in allowed_origins:
+        return None
+
+    return origin
+
+
+def get_params(evt: dict) -> EventParams:
+    """
+    パラメータの検証
+
+    Parameters
+    ----------
+    evt: dict
+        イベントパラメータ
+
+    Returns
+    -------
+    EventParams
+    """
+    # bodyがなければエラー
+    if "body" not in evt:
+        raise Exception(
+            f"イベントパラメータにbodyがない。パラメータ：{json.dumps(evt)}"
+        )
+
+    body = json.loads(request_body(evt))
+
+    try:
+        params = EventParams(**body)
+    except ValidationError as e:
+        raise Exception(f"{str(e.json())}")
+
+    if params.limit < 1 or CHANGES_LIMIT_MAX < params.limit:
+        raise Exception(f"limitは1〜{CHANGES_LIMIT_MAX}で指定。limit：{params.limit}")
+    if params.cursor is not None:
+        decode_cursor(params.cursor)
+
+    return params
+
+
+def get_changes(evt: EventParams) -> dict:
+    """
+    カーソル以降に変更された飲食店を変更の順に1ページ分取得
+
+    掲載が終了した飲食店は{id, deleted: true}のみを返す
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    dict
+        items: list[dict] 変更された飲食店
+        cursor: str 次に指定するカーソル（変更がなければ指定されたカーソルのまま）
+        has_more: bool 続きがあるか
+    """
+    after = None if evt.cursor is None else decode_cursor(evt.cursor)
+
+    # 続きがあるかを判定するため1件多く取得
+    with STAGE_TIMER.stage("database"):
+        rows = select_changes(after, evt.limit + 1)
+
+    has_more = len(rows) > evt.limit
+    rows = rows[: evt.limit]
+
+    items = []
+    for r in rows:
+        if r["is_closed"]:
+            items.append({"id": r["id"], "deleted": True})
+            continue
+        items.append(
+            {
+                "id": r["id"],
+                "name": r["name"],
+                "latitude": float(r["latitude"]),
+                "longitude": float(r["longitude"]),
+                "genre_name": r["genre_name"],
+                "parking": r["parking"],
+                "is_thumbnail": r["is_thumbnail"],
+                "deleted": False,
+            }
+        )
+
+    cursor = evt.cursor
+    if len(rows) > 0:
+        cursor = encode_cursor(rows[-1]["changed_at"], rows[-1]["id"])
+
+    return {"items": items, "cursor": cursor, "has_more": has_more}
+
+
+def select_changes(after: tuple[str, str] | None, limit: int) -> list[dict]:
+    """
+    変更日時・IDの順に、カーソルより後の変更を取得
+
+    詳細の取得が済んでいない飲食店は含めない（掲載終了は含める）
+
+    Parameters
+    ----------
+    after: tuple[str, str] | None
+        前のページの最後の変更日時とID。Noneなら最初から
+    limit: int
+        最大件数
+
+    Returns
+    -------
+    list[dict]
+    """
+    where = ""
+    params = [CHANGES_SETTLE_SECONDS]
+    if after is not None:
+        where = "AND (r.changed_at > ? OR (r.changed_at = ? AND r.id > ?))"
+        params.extend([after[0], after[0], after[1]])
+    params.append(limit)
+
+    # SQL
+    sql = f"""
+SELECT
+    r.id,
+    r.name,
+    r.latitude,
+    r.longitude,
+    g.name AS genre_name,
+    r.parking,
+    r.is_thumbnail,
+    r.is_closed,
+    DATE_FORMAT(r.changed_at, '%Y-%m-%d %H:%i:%s.%f') AS changed_at
+FROM
+    restaurants r
+    LEFT JOIN genre_master g ON r.genre_code = g.code
+WHERE
+    (r.is_complete = 1 OR r.is_closed = 1)
+    AND r.changed_at < NOW(6) - INTERVAL ? SECOND
+    {where}
+ORDER BY
+    r.changed_at ASC,
+    r.id ASC
+LIMIT
+    ?;
+"""
+
+    res = DB_CLIENT.select(sql, params)
+
+    return res["data"]
+
+
+def encode_cursor(changed_at: str, id: str) -> str:
+    """
+    カーソルを作成
+
+    Parameters
+    ----------
+    changed_at: str
+        ページの最後の飲食店の変更日時（マイクロ秒まで）
+    id: str
+        ページの最後の飲食店のID
+
+    Returns
+    -------
+    str
+    """
+    raw = json.dumps([changed_at, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    カーソルを解析
+
+    Parameters
+    ----------
+    cursor: str
+
+    Returns
+    -------
+    tuple[str, str]
+        変更日時, ID
+    """
+    try:
+        changed_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(changed_at), str(id)
+    except Exception:
+        raise Exception(f"cursorが不正。cursor：{cursor}")
@@ -1,8 +1,19 @@
 import os
 import json
-import boto3
 from pydantic import BaseModel, ValidationError
 from db_client import DbClient
+from detail_document import DetailDocuments, select_detail, select_details, select_version
+from response_encoder import (
+    is_not_modified,
+    make_etag,
+    negotiate,
+    request_body,
+    serialize,
+    set_body,
+    set_not_modified,
+)
+from error_reporter import ErrorReporter
+from profiler import profile_handler
 
 
 class EventParams(BaseModel):
@@ -10,7 +21,11 @@ class EventParams(BaseModel):
     イベントパラメータ
     """
 
-    id: str
+    # 飲食店ID
+    id: str | None = None
+
+    # 複数の飲食店ID（指定時は飲食店ID → 詳細で返す）
+    ids: list[str] | None = None
 
 
 class Image(BaseModel):
@@ -39,6 +54,26 @@ class Detail(BaseModel):
     images: list[dict]
 
 
+# まとめて取得できる飲食店の最大件数
+DETAIL_IDS_MAX = 50
+
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# 詳細のドキュメント
+DETAIL_DOCUMENTS = DetailDocuments(
+    os.environ["NAME_BUCKET_FRONTEND"], os.environ["PREFIX_DETAILS"]
+)
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
 def lambda_handler(event, context):
 
     response = {
@@ -57,17 +92,36 @@ def lambda_handler(event, context):
         # パラメータの取得
         evt = get_params(event)
 
-        # 緯度経度の範囲内の飲食店を取得
+        # 応答の形式と圧縮方式
+        media_type, encoding = negotiate(event["headers"])
+
+        # 複数の飲食店の詳細をまとめて取得
+        if evt.ids is not None:
+            details = get_details(evt.ids)
+            body = serialize({id: d.__dict__ for id, d in details.items()}, media_type)
+            set_body(response, body, media_type, encoding)
+            return response
+
+        # 前回から変わっていなければ本文なしで返す
+        version = select_version(DB_CLIENT, evt.id)
+        if version is None:
+            raise Exception(f"完了済みの飲食店がない。id：{evt.id}")
+        etag = make_etag(evt.id, version, media_type, encoding)
+        if is_not_modified(event["headers"], etag):
+            set_not_modified(response, etag)
+            return response
+
+        # 飲食店の詳細を取得
         d = get_detail(evt.id)
-        response["body"] = json.dumps(d.__dict__)
+
+        body = serialize(d.__dict__, media_type)
+        set_body(response, body, media_type, encoding, etag)
     except Exception as e:
         response["statusCode"] = 500
-        payload = {"function_name": context.function_name, "msg": str(e)}
-        boto3.client("lambda").invoke(
-            FunctionName=os.environ["ARN_LAMBDA_ERROR_COMMON"],
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode("utf-8"),
-        )
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
 
     return response
 
@@ -119,88 +173,83 @@ def get_params(evt: dict) -> EventParams:
             f"イベントパラメータにbodyがない。パラメータ：{json.dumps(evt)}"
         )
 
-    body = json.loads(evt["body"])
+    body = json.loads(request_body(evt))
 
     try:
-        return EventParams(**body)
+        params = EventParams(**body)
     except ValidationError as e:
         raise Exception(f"{str(e.json())}")
 
+    # idとidsはどちらか一方を指定
+    if (params.id is None) == (params.ids is None):
+        raise Exception(f"idかidsのどちらかを指定。パラメータ：{evt['body']}")
+
+    # 重複を除き、件数を確認
+    if params.ids is not None:
+        params.ids = list(dict.fromkeys(params.ids))
+        if len(params.ids) < 1 or DETAIL_IDS_MAX < len(params.ids):
+            raise Exception(f"idsは1〜{DETAIL_IDS_MAX}件で指定。件数：{len(params.ids)}")
+
+    return params
+
 
 def get_detail(id: str) -> Detail:
     """
-    緯度経度の範囲内の飲食店を取得
+    飲食店の詳細を取得し、詳細のドキュメントがなかった分として保存
 
     Parameters
     ----------
-    evt: EventParams
+    id: str
+        飲食店ID
 
     Returns
     -------
     Detail
     """
+    detail = select_detail(DB_CLIENT, id)
+    if detail is None:
+        raise Exception(f"完了済みの飲食店がない。id：{id}")
 
-    # SQL
-    sql = """
-SELECT
-    r.name,
-    g1.name AS genre,
-    g2.name AS sub_genre,
-    r.address,
-    r.latitude,
-    r.longitude,
-    r.open_hours,
-    r.close_days,
-    r.parking,
-    i.order_num,
-    i.name AS alt
-FROM
-    restaurants r
-    INNER JOIN genre_master g1 ON r.genre_code = g1.code
-    LEFT JOIN genre_master g2 ON r.sub_genre_code = g2.code
-    LEFT JOIN images i USING (id)
-WHERE
-    r.id = ?
-    AND r.is_complete = 1
-ORDER BY
-    i.order_num ASC;
-"""
-
-    # パラメータ
-    params = [id]
-
-    # DBから取得
-    db_client = DbClient(
-        os.environ["ENV"],
-        os.environ["SAKURA_DATABASE_API_KEY_PATH"],
-        os.environ["SAKURA_DATABASE_API_URL"],
-    )
-    res = db_client.select(sql, params)
-
-    # 最初の飲食店レコード
-    r = res["data"][0]
-    r_dict = {
-        "name": r["name"],
-        "genre": r["genre"],
-        "sub_genre": r["sub_genre"],
-        "address": r["address"],
-        "latitude": float(r["latitude"]),
-        "longitude": float(r["longitude"]),
-        "open_hours": r["open_hours"],
-        "close_days": r["close_days"],
-        "parking": r["parking"],
-    }
+    d = to_detail(detail)
 
-    r_dict["images"] = []
+    # 次からはCloudFrontから配信する
+    DETAIL_DOCUMENTS.put(id, d.__dict__)
 
-    # 画像がない場合はここで返す
-    if r["order_num"] is None:
-        return Detail(**r_dict)
+    return d
 
-    # 順番に格納
-    for r in res["data"]:
-        # 型チェックのため、構造体を通す
-        image = Image(order_num=r["order_num"], alt=r["alt"])
-        r_dict["images"].append(image.__dict__)
 
-    return Detail(**r_dict)
+def get_details(ids: list[str]) -> dict[str, Detail]:
+    """
+    複数の飲食店の詳細をまとめて取得
+
+    一覧の先読み用。詳細のドキュメントは保存しない
+
+    Parameters
+    ----------
+    ids: list[str]
+        飲食店ID
+
+    Returns
+    -------
+    dict[str, Detail]
+        飲食店ID → 詳細。完了済みの飲食店がないIDは含まない
+    """
+    details = select_details(DB_CLIENT, ids)
+    return {id: to_detail(detail) for id, detail in details.items()}
+
+
+def to_detail(detail: dict) -> Detail:
+    """
+    型チェックのため、構造体を通す
+
+    Parameters
+    ----------
+    detail: dict
+        DBから取得した詳細
+
+    Returns
+    -------
+    Detail
+    """
+    images = [Image(**image).__dict__ for image in detail["images"]]
+    return Detail(**{**detail, "images": images})
@@ -1,8 +1,29 @@
 import os
 import json
-import boto3
+import math
+import base64
+import heapq
+from datetime import datetime
 from pydantic import BaseModel, ValidationError
 from db_client import DbClient
+from genre_resolver import GenreResolver
+from opening_hours import hex_digit, week_slot
+from grid import KM_PER_DEG, cover_ranges
+from snapshot import PARKING_AVAILABLE_PREFIX, RestaurantSnapshot, SnapshotLoader
+from tile_cache import TileCache
+from response_encoder import (
+    is_not_modified,
+    make_etag,
+    negotiate,
+    request_body,
+    serialize,
+    set_body,
+    set_not_modified,
+    to_columnar,
+)
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
 
 
 class EventParams(BaseModel):
@@ -12,10 +33,35 @@ class EventParams(BaseModel):
 
     lat: float
     lng: float
-    lat_min: float
-    lat_max: float
-    lng_min: float
-    lng_max: float
+
+    # 範囲指定
+    lat_min: float | None = None
+    lat_max: float | None = None
+    lng_min: float | None = None
+    lng_max: float | None = None
+
+    # 密集している場合にクラスタで返すか
+    cluster: bool = False
+
+    # 列ごとのリストで返すか
+    columnar: bool = False
+
+    # 近い順にk件（指定時は範囲指定は不要）
+    k: int | None = None
+    radius: float | None = None
+
+    # 絞り込み（ジャンル名・ジャンルコード・駐車場の有無・サムネイルの有無）
+    genres: list[str] | None = None
+    genre_codes: list[str] | None = None
+    parking: bool | None = None
+    thumbnail: bool | None = None
+
+    # 営業中の絞り込み（日時。タイムゾーンがなければ日本時間）。営業時間が不明な飲食店は含まない
+    open_at: datetime | None = None
+
+    # ページ送り（範囲指定のみ）。指定時は{items, cursor}で返す
+    page_size: int | None = None
+    cursor: str | None = None
 
 
 class Restaurant(BaseModel):
@@ -33,6 +79,58 @@ class Restaurant(BaseModel):
     distance: float
 
 
+# 範囲指定での最大件数
+LIMIT_BBOX = 1000
+
+# 1ページの最大件数
+PAGE_SIZE_MAX = LIMIT_BBOX
+
+# 範囲内の件数がこれを超える場合はクラスタで返す（clusterの指定時）
+CLUSTER_THRESHOLD = 1000
+
+# タイルに丸めた範囲の候補としてキャッシュする最大件数
+# 超える範囲は候補をキャッシュせず、要求された範囲で直接検索する（DynamoDBの項目の上限400KBに収める）
+CANDIDATES_MAX = 2000
+
+# 候補としてキャッシュする列
+CANDIDATE_KEYS = ("id", "name", "latitude", "longitude", "genre_name", "parking", "is_thumbnail")
+
+# 近い順の検索の最大件数
+NEAREST_K_MAX = 100
+
+# 近い順の検索の最大距離（km）。未指定時もこの距離で打ち切る
+NEAREST_RADIUS_MAX = 50
+
+# DBで近い順に検索する場合の最初の探索距離（km）。k件見つかるまで倍にする
+NEAREST_RADIUS_INITIAL = 1
+
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# ジャンル名・ジャンルコードの変換
+GENRE_RESOLVER = GenreResolver(DB_CLIENT)
+
+# 完了済み飲食店のスナップショット
+SNAPSHOT_LOADER = SnapshotLoader(
+    os.environ["NAME_BUCKET_DATA"],
+    os.environ["KEY_SNAPSHOT_RESTAURANTS"],
+)
+
+# 表示範囲をタイルに丸めた応答のキャッシュ
+TILE_CACHE = TileCache(os.environ.get("NAME_TABLE_TILE_CACHE"))
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Api")
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
 def lambda_handler(event, context):
 
     response = {
@@ -51,16 +149,48 @@ def lambda_handler(event, context):
         # パラメータの取得
         evt = get_params(event)
 
-        # 緯度経度の範囲内の飲食店を取得
-        response["body"] = json.dumps(get_restaurants(evt))
+        # 応答の形式と圧縮方式
+        media_type, encoding = negotiate(event["headers"])
+
+        etag = None
+        if evt.k is not None:
+            # 近い順にk件を取得
+            rows = get_nearest(evt)
+            with STAGE_TIMER.stage("serialize"):
+                body = serialize(to_columnar(rows) if evt.columnar else rows, media_type)
+        else:
+            # 表示範囲をタイルに丸めた候補のキャッシュのキー
+            with STAGE_TIMER.stage("cache"):
+                key, versioned = cache_key(evt)
+
+            # 前回から変わっていなければ本文なしで返す
+            # 候補が同じでも範囲・中心・ページで応答が変わるため、検索条件も含める
+            if versioned:
+                etag = make_etag(key, request_key(evt), media_type, encoding)
+                if is_not_modified(event["headers"], etag):
+                    set_not_modified(response, etag)
+                    STAGE_TIMER.put_metric("not_modified", 1)
+                    return response
+
+            # 範囲内の飲食店を取得
+            with STAGE_TIMER.stage("query"):
+                data = get_bbox(evt, key)
+            with STAGE_TIMER.stage("serialize"):
+                body = serialize(data, media_type)
+
+        with STAGE_TIMER.stage("compress") as st:
+            set_body(response, body, media_type, encoding, etag)
+            st.add_bytes(len(response["body"]))
     except Exception as e:
         response["statusCode"] = 500
-        payload = {"function_name": context.function_name, "msg": str(e)}
-        boto3.client("lambda").invoke(
-            FunctionName=os.environ["ARN_LAMBDA_ERROR_COMMON"],
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode("utf-8"),
-        )
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        put_cache_metrics()
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
 
     return response
 
@@ -112,39 +242,625 @@ def get_params(evt: dict) -> EventParams:
             f"イベントパラメータにbodyがない。パラメータ：{json.dumps(evt)}"
         )
 
-    body = json.loads(evt["body"])
-
-    # 最大と最小が逆であれば正す
-    if body["lat_max"] < body["lat_min"]:
-        lat_tmp = body["lat_max"]
-        body["lat_max"] = body["lat_min"]
-        body["lat_min"] = lat_tmp
-    if body["lng_max"] < body["lng_min"]:
-        lng_tmp = body["lng_max"]
-        body["lng_max"] = body["lng_min"]
-        body["lng_min"] = lng_tmp
+    body = json.loads(request_body(evt))
 
     try:
-        return EventParams(**body)
+        params = EventParams(**body)
     except ValidationError as e:
         raise Exception(f"{str(e.json())}")
 
+    # ジャンルの指定が空なら絞り込まない
+    if params.genres is not None and len(params.genres) == 0:
+        params.genres = None
+    if params.genre_codes is not None and len(params.genre_codes) == 0:
+        params.genre_codes = None
+
+    # ジャンルコードはジャンル名に変換し、ジャンル名での絞り込みにまとめる
+    if params.genre_codes is not None:
+        GENRE_RESOLVER.refresh()
+        names = {GENRE_RESOLVER.get_name(c) for c in params.genre_codes} - {None}
+        params.genres = sorted(set(params.genres or []) | names)
+        params.genre_codes = None
+
+    # 近い順の検索
+    if params.k is not None:
+        if params.k < 1 or NEAREST_K_MAX < params.k:
+            raise Exception(f"kは1〜{NEAREST_K_MAX}で指定。k：{params.k}")
+        if params.radius is None or NEAREST_RADIUS_MAX < params.radius:
+            params.radius = NEAREST_RADIUS_MAX
+        return params
+
+    # ページ送りの検証
+    if params.page_size is not None and (
+        params.page_size < 1 or PAGE_SIZE_MAX < params.page_size
+    ):
+        raise Exception(f"page_sizeは1〜{PAGE_SIZE_MAX}で指定。page_size：{params.page_size}")
+    if params.cursor is not None:
+        decode_cursor(params.cursor)
+
+    # 範囲指定がなければエラー
+    if None in (params.lat_min, params.lat_max, params.lng_min, params.lng_max):
+        raise Exception(f"範囲指定またはkが必要。パラメータ：{evt['body']}")
+
+    # 最大と最小が逆であれば正す
+    if params.lat_max < params.lat_min:
+        params.lat_min, params.lat_max = params.lat_max, params.lat_min
+    if params.lng_max < params.lng_min:
+        params.lng_min, params.lng_max = params.lng_max, params.lng_min
+
+    return params
+
+
+def cache_key(evt: EventParams) -> tuple[str, bool]:
+    """
+    表示範囲をタイルに丸め、候補のキャッシュのキーを作成
+
+    候補は丸めた範囲内で絞り込みの条件に一致する飲食店で、中心・範囲・ページに依らない。
+    キーには範囲内のタイルのバージョンとスナップショットのバージョンが含まれるため、ETagにも使う
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    tuple[str, bool]
+        キャッシュのキー, 書き込み時に更新されるバージョンで内容が決まるか（ETagを付けられるか）
+    """
+    bbox = TILE_CACHE.snap(evt.lat_min, evt.lat_max, evt.lng_min, evt.lng_max)
+
+    # 絞り込みの条件。営業中の絞り込みは15分単位のコマに丸め、同じコマなら同じキーにする
+    params = evt.model_dump(include={"genres", "parking", "thumbnail"})
+    params["open_slot"] = open_slot(evt)
+
+    # スナップショットが読み込み直されたら別のキーにする
+    # 検索に使わない場合（営業時間がない古いスナップショットでの営業中の絞り込み）はDBから検索するため含めない
+    snapshot = get_snapshot(evt)
+    params["snapshot"] = None if snapshot is None else snapshot.version
+
+    # 検索に使うスナップショットもタイルのバージョンもなければ、DBの更新を検知できない
+    versioned = snapshot is not None or TILE_CACHE.versioned
+
+    return TILE_CACHE.key(bbox, params), versioned
+
+
+def request_key(evt: EventParams) -> str:
+    """
+    応答を決める検索条件（ETag用）
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    str
+    """
+    params = evt.model_dump(exclude={"open_at"})
+    params["open_slot"] = open_slot(evt)
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+def get_bbox(evt: EventParams, key: str) -> dict | list:
+    """
+    範囲内の飲食店を指定された形式で取得
+
+    Parameters
+    ----------
+    evt: EventParams
+    key: str
+        候補のキャッシュのキー（cache_keyの結果）
+
+    Returns
+    -------
+    dict | list
+        応答のデータ
+    """
+    if evt.cluster:
+        # 密集度に応じてクラスタか飲食店を取得
+        data = get_clustered(evt, key)
+        if evt.columnar:
+            data["items"] = to_columnar(data["items"])
+    elif evt.page_size is not None or evt.cursor is not None:
+        # 距離・IDの順にページ送りで取得
+        data = get_page(evt, key)
+        if evt.columnar:
+            data["items"] = to_columnar(data["items"])
+    else:
+        # 緯度経度の範囲内の飲食店を取得
+        data = get_restaurants(evt, key)
+        if evt.columnar:
+            data = to_columnar(data)
+
+    return data
+
+
+def get_candidates(evt: EventParams, key: str) -> list[dict] | None:
+    """
+    タイルに丸めた範囲の候補をキャッシュから取得し、なければ検索して保存
+
+    Parameters
+    ----------
+    evt: EventParams
+    key: str
+        候補のキャッシュのキー（cache_keyの結果）
+
+    Returns
+    -------
+    list[dict] | None
+        距離を含まない飲食店データ。候補が多すぎる範囲ではNone
+    """
+    with STAGE_TIMER.stage("cache"):
+        body = TILE_CACHE.get(key)
+
+    if body is None:
+        bbox = TILE_CACHE.snap(evt.lat_min, evt.lat_max, evt.lng_min, evt.lng_max)
+        center = ((bbox[0] + bbox[1]) / 2, (bbox[2] + bbox[3]) / 2)
+        rows = find_restaurants(evt, *center, bbox, CANDIDATES_MAX + 1)
+
+        # 多すぎる場合は、そのことを空の本文として保存する
+        body = b""
+        if len(rows) <= CANDIDATES_MAX:
+            raw = [[r[k] for k in CANDIDATE_KEYS] for r in rows]
+            body = json.dumps(raw, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with STAGE_TIMER.stage("cache"):
+            TILE_CACHE.put(key, body)
+
+    if body == b"":
+        return None
+
+    return [dict(zip(CANDIDATE_KEYS, r)) for r in json.loads(body)]
+
+
+def rank(
+    candidates: list[dict],
+    evt: EventParams,
+    limit: int,
+    after: tuple[float, str] | None = None,
+) -> list[dict]:
+    """
+    候補を要求された範囲に絞り、中心からの距離・IDの順に並べる
+
+    距離はDBと同じ正距円筒近似で、小数6桁に丸める
+
+    Parameters
+    ----------
+    candidates: list[dict]
+        get_candidatesの結果
+    evt: EventParams
+    limit: int
+        最大件数
+    after: tuple[float, str] | None
+        前のページの最後の飲食店の距離とID。指定時はそれより後のもののみ
+
+    Returns
+    -------
+    list[dict]
+    """
+    cos_lat = math.cos(math.radians(evt.lat))
+
+    keyed = []
+    for r in candidates:
+        la = r["latitude"]
+        ln = r["longitude"]
+        if la < evt.lat_min or la > evt.lat_max or ln < evt.lng_min or ln > evt.lng_max:
+            continue
+        distance = round(
+            KM_PER_DEG * math.sqrt((la - evt.lat) ** 2 + ((ln - evt.lng) * cos_lat) ** 2),
+            6,
+        )
+        if after is not None and (distance, r["id"]) <= after:
+            continue
+        keyed.append((distance, r["id"], r))
+
+    return [
+        {**r, "distance": distance}
+        for distance, _, r in heapq.nsmallest(limit, keyed, key=lambda t: t[:2])
+    ]
+
+
+def put_cache_metrics() -> None:
+    """
+    キャッシュのヒット状況と階層ごとの参照時間を計測値に追加
+    """
+    stats = TILE_CACHE.stats()
+    TILE_CACHE.reset_stats()
+
+    # キャッシュを引いていなければ何もしない
+    if stats["lru_hits"] + stats["dynamodb_hits"] + stats["misses"] == 0:
+        return
+
+    STAGE_TIMER.put_metric("cache_lru_hits", stats["lru_hits"])
+    STAGE_TIMER.put_metric("cache_dynamodb_hits", stats["dynamodb_hits"])
+    STAGE_TIMER.put_metric("cache_misses", stats["misses"])
+    STAGE_TIMER.put_metric("cache_hit_rate", stats["hit_rate"], "Percent")
+    STAGE_TIMER.put_metric("cache_lru_duration", round(stats["lru_ms"], 3), "Milliseconds")
+    STAGE_TIMER.put_metric(
+        "cache_dynamodb_duration", round(stats["dynamodb_ms"], 3), "Milliseconds"
+    )
+
+
+def get_restaurants(
+    evt: EventParams,
+    key: str,
+    limit: int = LIMIT_BBOX,
+    after: tuple[float, str] | None = None,
+) -> list[dict]:
+    """
+    緯度経度の範囲内の飲食店を距離・IDの順に取得
+
+    タイルに丸めた範囲の候補から、要求された範囲・中心で並べ直す
+
+    Parameters
+    ----------
+    evt: EventParams
+    key: str
+        候補のキャッシュのキー（cache_keyの結果）
+    limit: int
+        最大件数
+    after: tuple[float, str] | None
+        前のページの最後の飲食店の距離とID。指定時はそれより後のもののみ
+
+    Returns
+    -------
+    list[dict]
+    """
+    candidates = get_candidates(evt, key)
+
+    # 候補が多すぎる範囲は、要求された範囲で直接検索
+    if candidates is None:
+        bbox = (evt.lat_min, evt.lat_max, evt.lng_min, evt.lng_max)
+        return find_restaurants(evt, evt.lat, evt.lng, bbox, limit, after)
+
+    return rank(candidates, evt, limit, after)
 
-def get_restaurants(evt: EventParams) -> list[dict]:
+
+def find_restaurants(
+    evt: EventParams,
+    lat: float,
+    lng: float,
+    bbox: tuple[float, float, float, float],
+    limit: int,
+    after: tuple[float, str] | None = None,
+) -> list[dict]:
     """
-    緯度経度の範囲内の飲食店を取得
+    範囲内で絞り込みの条件に一致する飲食店を、中心からの距離・IDの順に検索
 
     Parameters
     ----------
     evt: EventParams
+        絞り込みの条件
+    lat: float
+        中心の緯度
+    lng: float
+        中心の経度
+    bbox: tuple[float, float, float, float]
+        最小緯度, 最大緯度, 最小経度, 最大経度
+    limit: int
+        最大件数
+    after: tuple[float, str] | None
+        前のページの最後の飲食店の距離とID。指定時はそれより後のもののみ
 
     Returns
     -------
     list[dict]
     """
 
+    # スナップショットがあればDBを使わずに検索
+    snapshot = get_snapshot(evt)
+    if snapshot is not None:
+        return snapshot.query(
+            lat,
+            lng,
+            *bbox,
+            limit,
+            evt.genres,
+            evt.parking,
+            evt.thumbnail,
+            after,
+            open_slot(evt),
+        )
+
+    return select_restaurants(
+        lat,
+        lng,
+        *bbox,
+        limit,
+        evt.genres,
+        evt.parking,
+        evt.thumbnail,
+        after,
+        open_slot(evt),
+    )
+
+
+def get_snapshot(evt: EventParams) -> RestaurantSnapshot | None:
+    """
+    検索に使うスナップショットを取得
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    RestaurantSnapshot | None
+        ない場合と、営業中の絞り込みに営業時間がない古いスナップショットの場合はNone
+    """
+    snapshot = SNAPSHOT_LOADER.get()
+    if snapshot is None:
+        return None
+    if evt.open_at is not None and not snapshot.has_opening_hours:
+        return None
+
+    return snapshot
+
+
+def open_slot(evt: EventParams) -> int | None:
+    """
+    営業中の絞り込みの1週間の中でのコマ
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    int | None
+        絞り込まない場合はNone
+    """
+    if evt.open_at is None:
+        return None
+
+    return week_slot(evt.open_at)
+
+
+def get_page(evt: EventParams, key: str) -> dict:
+    """
+    緯度経度の範囲内の飲食店を1ページ分取得
+
+    前のページの最後の（距離, ID）より後から取得するため、ページが進んでも検索の量は変わらない
+
+    Parameters
+    ----------
+    evt: EventParams
+    key: str
+        候補のキャッシュのキー（cache_keyの結果）
+
+    Returns
+    -------
+    dict
+        items: list[dict] 飲食店
+        cursor: str | None 次のページのカーソル。最後のページならNone
+    """
+    limit = evt.page_size or LIMIT_BBOX
+    after = None if evt.cursor is None else decode_cursor(evt.cursor)
+
+    # 1件多く取得して次のページの有無を判定
+    rows = get_restaurants(evt, key, limit + 1, after)
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor(rows[-1]["distance"], rows[-1]["id"])
+
+    return {"items": rows, "cursor": cursor}
+
+
+def encode_cursor(distance: float, id: str) -> str:
+    """
+    ページ送りのカーソルを作成
+
+    Parameters
+    ----------
+    distance: float
+        ページの最後の飲食店の距離（km）
+    id: str
+        ページの最後の飲食店のID
+
+    Returns
+    -------
+    str
+    """
+    raw = json.dumps([distance, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    """
+    ページ送りのカーソルを解析
+
+    Parameters
+    ----------
+    cursor: str
+
+    Returns
+    -------
+    tuple[float, str]
+        距離（km）, ID
+    """
+    try:
+        distance, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(distance), str(id)
+    except Exception:
+        raise Exception(f"cursorが不正。cursor：{cursor}")
+
+
+def get_clustered(evt: EventParams, key: str) -> dict:
+    """
+    範囲内の件数が多ければクラスタ、少なければ飲食店を取得
+
+    クラスタはスナップショットで事前に集計した階層から取得する。
+    スナップショットがない場合は飲食店を返す
+
+    Parameters
+    ----------
+    evt: EventParams
+    key: str
+        候補のキャッシュのキー（cache_keyの結果）
+
+    Returns
+    -------
+    dict
+        type: str clusters または points
+        items: list[dict] クラスタまたは飲食店
+    """
+    # クラスタは絞り込みに対応しないため、絞り込み時は飲食店を返す
+    filtered = (
+        evt.genres is not None
+        or evt.parking is not None
+        or evt.thumbnail is not None
+        or evt.open_at is not None
+    )
+
+    snapshot = SNAPSHOT_LOADER.get()
+    if snapshot is not None and not filtered:
+        bbox = (evt.lat_min, evt.lat_max, evt.lng_min, evt.lng_max)
+        if snapshot.count(*bbox) > CLUSTER_THRESHOLD:
+            clusters = snapshot.clusters(*bbox)
+            if clusters is not None:
+                return {"type": "clusters", "items": clusters}
+
+    return {"type": "points", "items": get_restaurants(evt, key)}
+
+
+def get_nearest(evt: EventParams) -> list[dict]:
+    """
+    中心から近い順にk件を取得
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    list[dict]
+    """
+    # スナップショットがあればDBを使わずに検索
+    snapshot = get_snapshot(evt)
+    if snapshot is not None:
+        return snapshot.nearest(
+            evt.lat,
+            evt.lng,
+            evt.k,
+            evt.radius,
+            evt.genres,
+            evt.parking,
+            evt.thumbnail,
+            open_slot(evt),
+        )
+
+    # 探索距離を倍にしながら、距離内にk件見つかるか最大距離に達するまで検索
+    # 探索距離の円を含む範囲で検索し、円の外の飲食店を除けば、距離内の飲食店は漏れない
+    cos_lat = math.cos(math.radians(evt.lat))
+    radius = min(NEAREST_RADIUS_INITIAL, evt.radius)
+    while True:
+        d_lat = radius / KM_PER_DEG
+        d_lng = d_lat / cos_lat
+        rows = select_restaurants(
+            evt.lat,
+            evt.lng,
+            evt.lat - d_lat,
+            evt.lat + d_lat,
+            evt.lng - d_lng,
+            evt.lng + d_lng,
+            evt.k,
+            evt.genres,
+            evt.parking,
+            evt.thumbnail,
+            open_slot=open_slot(evt),
+        )
+        rows = [r for r in rows if r["distance"] <= radius]
+        if len(rows) == evt.k or evt.radius <= radius:
+            return rows
+        radius = min(radius * 2, evt.radius)
+
+
+def select_restaurants(
+    lat: float,
+    lng: float,
+    lat_min: float,
+    lat_max: float,
+    lng_min: float,
+    lng_max: float,
+    limit: int,
+    genres: list[str] | None = None,
+    parking: bool | None = None,
+    thumbnail: bool | None = None,
+    after: tuple[float, str] | None = None,
+    open_slot: int | None = None,
+) -> list[dict]:
+    """
+    DBから範囲内の飲食店を中心からの距離・IDの順に取得
+
+    Parameters
+    ----------
+    lat: float
+        中心の緯度
+    lng: float
+        中心の経度
+    lat_min: float
+        最小緯度
+    lat_max: float
+        最大緯度
+    lng_min: float
+        最小経度
+    lng_max: float
+        最大経度
+    limit: int
+        最大件数
+    genres: list[str] | None
+        ジャンル名。指定時はいずれかに一致するもののみ
+    parking: bool | None
+        駐車場の有無。指定時は一致するもののみ
+    thumbnail: bool | None
+        サムネイルの有無。指定時は一致するもののみ
+    after: tuple[float, str] | None
+        前のページの最後の飲食店の距離とID。指定時はそれより後のもののみ
+    open_slot: int | None
+        1週間の中でのコマ。指定時は営業中のもののみ
+
+    Returns
+    -------
+    list[dict]
+    """
+    # ジャンル名はコードに変換し、(is_complete, genre_code, grid_cell)のインデックスで絞り込む
+    genre_codes = None
+    if genres is not None:
+        GENRE_RESOLVER.refresh()
+        genre_codes = [c for c in map(GENRE_RESOLVER.get_code, genres) if c is not None]
+        if len(genre_codes) == 0:
+            return []
+
+    # 範囲を覆うセルでインデックスを絞り込む
+    # 広すぎる範囲は被覆せず緯度経度の範囲指定のみで検索する
+    ranges = cover_ranges(lat_min, lat_max, lng_min, lng_max)
+    cell_where = ""
+    if ranges is not None:
+        cell_where = f"AND ({' OR '.join(['r.grid_cell BETWEEN ? AND ?'] * len(ranges))})"
+
+    # ジャンル・駐車場・サムネイル・営業中の絞り込み
+    filter_where = ""
+    if genre_codes is not None:
+        filter_where += f"AND r.genre_code IN ({', '.join(['?'] * len(genre_codes))})"
+    if parking is not None:
+        filter_where += f"\n    AND r.parking {'' if parking else 'NOT '}LIKE ?"
+    if thumbnail is not None:
+        filter_where += "\n    AND r.is_thumbnail = ?"
+    if open_slot is not None:
+        # 16進数で保存した営業時間の、コマの文字のビットを確認する
+        filter_where += (
+            "\n    AND r.open_slots IS NOT NULL"
+            "\n    AND (CONV(SUBSTRING(r.open_slots, ?, 1), 16, 10) & ?) <> 0"
+        )
+
+    # 前のページの続き
+    having = ""
+    if after is not None:
+        having = "HAVING\n    distance > ? OR (distance = ? AND r.id > ?)"
+
     # SQL
-    sql = """
+    # 距離は表示範囲程度なら十分な精度の正距円筒近似で求める
+    sql = f"""
 SELECT
     r.id,
     r.name,
@@ -153,43 +869,56 @@ SELECT
     g.name AS genre_name,
     r.parking,
     r.is_thumbnail,
-    (
-        6371 * acos(
-            cos(radians(?)) * cos(radians(r.latitude)) * cos(radians(r.longitude) - radians(?))
-            + sin(radians(?)) * sin(radians(r.latitude))
-        )
+    ROUND(
+        ? * SQRT(POW(r.latitude - ?, 2) + POW((r.longitude - ?) * ?, 2)),
+        6
     ) AS distance
 FROM
     restaurants r
     INNER JOIN genre_master g ON r.genre_code = g.code
 WHERE
     r.is_complete = 1
+    {cell_where}
     AND r.latitude BETWEEN ? AND ?
     AND r.longitude BETWEEN ? AND ?
+    {filter_where}
+{having}
 ORDER BY
-    distance ASC
+    distance ASC,
+    r.id ASC
 LIMIT
-    1000;
+    ?;
 """
 
     # パラメータ
     params = [
-        evt.lat,
-        evt.lng,
-        evt.lng,
-        evt.lat_min,
-        evt.lat_max,
-        evt.lng_min,
-        evt.lng_max,
+        KM_PER_DEG,
+        lat,
+        lng,
+        math.cos(math.radians(lat)),
     ]
+    for r in ranges or []:
+        params.extend(r)
+    params.extend([
+        lat_min,
+        lat_max,
+        lng_min,
+        lng_max,
+    ])
+    if genre_codes is not None:
+        params.extend(genre_codes)
+    if parking is not None:
+        params.append(f"{PARKING_AVAILABLE_PREFIX}%")
+    if thumbnail is not None:
+        params.append(1 if thumbnail else 0)
+    if open_slot is not None:
+        params.extend(hex_digit(open_slot))
+    if after is not None:
+        params.extend([after[0], after[0], after[1]])
+    params.append(limit)
 
     # DBから取得
-    db_client = DbClient(
-        os.environ["ENV"],
-        os.environ["SAKURA_DATABASE_API_KEY_PATH"],
-        os.environ["SAKURA_DATABASE_API_URL"],
-    )
-    res = db_client.select(sql, params)
+    res = DB_CLIENT.select(sql, params)
 
     return [
         Restaurant(
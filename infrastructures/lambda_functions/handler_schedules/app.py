@@ -2,6 +2,8 @@ import json
 import os
 import boto3
 from dataclasses import dataclass, asdict
+from error_reporter import ErrorReporter
+from profiler import profile_handler
 
 
 @dataclass
@@ -26,6 +28,11 @@ class DeleteParams:
     name: str
 
 
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
 def lambda_handler(event, context):
 
     try:
@@ -43,12 +50,10 @@ def lambda_handler(event, context):
             raise Exception(f"予期しないパラメータ。{type(task)}")
 
     except Exception as e:
-        payload = {"function_name": context.function_name, "msg": str(e)}
-        boto3.client("lambda").invoke(
-            FunctionName=os.environ["ARN_LAMBDA_ERROR_COMMON"],
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode("utf-8"),
-        )
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
 
     return {
         "statusCode": 200,
@@ -3,6 +3,7 @@ import requests
 import textwrap
 import boto3
 import os
+from profiler import profile_handler
 
 # 通知タイプ：通常
 NOTIFY_TYPE_NORMAL = 1
@@ -20,6 +21,7 @@ MAX_STR_LENGTH = 1000
 NOTIFY_URL = "https://notify-api.line.me/api/notify"
 
 
+@profile_handler
 def lambda_handler(event, context):
 
     try:
@@ -2,10 +2,11 @@ import boto3
 import os
 import json
 import requests
-import re
-from bs4 import BeautifulSoup
 from db_client import DbClient
+from hotpepper_extractor import HotpepperExtractor
 from pydantic import BaseModel
+from error_reporter import ErrorReporter
+from profiler import profile_handler
 
 
 class EventParam(BaseModel):
@@ -16,6 +17,11 @@ class EventParam(BaseModel):
     service_area_code: str
 
 
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
 def lambda_handler(event, context):
 
     success_response = {
@@ -38,12 +44,10 @@ def lambda_handler(event, context):
         register_schedule()
 
     except Exception as e:
-        payload = {"function_name": context.function_name, "msg": str(e)}
-        boto3.client("lambda").invoke(
-            FunctionName=os.environ["ARN_LAMBDA_ERROR_COMMON"],
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode("utf-8"),
-        )
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
 
     return success_response
 
@@ -68,21 +72,7 @@ def get_page_num(service_area_code: str) -> int:
 
     # HTML解析
     html = requests.get(url)
-    soup = BeautifulSoup(html.content, "html.parser")
-
-    # ページ数を取得
-    lh27 = soup.select_one(".searchResultPageLink .lh27")
-    if lh27 is None:
-        raise Exception(
-            f"ページ数の取得に失敗しました。.searchResultPageLink .lh27がありません。"
-        )
-    match = re.search(r"1/([0-9]+)ページ", lh27.text)
-    if match is None:
-        raise Exception(
-            f"「1/([0-9]+)ページ」の形でページ数を取得できませんでした。{lh27.text}"
-        )
-
-    return int(match.group(1))
+    return HotpepperExtractor().get_page_num(html.content)
 
 
 def register_tasks_scraping_abstract(service_area_code: str, page_num: int) -> None:
@@ -2,11 +2,15 @@ import boto3
 import os
 import json
 import requests
-import re
 import time
-from bs4 import BeautifulSoup
 from db_client import DbClient
+from name_index import NameIndex
+from hotpepper_extractor import HotpepperExtractor, Abstract
+from tile_cache import TileCache
 from pydantic import BaseModel
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
 
 
 class Task(BaseModel):
@@ -17,16 +21,6 @@ class Task(BaseModel):
     kind: str
     param: str
 
-
-class Abstract(BaseModel):
-    """
-    概要情報構造体
-    """
-
-    id: str
-    name: str
-    thumbnail_url: str | None
-
 # DBクライアント
 DB_CLIENT = DbClient(
     os.environ["ENV"],
@@ -34,7 +28,23 @@ DB_CLIENT = DbClient(
     os.environ["SAKURA_DATABASE_API_URL"],
 )
 
+# 店名のn-gram索引
+NAME_INDEX = NameIndex(DB_CLIENT)
+
+# ページ情報の抽出
+EXTRACTOR = HotpepperExtractor()
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Scraping")
+
+# 飲食店一覧のキャッシュ（無効化のみ）
+TILE_CACHE = TileCache(os.environ.get("NAME_TABLE_TILE_CACHE"))
 
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
 def lambda_handler(event, context):
 
     success_response = {
@@ -75,12 +85,13 @@ def lambda_handler(event, context):
         register_schedule()
 
     except Exception as e:
-        payload = {"function_name": context.function_name, "msg": str(e)}
-        boto3.client("lambda").invoke(
-            FunctionName=os.environ["ARN_LAMBDA_ERROR_COMMON"],
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode("utf-8"),
-        )
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
 
     return success_response
 
@@ -110,7 +121,8 @@ LIMIT
 
     # パラメータ
     params = [os.environ["NAME_TASK_SCRAPING_ABSTRACT_DB"]]
-    res = DB_CLIENT.select(sql, params)
+    with STAGE_TIMER.stage("database"):
+        res = DB_CLIENT.select(sql, params)
 
     # 無ければ空オブジェクトで返却
     if len(res["data"]) == 0:
@@ -124,11 +136,12 @@ def delete_schedule() -> None:
     スケジュールの削除
     """
     payload = {"task": "delete", "name": os.environ["NAME_TASK_SCRAPING_ABSTRACT"]}
-    boto3.client("lambda").invoke(
-        FunctionName=os.environ["ARN_LAMBDA_HANDLER_SCHEDULES"],
-        InvocationType="RequestResponse",
-        Payload=json.dumps(payload).encode("utf-8"),
-    )
+    with STAGE_TIMER.stage("schedule"):
+        boto3.client("lambda").invoke(
+            FunctionName=os.environ["ARN_LAMBDA_HANDLER_SCHEDULES"],
+            InvocationType="RequestResponse",
+            Payload=json.dumps(payload).encode("utf-8"),
+        )
 
 
 def get_abstract_info(service_area_code: str, page_num: int) -> list[Abstract]:
@@ -150,45 +163,14 @@ def get_abstract_info(service_area_code: str, page_num: int) -> list[Abstract]:
     # URL
     url = f"https://www.hotpepper.jp/{service_area_code}/lst/bgn{page_num}/"
 
-    # HTML解析
-    html = requests.get(url)
-    soup = BeautifulSoup(html.content, "html.parser")
-
-    restaurants = soup.select(".shopDetailCoreInner")
-    if len(restaurants) == 0:
-        raise Exception(f"「.shopDetailCoreInner」が存在しません。{url}")
-
-    # サムネ画像と飲食店IDを小エリア名を取得
-    results = []
-    for r in restaurants:
-        # サムネ画像
-        thumbnail_url = None
-        img = r.select_one(".shopPhotoMain img")
-        if img is not None:
-            thumbnail_url = img.get("src")
-
-        # 飲食店ID
-        link = r.select_one(".shopDetailStoreName a")
-        if link is None:
-            raise Exception(f"「.shopDetailStoreName a」が存在しません。{url}")
-        match = re.search(r"/str(J\d+)/", link.get("href"))
-        if match is None:
-            raise Exception(f"飲食店IDの取得に失敗しました。{str(link)}")
-        id = match.group(1)
-
-        # 飲食店名
-        name = link.text.strip()
-
-        # 結果配列に格納
-        results.append(
-            Abstract(
-                id=id,
-                name=name,
-                thumbnail_url=thumbnail_url,
-            )
-        )
+    # HTMLを取得
+    with STAGE_TIMER.stage("list_html") as st:
+        html = requests.get(url)
+        st.add_bytes(len(html.content))
 
-    return results
+    # HTML解析
+    with STAGE_TIMER.stage("parse"):
+        return EXTRACTOR.get_abstracts(html.content, url)
 
 
 def put_thumbnails(abstracts: list[Abstract]) -> None:
@@ -206,34 +188,40 @@ def put_thumbnails(abstracts: list[Abstract]) -> None:
         # サムネ画像URLがなければもともとの画像を削除
         # ファイル名の前方一致で検索し、あれば削除する
         if a.thumbnail_url is None:
-            res = s3.list_objects_v2(
-                Bucket=os.environ["NAME_BUCKET_IMAGES"],
-                Prefix=f"thumbnails/{a.id}",
-                MaxKeys=1,
-            )
-
-            # なければスキップ
-            if "Contents" not in res:
-                continue
-
-            # ファイルの削除
-            s3.delete_object(
-                Bucket=os.environ["NAME_BUCKET_IMAGES"], Key=res["Contents"][0]["Key"]
-            )
+            with STAGE_TIMER.stage("s3"):
+                res = s3.list_objects_v2(
+                    Bucket=os.environ["NAME_BUCKET_IMAGES"],
+                    Prefix=f"thumbnails/{a.id}",
+                    MaxKeys=1,
+                )
+
+                # なければスキップ
+                if "Contents" not in res:
+                    continue
+
+                # ファイルの削除
+                s3.delete_object(
+                    Bucket=os.environ["NAME_BUCKET_IMAGES"], Key=res["Contents"][0]["Key"]
+                )
             continue
 
         # サムネ画像を取得して保存
-        img = requests.get(a.thumbnail_url)
+        with STAGE_TIMER.stage("thumbnail_download") as st:
+            img = requests.get(a.thumbnail_url)
+            st.add_bytes(len(img.content))
         _, ext = os.path.splitext(a.thumbnail_url)
-        boto3.client("s3").put_object(
-            Bucket=os.environ["NAME_BUCKET_IMAGES"],
-            Key=f"thumbnails/{a.id}{ext}",
-            Body=img.content,
-        )
+        with STAGE_TIMER.stage("s3") as st:
+            boto3.client("s3").put_object(
+                Bucket=os.environ["NAME_BUCKET_IMAGES"],
+                Key=f"thumbnails/{a.id}{ext}",
+                Body=img.content,
+            )
+            st.add_bytes(len(img.content))
 
         # 最後でなければ1秒待つ
         if i + 1 != abstracts_len:
-            time.sleep(1)
+            with STAGE_TIMER.stage("wait"):
+                time.sleep(1)
 
 
 def register_restaurants(abstracts: list[Abstract]) -> None:
@@ -245,6 +233,10 @@ def register_restaurants(abstracts: list[Abstract]) -> None:
     abstracts: list[Abstract]
         概要情報リスト
     """
+    # 一覧に表示される内容が変わる飲食店の地点と、索引を更新する店名（登録前の値と比べる）
+    with STAGE_TIMER.stage("database"):
+        points, names = select_changes(abstracts)
+
     # SQL
     values_row_str = f"({', '.join(['?'] * 3)})"
     sql = f"""
@@ -252,7 +244,13 @@ INSERT INTO
     restaurants (id, name, is_thumbnail)
 VALUES
     {', '.join([values_row_str] * len(abstracts))}
-ON DUPLICATE KEY UPDATE name = VALUES(name), is_thumbnail = VALUES(is_thumbnail);
+ON DUPLICATE KEY UPDATE
+    changed_at = IF(
+        name <> VALUES(name) OR is_thumbnail <> VALUES(is_thumbnail), NOW(6), changed_at
+    ),
+    version = version + (name <> VALUES(name) OR is_thumbnail <> VALUES(is_thumbnail)),
+    name = VALUES(name),
+    is_thumbnail = VALUES(is_thumbnail);
 """
     # パラメータ
     params = []
@@ -262,7 +260,68 @@ ON DUPLICATE KEY UPDATE name = VALUES(name), is_thumbnail = VALUES(is_thumbnail)
             is_thumbnail = 1
         params.extend([a.id, a.name, is_thumbnail])
 
-    DB_CLIENT.handle(sql, params)
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+    # 飲食店一覧のキャッシュを無効化
+    if len(points) > 0:
+        with STAGE_TIMER.stage("cache"):
+            TILE_CACHE.invalidate(points)
+
+    # 店名のn-gram索引を更新（店名が変わった・未登録の飲食店のみ）
+    with STAGE_TIMER.stage("database"):
+        NAME_INDEX.upsert(names)
+
+
+def select_changes(
+    abstracts: list[Abstract],
+) -> tuple[list[tuple[float, float]], dict[str, str]]:
+    """
+    登録前の値と比べた変更
+
+    Parameters
+    ----------
+    abstracts: list[Abstract]
+        概要情報リスト
+
+    Returns
+    -------
+    tuple[list[tuple[float, float]], dict[str, str]]
+        店名・サムネイルの有無が変わる、一覧に表示中の飲食店の緯度と経度の組と、
+        店名の索引を更新する飲食店（新規・店名の変更・索引に未登録）のID → 店名
+    """
+    # SQL
+    sql = f"""
+SELECT
+    r.id,
+    r.name,
+    r.is_thumbnail,
+    r.latitude,
+    r.longitude,
+    r.is_complete = 1 AND r.grid_cell IS NOT NULL AS is_listed,
+    EXISTS (SELECT 1 FROM restaurant_name_grams n WHERE n.id = r.id) AS is_indexed
+FROM
+    restaurants r
+WHERE
+    r.id IN ({', '.join(['?'] * len(abstracts))});
+"""
+
+    res = DB_CLIENT.select(sql, [a.id for a in abstracts])
+
+    current = {r["id"]: r for r in res["data"]}
+    points = []
+    names = {}
+    for a in abstracts:
+        r = current.get(a.id)
+        if r is None or r["name"] != a.name or int(r["is_indexed"]) == 0:
+            names[a.id] = a.name
+        if r is None or int(r["is_listed"]) == 0:
+            continue
+        is_thumbnail = 1 if type(a.thumbnail_url) == str else 0
+        if r["name"] != a.name or int(r["is_thumbnail"]) != is_thumbnail:
+            points.append((float(r["latitude"]), float(r["longitude"])))
+
+    return points, names
 
 
 def register_tasks_scraping_detail(ids: list[str]) -> None:
@@ -288,7 +347,8 @@ ON DUPLICATE KEY UPDATE kind = VALUES(kind), param = VALUES(param);
     for id in ids:
         params.extend([os.environ["NAME_TASK_SCRAPING_DETAIL_DB"], id])
 
-    DB_CLIENT.handle(sql, params)
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
 
 
 def delete_task(kind: str, param: str) -> None:
@@ -314,7 +374,8 @@ WHERE
 
     # パラメータ
     params = [kind, param]
-    DB_CLIENT.handle(sql, params)
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
 
 
 def register_schedule() -> None:
@@ -328,8 +389,9 @@ def register_schedule() -> None:
         "target_arn": os.environ["ARN_LAMBDA_SCRAPING_DETAIL"],
         "invoke_role_arn": os.environ["ARN_IAM_ROLE_INVOKE_SCRAPING_DETAIL"],
     }
-    boto3.client("lambda").invoke(
-        FunctionName=os.environ["ARN_LAMBDA_HANDLER_SCHEDULES"],
-        InvocationType="RequestResponse",
-        Payload=json.dumps(payload).encode("utf-8"),
-    )
+    with STAGE_TIMER.stage("schedule"):
+        boto3.client("lambda").invoke(
+            FunctionName=os.environ["ARN_LAMBDA_HANDLER_SCHEDULES"],
+            InvocationType="RequestResponse",
+            Payload=json.dumps(payload).encode("utf-8"),
+        )
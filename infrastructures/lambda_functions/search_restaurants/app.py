@@ -0,0 +1,558 @@
+import os
+import json
+import math
+from pydantic import BaseModel, ValidationError
+from db_client import DbClient
+from name_index import normalize_name, query_grams
+from grid import KM_PER_DEG, cell_col, cell_row, cover_ranges
+from response_encoder import negotiate, request_body, serialize, set_body
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
+
+
+class EventParams(BaseModel):
+    """
+    イベントパラメータ
+    """
+
+    # 検索語
+    q: str
+
+    # 中心（指定時は近い順に並べる）
+    lat: float | None = None
+    lng: float | None = None
+
+    # 範囲指定（指定時は範囲内のみ）
+    lat_min: float | None = None
+    lat_max: float | None = None
+    lng_min: float | None = None
+    lng_max: float | None = None
+
+    # 最大件数
+    limit: int = 20
+
+
+# 最大件数の上限
+SEARCH_LIMIT_MAX = 100
+
+# 並べ直す候補の件数（最大件数の倍数）
+CANDIDATES_FACTOR = 5
+
+# 中心のみ指定時に、まず探す範囲の半径（km）。候補が足りなければ全国から探す
+SEARCH_RADIUS_INITIAL = 2
+
+# 範囲内の飲食店から探すセル数の上限。超える範囲はn-gramの転置リストから探す
+AREA_CELLS_MAX = 64
+
+# 転置リストから読む件数の上限（n-gramごと）。よく使われるn-gramでも読む件数を抑える
+POSTINGS_MAX = 2000
+
+# 一致の度合いの加点（店名全体・前方・部分一致）
+SCORE_EXACT = 1.0
+SCORE_PREFIX = 0.5
+SCORE_CONTAINS = 0.25
+
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Api")
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
+def lambda_handler(event, context):
+
+    response = {
+        "statusCode": 200,
+        "headers": {"Access-Control-Allow-Origin": "null"},
+        "body": "NG",
+    }
+
+    try:
+        # オリジンの設定
+        origin = set_origin(event)
+        if origin is None:
+            return response
+        response["headers"]["Access-Control-Allow-Origin"] = origin
+
+        # パラメータの取得
+        evt = get_params(event)
+
+        # 店名で検索
+        rows = search(evt)
+
+        # 応答の形式と圧縮方式
+        media_type, encoding = negotiate(event["headers"])
+        set_body(response, serialize(rows, media_type), media_type, encoding)
+    except Exception as e:
+        response["statusCode"] = 500
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
+
+    return response
+
+
+def set_origin(evt: dict) -> str | None:
+    """
+    オリジンの取得
+
+    Parameters
+    ----------
+    evt: dict
+        イベントパラメータ
+
+    Returns
+    -------
+    str
+        オリジン名。不正ならNone
+    """
+    allowed_origins = os.environ["FRONTEND_DOMAIN"].split(",")
+
+    # Lambda単体のテストやコマンドライン対策
+    if "headers" not in evt:
+        return None
+
+    # 許可されていないオリジンであれば終了
+    origin = evt["headers"].get("origin", "")
+    if origin not in allowed_origins:
+        return None
+
+    return origin
+
+
+def get_params(evt: dict) -> EventParams:
+    """
+    パラメータの検証
+
+    Parameters
+    ----------
+    evt: dict
+        イベントパラメータ
+
+    Returns
+    -------
+    EventParams
+    """
+    # bodyがなければエラー
+    if "body" not in evt:
+        raise Exception(
+            f"イベントパラメータにbodyがない。パラメータ：{json.dumps(evt)}"
+        )
+
+    body = json.loads(request_body(evt))
+
+    try:
+        params = EventParams(**body)
+    except ValidationError as e:
+        raise Exception(f"{str(e.json())}")
+
+    # 検索語が空ならエラー
+    if len(query_grams(params.q)) == 0:
+        raise Exception(f"qが空。パラメータ：{evt['body']}")
+
+    if params.limit < 1 or SEARCH_LIMIT_MAX < params.limit:
+        raise Exception(f"limitは1〜{SEARCH_LIMIT_MAX}で指定。limit：{params.limit}")
+
+    # 中心は緯度経度の両方が必要
+    if (params.lat is None) != (params.lng is None):
+        raise Exception(f"latとlngは両方指定。パラメータ：{evt['body']}")
+
+    # 範囲指定は全て指定するか全て省略する
+    bbox = (params.lat_min, params.lat_max, params.lng_min, params.lng_max)
+    if None in bbox and bbox != (None, None, None, None):
+        raise Exception(f"範囲指定が不足。パラメータ：{evt['body']}")
+
+    # 最大と最小が逆であれば正す
+    if params.lat_min is not None and params.lat_max < params.lat_min:
+        params.lat_min, params.lat_max = params.lat_max, params.lat_min
+    if params.lng_min is not None and params.lng_max < params.lng_min:
+        params.lng_min, params.lng_max = params.lng_max, params.lng_min
+
+    return params
+
+
+def search(evt: EventParams) -> list[dict]:
+    """
+    店名のn-gram索引で検索し、一致の度合い・距離の順に並べる
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    list[dict]
+        get_restaurantsの飲食店データにscore（一致の度合い）を加えたもの。
+        中心の指定がなければdistanceはNone
+    """
+    grams = query_grams(evt.q)
+    limit = evt.limit * CANDIDATES_FACTOR
+
+    # 探す範囲。中心のみの指定時は周辺から探す
+    bbox = None
+    if evt.lat_min is not None:
+        bbox = (evt.lat_min, evt.lat_max, evt.lng_min, evt.lng_max)
+    elif evt.lat is not None:
+        d_lat = SEARCH_RADIUS_INITIAL / KM_PER_DEG
+        d_lng = d_lat / math.cos(math.radians(evt.lat))
+        bbox = (evt.lat - d_lat, evt.lat + d_lat, evt.lng - d_lng, evt.lng + d_lng)
+
+    # 候補の取得
+    # 狭い範囲は範囲内の飲食店ごとにn-gramを数え、広い範囲・範囲なしは転置リストから数える
+    with STAGE_TIMER.stage("database"):
+        if bbox is not None and count_cells(*bbox) <= AREA_CELLS_MAX:
+            rows = select_in_area(evt, grams, bbox, limit)
+            # 周辺で要求の件数に満たない場合のみ全国から探す（候補の件数では比べない）
+            if evt.lat_min is None and len(rows) < evt.limit:
+                rows = select_by_grams(evt, grams, None, limit)
+        else:
+            rows = select_by_grams(evt, grams, bbox, limit)
+
+    # 一致したn-gramの割合に、店名全体・前方・部分一致を加点して並べ直す
+    q = normalize_name(evt.q)
+    results = []
+    for r in rows:
+        name = normalize_name(r["name"])
+        score = min(int(r["hits"]) / len(grams), 1.0)
+        if name == q:
+            score += SCORE_EXACT
+        elif name.startswith(q):
+            score += SCORE_PREFIX
+        elif q in name:
+            score += SCORE_CONTAINS
+        results.append(
+            {
+                "id": r["id"],
+                "name": r["name"],
+                "latitude": float(r["latitude"]),
+                "longitude": float(r["longitude"]),
+                "genre_name": r["genre_name"],
+                "parking": r["parking"],
+                "is_thumbnail": r["is_thumbnail"],
+                "distance": None if r["distance"] is None else float(r["distance"]),
+                "score": round(score, 3),
+            }
+        )
+    results.sort(
+        key=lambda r: (
+            -r["score"],
+            math.inf if r["distance"] is None else r["distance"],
+            r["id"],
+        )
+    )
+
+    return results[: evt.limit]
+
+
+def count_cells(lat_min: float, lat_max: float, lng_min: float, lng_max: float) -> int:
+    """
+    範囲を覆うグリッドのセル数
+
+    Returns
+    -------
+    int
+    """
+    rows = cell_row(lat_max) - cell_row(lat_min) + 1
+    cols = cell_col(lng_max) - cell_col(lng_min) + 1
+    return rows * cols
+
+
+def gram_condition(grams: list[str]) -> tuple[str, list, int]:
+    """
+    n-gramの一致条件
+
+    1文字の検索はn-gramの前方一致（その文字から始まるbi-gramと最後の1文字）とする。
+    bi-gramが3つ以上の場合は1つの不一致まで許容する
+
+    Parameters
+    ----------
+    grams: list[str]
+        検索語のn-gram
+
+    Returns
+    -------
+    tuple[str, list, int]
+        条件, パラメータ, 必要な一致数
+    """
+    if len(grams[0]) == 1:
+        escaped = grams[0].replace("!", "!!").replace("%", "!%").replace("_", "!_")
+        return "n.gram LIKE ? ESCAPE '!'", [f"{escaped}%"], 1
+
+    min_hits = len(grams) if len(grams) <= 2 else len(grams) - 1
+    return f"n.gram IN ({', '.join(['?'] * len(grams))})", grams, min_hits
+
+
+def distance_column(evt: EventParams) -> tuple[str, list]:
+    """
+    中心からの距離の列
+
+    Parameters
+    ----------
+    evt: EventParams
+
+    Returns
+    -------
+    tuple[str, list]
+        列, パラメータ。中心の指定がなければNULL
+    """
+    if evt.lat is None:
+        return "NULL", []
+
+    return (
+        "ROUND(? * SQRT(POW(r.latitude - ?, 2) + POW((r.longitude - ?) * ?, 2)), 6)",
+        [KM_PER_DEG, evt.lat, evt.lng, math.cos(math.radians(evt.lat))],
+    )
+
+
+def area_condition(bbox: tuple[float, float, float, float] | None) -> tuple[str, list]:
+    """
+    範囲の条件
+
+    Parameters
+    ----------
+    bbox: tuple[float, float, float, float] | None
+        最小緯度, 最大緯度, 最小経度, 最大経度
+
+    Returns
+    -------
+    tuple[str, list]
+        条件, パラメータ。範囲がなければ空
+    """
+    if bbox is None:
+        return "", []
+
+    where = ""
+    params = []
+    ranges = cover_ranges(*bbox)
+    if ranges is not None:
+        where = f"AND ({' OR '.join(['r.grid_cell BETWEEN ? AND ?'] * len(ranges))})\n    "
+        for rg in ranges:
+            params.extend(rg)
+    where += "AND r.latitude BETWEEN ? AND ?\n    AND r.longitude BETWEEN ? AND ?"
+    params.extend(bbox)
+
+    return where, params
+
+
+def select_in_area(
+    evt: EventParams,
+    grams: list[str],
+    bbox: tuple[float, float, float, float],
+    limit: int,
+) -> list[dict]:
+    """
+    範囲内の飲食店ごとにn-gramの一致数を数えて取得
+
+    範囲内の件数に比例するため、よく使われる文字の検索でも狭い範囲なら速い。
+    restaurant_name_gramsの(id, gram)のインデックスを使う
+
+    Parameters
+    ----------
+    evt: EventParams
+    grams: list[str]
+        検索語のn-gram
+    bbox: tuple[float, float, float, float]
+        最小緯度, 最大緯度, 最小経度, 最大経度
+    limit: int
+        最大件数
+
+    Returns
+    -------
+    list[dict]
+    """
+    gram_where, gram_params, min_hits = gram_condition(grams)
+    distance_col, distance_params = distance_column(evt)
+    area_where, area_params = area_condition(bbox)
+
+    # SQL
+    sql = f"""
+SELECT
+    r.id,
+    r.name,
+    r.latitude,
+    r.longitude,
+    g.name AS genre_name,
+    r.parking,
+    r.is_thumbnail,
+    (
+        SELECT
+            COUNT(*)
+        FROM
+            restaurant_name_grams n
+        WHERE
+            n.id = r.id
+            AND {gram_where}
+    ) AS hits,
+    {distance_col} AS distance
+FROM
+    restaurants r
+    INNER JOIN genre_master g ON r.genre_code = g.code
+WHERE
+    r.is_complete = 1
+    {area_where}
+HAVING
+    hits >= ?
+ORDER BY
+    hits DESC,
+    distance ASC,
+    r.id ASC
+LIMIT
+    ?;
+"""
+
+    # パラメータ
+    params = [*gram_params, *distance_params, *area_params, min_hits, limit]
+
+    res = DB_CLIENT.select(sql, params)
+
+    return res["data"]
+
+
+def select_by_grams(
+    evt: EventParams,
+    grams: list[str],
+    bbox: tuple[float, float, float, float] | None,
+    limit: int,
+) -> list[dict]:
+    """
+    n-gramの転置リストから候補を集め、候補ごとにn-gramの一致数を数えて取得
+
+    転置リストは件数の少ないn-gramから必要な数だけ選び（postings_gramsを参照）、先頭のPOSTINGS_MAX件まで読む。
+    選んだn-gramの転置リストがPOSTINGS_MAX件を超える（よく使われるn-gramのみの）検索は、一致する飲食店の一部から返す
+
+    Parameters
+    ----------
+    evt: EventParams
+    grams: list[str]
+        検索語のn-gram
+    bbox: tuple[float, float, float, float] | None
+        最小緯度, 最大緯度, 最小経度, 最大経度。Noneなら全国
+    limit: int
+        最大件数
+
+    Returns
+    -------
+    list[dict]
+    """
+    gram_where, gram_params, min_hits = gram_condition(grams)
+    distance_col, distance_params = distance_column(evt)
+    area_where, area_params = area_condition(bbox)
+
+    # 読む転置リスト（1文字の検索は前方一致の1つ）
+    postings = [(gram_where, gram_params)]
+    if len(grams[0]) != 1:
+        postings = [("n.gram = ?", [g]) for g in postings_grams(grams, min_hits)]
+    postings_sql = "\n                UNION ALL\n                ".join(
+        [
+            f"(SELECT n.id FROM restaurant_name_grams n WHERE {where} LIMIT ?)"
+            for where, _ in postings
+        ]
+    )
+
+    # SQL
+    sql = f"""
+SELECT
+    r.id,
+    r.name,
+    r.latitude,
+    r.longitude,
+    g.name AS genre_name,
+    r.parking,
+    r.is_thumbnail,
+    (
+        SELECT
+            COUNT(*)
+        FROM
+            restaurant_name_grams n
+        WHERE
+            n.id = r.id
+            AND {gram_where}
+    ) AS hits,
+    {distance_col} AS distance
+FROM
+    (
+        SELECT DISTINCT
+            p.id
+        FROM
+            (
+                {postings_sql}
+            ) p
+    ) m
+    INNER JOIN restaurants r ON m.id = r.id
+    INNER JOIN genre_master g ON r.genre_code = g.code
+WHERE
+    r.is_complete = 1
+    {area_where}
+HAVING
+    hits >= ?
+ORDER BY
+    hits DESC,
+    distance ASC,
+    r.id ASC
+LIMIT
+    ?;
+"""
+
+    # パラメータ
+    params = [*gram_params, *distance_params]
+    for _, postings_params in postings:
+        params.extend([*postings_params, POSTINGS_MAX])
+    params.extend([*area_params, min_hits, limit])
+
+    res = DB_CLIENT.select(sql, params)
+
+    return res["data"]
+
+
+def postings_grams(grams: list[str], min_hits: int) -> list[str]:
+    """
+    転置リストを読むn-gram
+
+    必要な一致数を満たす飲食店は、一致しないn-gramが（n-gramの数 - 必要な一致数）以下のため、
+    それより1つ多いn-gramの転置リストを読めば漏れない。転置リストの件数の少ないn-gramから選ぶ
+
+    Parameters
+    ----------
+    grams: list[str]
+        検索語のn-gram（bi-gram）
+    min_hits: int
+        必要な一致数
+
+    Returns
+    -------
+    list[str]
+    """
+    if len(grams) == 1:
+        return grams
+
+    # n-gramごとの転置リストの件数（POSTINGS_MAX + 1件まで数える）
+    sql = "\nUNION ALL\n".join(
+        [
+            "SELECT ? AS gram, COUNT(*) AS size FROM "
+            "(SELECT 1 FROM restaurant_name_grams n WHERE n.gram = ? LIMIT ?) p"
+        ]
+        * len(grams)
+    )
+    params = []
+    for g in grams:
+        params.extend([g, g, POSTINGS_MAX + 1])
+
+    res = DB_CLIENT.select(f"{sql};", params)
+    sizes = {r["gram"]: int(r["size"]) for r in res["data"]}
+
+    results = sorted(grams, key=lambda g: (sizes.get(g, 0), g))
+
+    return results[: len(grams) - min_hits + 1]
@@ -1,9 +1,11 @@
-import boto3
 import os
-import json
 from hotpepper_api_client import HotpepperApiClient
 from db_client import DbClient
+from genre_resolver import MASTER_NAME_GENRE, bump_master_version
 from pydantic import BaseModel
+from stage_timer import StageTimer
+from error_reporter import ErrorReporter
+from profiler import profile_handler
 
 
 class Genre(BaseModel):
@@ -15,6 +17,21 @@ class Genre(BaseModel):
     name: str
 
 
+# DBクライアント
+DB_CLIENT = DbClient(
+    os.environ["ENV"],
+    os.environ["SAKURA_DATABASE_API_KEY_PATH"],
+    os.environ["SAKURA_DATABASE_API_URL"],
+)
+
+# 処理段階ごとの計測
+STAGE_TIMER = StageTimer("Restaurants/Scraping")
+
+# エラーの送信
+ERROR_REPORTER = ErrorReporter(os.environ["ARN_LAMBDA_ERROR_COMMON"])
+
+
+@profile_handler
 def lambda_handler(event, context):
 
     try:
@@ -26,12 +43,13 @@ def lambda_handler(event, context):
         update_genres(genres)
 
     except Exception as e:
-        payload = {"function_name": context.function_name, "msg": str(e)}
-        boto3.client("lambda").invoke(
-            FunctionName=os.environ["ARN_LAMBDA_ERROR_COMMON"],
-            InvocationType="RequestResponse",
-            Payload=json.dumps(payload).encode("utf-8"),
-        )
+        ERROR_REPORTER.record(context.function_name, str(e))
+    finally:
+        # 計測値の出力
+        STAGE_TIMER.emit({"FunctionName": context.function_name})
+
+        # エラーをまとめて送信
+        ERROR_REPORTER.flush()
 
     return {
         "statusCode": 200,
@@ -51,7 +69,8 @@ def get_genres() -> list[Genre]:
     api_client = HotpepperApiClient(
         os.environ["PARAMETER_STORE_NAME_HOTPEPPER_API_KEY"]
     )
-    res = api_client.get_genres()
+    with STAGE_TIMER.stage("api"):
+        res = api_client.get_genres()
     return [
         Genre(
             code=r["code"],
@@ -65,29 +84,72 @@ def update_genres(genres: list[Genre]) -> None:
     """
     ジャンル一覧を更新
 
+    現在のgenre_masterと比べ、追加・名前が変わったジャンルのみ書き込む。
+    変更があった場合のみマスタのバージョンを上げる
+
     Parameters
     ----------
     genre: list[Genre]
         ジャンル一覧
     """
+    # 現在のジャンル一覧と比較
+    with STAGE_TIMER.stage("database"):
+        current = select_genres()
+    inserted = [g for g in genres if g.code not in current]
+    updated = [g for g in genres if g.code in current and current[g.code] != g.name]
+
+    # APIの一覧からなくなったジャンルは、飲食店から参照されているため削除しない
+    missing = current.keys() - {g.code for g in genres}
+
+    STAGE_TIMER.put_metric("genre_inserted", len(inserted))
+    STAGE_TIMER.put_metric("genre_updated", len(updated))
+    STAGE_TIMER.put_metric("genre_missing", len(missing))
+
+    # 変更がなければ何もしない
+    changed = inserted + updated
+    if len(changed) == 0:
+        return
+
     # SQL
     values_row_str = f"({', '.join(['?'] * 2)})"
     sql = f"""
 INSERT INTO
     genre_master (code, name)
 VALUES
-    {', '.join([values_row_str] * len(genres))}
+    {', '.join([values_row_str] * len(changed))}
 ON DUPLICATE KEY UPDATE name = VALUES(name);
     """
 
     # パラメータ
     params = []
-    for g in genres:
+    for g in changed:
         params.extend([g.code, g.name])
 
-    db_client = DbClient(
-        os.environ["ENV"],
-        os.environ["SAKURA_DATABASE_API_KEY_PATH"],
-        os.environ["SAKURA_DATABASE_API_URL"]
-    )
-    db_client.handle(sql, params)
+    with STAGE_TIMER.stage("database"):
+        DB_CLIENT.handle(sql, params)
+
+        # 各Lambdaのジャンルキャッシュを読み込み直させる
+        bump_master_version(DB_CLIENT, MASTER_NAME_GENRE)
+
+
+def select_genres() -> dict[str, str]:
+    """
+    現在のジャンル一覧を取得
+
+    Returns
+    -------
+    dict[str, str]
+        ジャンルコード → ジャンル名
+    """
+    # SQL
+    sql = f"""
+SELECT
+    code,
+    name
+FROM
+    genre_master;
+"""
+
+    res = DB_CLIENT.select(sql, [])
+
+    return {r["code"]: r["name"] for r in res["data"]}
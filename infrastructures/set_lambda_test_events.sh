@@ -93,11 +93,23 @@ set_test_events "LambdaScrapingAbstract" "ArnScrapingAbstract"
 # LambdaScrapingDetailのテストイベントの設定
 set_test_events "LambdaScrapingDetail" "ArnScrapingDetail"
 
+# LambdaBackfillGeocodeのテストイベントの設定
+set_test_events "LambdaBackfillGeocode" "ArnBackfillGeocode"
+
+# LambdaExportSnapshotのテストイベントの設定
+set_test_events "LambdaExportSnapshot" "ArnExportSnapshot"
+
 # LambdaGetRestaurantsのテストイベントの設定
 set_test_events "LambdaGetRestaurants" "ArnGetRestaurants"
 
 # LambdaGetRestaurantDetailのテストイベントの設定
 set_test_events "LambdaGetRestaurantDetail" "ArnGetRestaurantDetail"
 
+# LambdaSearchRestaurantsのテストイベントの設定
+set_test_events "LambdaSearchRestaurants" "ArnSearchRestaurants"
+
+# LambdaGetChangesのテストイベントの設定
+set_test_events "LambdaGetChanges" "ArnGetChanges"
+
 # LambdaUpdateGenreMasterのテストイベントの設定
 set_test_events "LambdaUpdateGenreMaster" "ArnLambdaUpdateGenreMaster"
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+飲食店詳細の取得方法のベンチマーク
+
+画像の枚数ごとに、次の取得方法のDB APIの応答サイズ・往復回数・処理時間を比較する。
+
+- 結合: 画像をLEFT JOINし、飲食店の列が画像の枚数分繰り返される（以前の方法）
+- 分割: 飲食店と画像をそれぞれ1回のSQLで取得する
+- 集約: 画像を飲食店ごとのJSON配列にまとめ、1回のSQLで取得する（detail_documentの方法）
+
+SQLite上に合成したテーブルで実行し、DB APIの応答と同じくJSON（PHPのjson_encodeと同じく
+ASCII以外はエスケープ）に変換・復元する。JSON_ARRAYAGGはPythonの集約関数で代用する
+
+Usage:
+    python bench_detail_query.py [画像の枚数...]
+
+Examples:
+    python bench_detail_query.py 0 10 40
+"""
+
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/db_client"))
+
+from detail_document import select_details
+
+# 計測回数
+REPEAT = 300
+
+# 営業時間・定休日（スクレイピングで保存されるHTMLと同程度の長さ）
+OPEN_HOURS = (
+    "月～金: 11:30～14:30 （料理L.O. 14:00 ドリンクL.O. 14:00）<br>"
+    "17:00～翌0:00 （料理L.O. 23:00 ドリンクL.O. 23:30）<br>"
+    "土、日、祝日、祝前日: 11:30～翌0:00 （料理L.O. 23:00 ドリンクL.O. 23:30）<br>"
+    "※ランチタイムは全席禁煙となります。ご予約の際は人数とお時間をお知らせください。<br>"
+    "※営業時間・定休日が記載と異なる場合がございますので、ご来店前に店舗にご確認ください。"
+)
+CLOSE_DAYS = "不定休<br>※年末年始（12/31～1/3）はお休みをいただきます。詳しくはお問い合わせください。"
+
+# 以前の方法（画像の結合）
+SQL_JOIN = """
+SELECT
+    r.name,
+    g1.name AS genre,
+    g2.name AS sub_genre,
+    r.address,
+    r.latitude,
+    r.longitude,
+    r.open_hours,
+    r.close_days,
+    r.parking,
+    i.order_num,
+    i.name AS alt
+FROM
+    restaurants r
+    INNER JOIN genre_master g1 ON r.genre_code = g1.code
+    LEFT JOIN genre_master g2 ON r.sub_genre_code = g2.code
+    LEFT JOIN images i USING (id)
+WHERE
+    r.id = ?
+    AND r.is_complete = 1
+ORDER BY
+    i.order_num ASC;
+"""
+
+# 飲食店と画像を分けて取得
+SQL_RESTAURANT = """
+SELECT
+    r.id,
+    r.name,
+    g1.name AS genre,
+    g2.name AS sub_genre,
+    r.address,
+    r.latitude,
+    r.longitude,
+    r.open_hours,
+    r.close_days,
+    r.parking
+FROM
+    restaurants r
+    INNER JOIN genre_master g1 ON r.genre_code = g1.code
+    LEFT JOIN genre_master g2 ON r.sub_genre_code = g2.code
+WHERE
+    r.id = ?
+    AND r.is_complete = 1;
+"""
+SQL_IMAGES = """
+SELECT
+    id,
+    order_num,
+    name AS alt
+FROM
+    images
+WHERE
+    id = ?
+ORDER BY
+    order_num ASC;
+"""
+
+
+class JsonArrayAgg:
+    """
+    MySQLのJSON_ARRAYAGGの代用
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        self.values.append(json.loads(value))
+
+    def finalize(self):
+        if len(self.values) == 0:
+            return None
+        return json.dumps(self.values, ensure_ascii=False)
+
+
+class ApiClient:
+    """
+    DB APIと同じ形式で応答を返すクライアント（往復回数と応答サイズを記録）
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.reset()
+
+    def reset(self) -> None:
+        self.round_trips = 0
+        self.bytes = 0
+
+    def select(self, sql: str, params: list) -> dict:
+        cur = self.conn.execute(sql, params)
+        cols = [c[0] for c in cur.description]
+        body = json.dumps({"data": [dict(zip(cols, r)) for r in cur.fetchall()]})
+        self.round_trips += 1
+        self.bytes += len(body)
+        return json.loads(body)
+
+
+def create(photos: list[int]) -> sqlite3.Connection:
+    """
+    画像の枚数ごとに1件ずつ飲食店を合成
+
+    Parameters
+    ----------
+    photos: list[int]
+        画像の枚数
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.create_aggregate("JSON_ARRAYAGG", 1, JsonArrayAgg)
+    conn.executescript(
+        """
+CREATE TABLE genre_master (code TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE restaurants (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    genre_code TEXT,
+    sub_genre_code TEXT,
+    address TEXT,
+    latitude REAL,
+    longitude REAL,
+    open_hours TEXT,
+    close_days TEXT,
+    parking TEXT,
+    is_complete INTEGER
+);
+CREATE TABLE images (id TEXT, order_num INTEGER, name TEXT, PRIMARY KEY (id, order_num));
+INSERT INTO genre_master VALUES ('G001', '居酒屋'), ('G002', 'ダイニングバー・バル');
+"""
+    )
+    for n in photos:
+        id = f"J{n:09d}"
+        conn.execute(
+            "INSERT INTO restaurants VALUES (?, ?, 'G001', 'G002', ?, 35.689, 139.700, ?, ?, ?, 1);",
+            [id, f"炭火焼鳥と旬の肴 ○○ 新宿東口店 {n}", "東京都新宿区新宿３-２４-１１ ○○ビル4F", OPEN_HOURS, CLOSE_DAYS, "なし ：近隣にコインパーキングあり"],
+        )
+        conn.executemany(
+            "INSERT INTO images VALUES (?, ?, ?);",
+            [(id, i + 1, f"こだわりの炭火焼鳥と季節の料理 写真{i + 1}") for i in range(n)],
+        )
+    return conn
+
+
+def by_join(client: ApiClient, id: str) -> dict:
+    res = client.select(SQL_JOIN, [id])
+    r = res["data"][0]
+    detail = {k: r[k] for k in r if k not in ("order_num", "alt")}
+    detail["images"] = [
+        {"order_num": r["order_num"], "alt": r["alt"]}
+        for r in res["data"]
+        if r["order_num"] is not None
+    ]
+    return detail
+
+
+def by_split(client: ApiClient, id: str) -> dict:
+    detail = client.select(SQL_RESTAURANT, [id])["data"][0]
+    res = client.select(SQL_IMAGES, [id])
+    detail["images"] = [{"order_num": r["order_num"], "alt": r["alt"]} for r in res["data"]]
+    return detail
+
+
+def by_aggregate(client: ApiClient, id: str) -> dict:
+    return select_details(client, [id])[id]
+
+
+def main(photos: list[int]) -> None:
+    conn = create(photos)
+    client = ApiClient(conn)
+
+    for n in photos:
+        id = f"J{n:09d}"
+        for name, f in [("結合", by_join), ("分割", by_split), ("集約", by_aggregate)]:
+            client.reset()
+            detail = f(client, id)
+            assert len(detail["images"]) == n
+            round_trips, size = client.round_trips, client.bytes
+
+            times = []
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                f(client, id)
+                times.append((time.perf_counter() - start) * 1000)
+            print(
+                f"画像{n:>3}枚 {name} 応答 {size:>7}B 往復 {round_trips}回 "
+                f"中央値 {statistics.median(times):6.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [0, 10, 40])
@@ -0,0 +1,138 @@
+"""
+ページ情報抽出の回帰チェックとスループット計測
+
+fixtures/expected.jsonに記載したフィクスチャごとの期待値と、
+HotpepperExtractorの抽出結果をバックエンドごとに比較する。
+期待値どおりであれば、抽出処理ごとの1秒あたりのページ数を出力する。
+1件でも一致しなければ終了コード1で終了する
+
+Usage:
+    python bench_extractors.py [繰り返し回数]
+
+Examples:
+    python bench_extractors.py 200
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/html_parser"))
+
+from html_parser import HtmlParser, BACKEND_PRIORITY
+from hotpepper_extractor import HotpepperExtractor
+
+# フィクスチャのディレクトリ
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_cases() -> list[dict]:
+    """
+    期待値の読み込み
+
+    Returns
+    -------
+    list[dict]
+        fixture, extractor, argsに加え、期待値expectedまたはエラー文言errorを持つ
+    """
+    with open(os.path.join(FIXTURES_DIR, "expected.json"), "r", encoding="utf-8") as f:
+        cases = json.load(f)
+
+    for c in cases:
+        with open(os.path.join(FIXTURES_DIR, c["fixture"]), "rb") as f:
+            c["content"] = f.read()
+
+    return cases
+
+
+def run(extractor: HotpepperExtractor, case: dict):
+    """
+    抽出処理の実行
+
+    Parameters
+    ----------
+    extractor: HotpepperExtractor
+    case: dict
+        チェック内容
+
+    Returns
+    -------
+    int | list | dict
+        比較用にpydanticの構造体はdictに変換する
+    """
+    res = getattr(extractor, case["extractor"])(case["content"], *case["args"])
+    if isinstance(res, list):
+        return [r.model_dump() for r in res]
+    if hasattr(res, "model_dump"):
+        return res.model_dump()
+
+    return res
+
+
+def check(extractor: HotpepperExtractor, case: dict) -> str | None:
+    """
+    期待値との比較
+
+    Parameters
+    ----------
+    extractor: HotpepperExtractor
+    case: dict
+        チェック内容
+
+    Returns
+    -------
+    str | None
+        不一致の内容。一致していればNone
+    """
+    try:
+        actual = run(extractor, case)
+    except Exception as e:
+        # エラーが期待どおりか
+        if "error" in case and str(e).startswith(case["error"]):
+            return None
+        return f"予期しないエラー：{e}"
+
+    if "error" in case:
+        return f"エラーになりませんでした。{case['error']}"
+    if actual != case["expected"]:
+        return f"期待値：{json.dumps(case['expected'], ensure_ascii=False)}\n実際：{json.dumps(actual, ensure_ascii=False)}"
+
+    return None
+
+
+def main(n: int) -> None:
+    cases = load_cases()
+    backends = [b for b in BACKEND_PRIORITY if HtmlParser.is_available(b)]
+
+    # 回帰チェック
+    failures = 0
+    for b in backends:
+        extractor = HotpepperExtractor(b)
+        for c in cases:
+            diff = check(extractor, c)
+            if diff is not None:
+                failures += 1
+                print(f"NG {b} {c['fixture']} {c['extractor']}\n{diff}")
+    if failures > 0:
+        print(f"{failures}件の不一致")
+        sys.exit(1)
+    print(f"OK {len(cases)}件 x {len(backends)}バックエンド")
+
+    # スループット（正常系のフィクスチャのみ）
+    print(f"{'extractor':<16}{'backend':<14}{'pages/sec':>12}")
+    names = sorted({c["extractor"] for c in cases})
+    for name in names:
+        targets = [c for c in cases if c["extractor"] == name and "expected" in c]
+        for b in backends:
+            extractor = HotpepperExtractor(b)
+            start = time.perf_counter()
+            for _ in range(n):
+                for c in targets:
+                    run(extractor, c)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<16}{b:<14}{n * len(targets) / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,131 @@
+"""
+住所辞書のベンチマーク
+
+フィクスチャのCSVから作成したインデックスで検索結果を確認した後、
+合成した大規模なインデックスで1秒あたりの検索件数を出力する
+
+Usage:
+    python bench_gazetteer.py [合成する件数]
+
+Examples:
+    python bench_gazetteer.py 200000
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/geo"))
+
+from gazetteer import Gazetteer, build, LEVEL_CHOME
+
+# フィクスチャのディレクトリ
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# フィクスチャでの検索結果の期待値（住所, 一致するキー）
+EXPECTED = [
+    ("北海道札幌市北区北七条西４丁目１－２ とりまるビル２Ｆ", "北海道札幌市北区北7条西4"),
+    ("東京都中央区銀座4丁目5番6号", "東京都中央区銀座4-5"),
+    ("東京都中央区銀座4-50-1", "東京都中央区銀座4"),
+    ("東京都中央区銀座8-1-1", "東京都中央区銀座"),
+    ("京都府京都市中京区恵比須町427", "京都府京都市中京区恵比須町"),
+    ("大阪府大阪市北区梅田3-1-3", None),
+]
+
+
+def check(dir: str) -> None:
+    """
+    フィクスチャでの検索結果の確認
+
+    Parameters
+    ----------
+    dir: str
+        作業ディレクトリ
+    """
+    path = os.path.join(dir, "fixtures.idx")
+    build(
+        [
+            os.path.join(FIXTURES_DIR, "gazetteer_town.csv"),
+            os.path.join(FIXTURES_DIR, "gazetteer_block.csv"),
+        ],
+        path,
+    )
+    g = Gazetteer.open(path)
+
+    failures = 0
+    for address, key in EXPECTED:
+        found = g.lookup(address)
+        actual = None if found is None else found["key"]
+        if actual != key:
+            failures += 1
+            print(f"NG {address} 期待値：{key} 実際：{actual}")
+    if failures > 0:
+        sys.exit(1)
+    print(f"OK {len(EXPECTED)}件")
+
+
+def synthesize(dir: str, n: int) -> tuple[str, list[str]]:
+    """
+    大規模なインデックスの合成
+
+    Parameters
+    ----------
+    dir: str
+        作業ディレクトリ
+    n: int
+        街区の件数
+
+    Returns
+    -------
+    tuple[str, list[str]]
+        インデックスのパスと、検索に使う住所リスト
+    """
+    csv_path = os.path.join(dir, "synthetic.csv")
+    rng = random.Random(0)
+    addresses = []
+    with open(csv_path, "w", encoding="cp932", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["都道府県名", "市区町村名", "大字・丁目名", "小字・通称名", "街区符号・地番", "緯度", "経度"])
+        for i in range(n):
+            city = f"市{i % 1700}"
+            town = f"町{i // 1700 % 50}"
+            chome = f"{i // 85000 + 1}丁目"
+            block = i % 40 + 1
+            w.writerow(["県", city, town + chome, "", block, 35 + rng.random(), 135 + rng.random()])
+            if i % 10 == 0:
+                addresses.append(f"県{city}{town}{chome}{block}番{rng.randint(1, 30)}号 ビル{rng.randint(1, 9)}F")
+
+    path = os.path.join(dir, "synthetic.idx")
+    build([csv_path], path)
+    return path, addresses
+
+
+def main(n: int) -> None:
+    with tempfile.TemporaryDirectory() as dir:
+        check(dir)
+
+        path, addresses = synthesize(dir, n)
+
+        # 開く時間（mmapのため件数に依存しない）
+        start = time.perf_counter()
+        g = Gazetteer.open(path)
+        opened = (time.perf_counter() - start) * 1000
+
+        # 検索
+        start = time.perf_counter()
+        hits = 0
+        for a in addresses:
+            found = g.lookup(a)
+            if found is not None and found["level"] >= LEVEL_CHOME:
+                hits += 1
+        elapsed = time.perf_counter() - start
+
+        print(f"件数：{len(g)} サイズ：{os.path.getsize(path) / 1024 / 1024:.1f}MB 開く時間：{opened:.3f}ms")
+        print(f"検索：{len(addresses) / elapsed:.0f}件/秒 一致：{hits}/{len(addresses)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
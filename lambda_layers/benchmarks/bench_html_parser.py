@@ -0,0 +1,94 @@
+"""
+HTMLパーサーのベンチマーク
+
+保存済みのフィクスチャページをバックエンドごとに解析し、
+1ページあたりの解析時間とピークメモリを出力する
+
+Usage:
+    python bench_html_parser.py [繰り返し回数]
+
+Examples:
+    python bench_html_parser.py 200
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/html_parser"))
+
+from html_parser import HtmlParser, BACKEND_PRIORITY, BACKEND_HTML_PARSER
+
+# フィクスチャのディレクトリ
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# フィクスチャごとの解析対象クラスと、解析後に実行するセレクタ
+TARGETS = {
+    "list.html": (["searchResultPageLink", "shopDetailCoreInner"], ".shopDetailCoreInner"),
+    "detail.html": (["jscShopInfoInnerSection", "infoTable"], ".infoTable tr"),
+    "photo.html": (["jsc-photo-list", "jsc-photo-list-elm"], ".jsc-photo-list"),
+}
+
+
+def bench(parser: HtmlParser, content: bytes, classes: list[str] | None, selector: str, n: int) -> tuple[float, float, int]:
+    """
+    解析時間とピークメモリを計測
+
+    Parameters
+    ----------
+    parser: HtmlParser
+        パーサー
+    content: bytes
+        HTML
+    classes: list[str] | None
+        解析対象クラス。Noneならページ全体
+    selector: str
+        解析後に実行するセレクタ
+    n: int
+        繰り返し回数
+
+    Returns
+    -------
+    tuple[float, float, int]
+        1ページあたりの解析時間（ミリ秒）、ピークメモリ（KB）、セレクタの一致件数
+    """
+    # 初回のインポート等を計測に含めないよう空回し
+    parser.parse(content, classes).select(selector)
+
+    # ピークメモリ
+    # tracemallocはPythonのアロケータのみが対象のため、C拡張内部の確保分は含まれない
+    tracemalloc.start()
+    soup = parser.parse(content, classes)
+    hits = len(soup.select(selector))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # 解析時間
+    start = time.perf_counter()
+    for _ in range(n):
+        parser.parse(content, classes).select(selector)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / n * 1000, peak / 1024, hits
+
+
+def main(n: int) -> None:
+    backends = [b for b in BACKEND_PRIORITY if HtmlParser.is_available(b)]
+
+    print(f"{'fixture':<14}{'backend':<24}{'ms/page':>10}{'peak KB':>10}{'hits':>6}")
+    for name, (classes, selector) in TARGETS.items():
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+            content = f.read()
+
+        # 比較基準として、従来のhtml.parserによるページ全体の解析
+        cases = [("html.parser (全体)", HtmlParser(BACKEND_HTML_PARSER), None)]
+        cases += [(b, HtmlParser(b), classes) for b in backends]
+
+        for label, parser, c in cases:
+            ms, kb, hits = bench(parser, content, c, selector, n)
+            print(f"{name:<14}{label:<24}{ms:>10.3f}{kb:>10.1f}{hits:>6}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,392 @@
+"""
+店名検索のベンチマーク
+
+SQLite上に合成した飲食店テーブルと店名のn-gram索引（restaurant_name_grams）で、
+search_restaurantsと同じ形のSQLの検索時間を計測する。
+転置リストから候補を集める方法（全国）と、中心の周辺の飲食店ごとに数える方法（範囲）を計測し、
+比較として、転置リストを全て読んで数える方法と、LIKEによる部分一致（索引を使えない全件走査）も計測する
+
+Usage:
+    python bench_name_search.py [件数...]
+
+Examples:
+    python bench_name_search.py 100000 1000000
+"""
+
+import math
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/db_client"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/geo"))
+
+from grid import KM_PER_DEG, cell_id, cover_ranges
+from name_index import name_grams, normalize_name, query_grams
+
+# 店名の部品
+PREFIXES = ["", "", "", "炭火", "串焼き", "手打ち", "本格", "大衆", "創作", "海鮮", "Bar ", "Cafe "]
+CORES = [
+    "居酒屋", "焼肉", "らーめん", "ラーメン", "寿司", "鮨", "そば", "うどん", "焼鳥", "鳥貴族",
+    "とんかつ", "天ぷら", "イタリアン", "ビストロ", "ダイニング", "食堂", "酒場", "餃子", "カレー",
+]
+NAMES = [
+    "一番", "大将", "まるや", "さくら", "はなび", "ひまわり", "鶴亀", "金太郎", "とりや", "みなと",
+    "Luce", "Sole", "Mare", "HANA", "KAZE", "海風", "山水", "月光", "風花", "雷門",
+]
+PLACES = ["新宿", "渋谷", "池袋", "梅田", "難波", "栄", "天神", "すすきの", "函館", "仙台", "横浜", "京都"]
+
+# 飲食店を集中させる都市の中心（緯度, 経度）
+CITIES = [(35.681, 139.767), (34.702, 135.496), (35.170, 136.882), (43.068, 141.351)]
+
+# 検索回数
+QUERIES = 300
+
+# 範囲の半径（km。search_restaurantsのSEARCH_RADIUS_INITIALと同じ）
+RADIUS = 2
+
+# 1回に登録する件数
+INSERT_CHUNK_SIZE = 100000
+
+# 転置リストから読む件数の上限（search_restaurantsのPOSTINGS_MAXと同じ）
+POSTINGS_MAX = 2000
+
+# search_restaurantsと同じ形のSQL（転置リストの件数）
+SQL_POSTINGS_SIZE = """
+SELECT
+    COUNT(*)
+FROM
+    (SELECT 1 FROM restaurant_name_grams n WHERE n.gram = ? LIMIT ?);
+"""
+
+# search_restaurantsと同じ形のSQL（転置リストから候補を集め、候補ごとに数える）
+SQL_SEARCH = """
+SELECT
+    r.id,
+    r.name,
+    (
+        SELECT
+            COUNT(*)
+        FROM
+            restaurant_name_grams n
+        WHERE
+            n.id = r.id
+            AND {gram_where}
+    ) AS hits,
+    round(? * sqrt(pow(r.latitude - ?, 2) + pow((r.longitude - ?) * ?, 2)), 6) AS distance
+FROM
+    (
+        SELECT DISTINCT
+            p.id
+        FROM
+            ({postings}) p
+    ) m
+    INNER JOIN restaurants r ON m.id = r.id
+WHERE
+    r.is_complete = 1
+    AND hits >= ?
+ORDER BY
+    hits DESC,
+    distance ASC,
+    r.id ASC
+LIMIT
+    100;
+"""
+
+# 転置リストを全て読んで数える（上限を設けない場合）
+SQL_POSTINGS_ALL = """
+SELECT
+    r.id,
+    r.name,
+    m.hits,
+    round(? * sqrt(pow(r.latitude - ?, 2) + pow((r.longitude - ?) * ?, 2)), 6) AS distance
+FROM
+    (
+        SELECT
+            n.id,
+            COUNT(*) AS hits
+        FROM
+            restaurant_name_grams n
+        WHERE
+            {gram_where}
+        GROUP BY
+            n.id
+        HAVING
+            hits >= ?
+    ) m
+    INNER JOIN restaurants r ON m.id = r.id
+WHERE
+    r.is_complete = 1
+ORDER BY
+    m.hits DESC,
+    distance ASC,
+    r.id ASC
+LIMIT
+    100;
+"""
+
+# search_restaurantsと同じ形のSQL（範囲内の飲食店ごとに数える）
+SQL_AREA = """
+SELECT
+    r.id,
+    r.name,
+    (
+        SELECT
+            COUNT(*)
+        FROM
+            restaurant_name_grams n
+        WHERE
+            n.id = r.id
+            AND {gram_where}
+    ) AS hits,
+    round(? * sqrt(pow(r.latitude - ?, 2) + pow((r.longitude - ?) * ?, 2)), 6) AS distance
+FROM
+    restaurants r
+WHERE
+    r.is_complete = 1
+    AND ({grid_where})
+    AND r.latitude BETWEEN ? AND ?
+    AND r.longitude BETWEEN ? AND ?
+    AND hits >= ?
+ORDER BY
+    hits DESC,
+    distance ASC,
+    r.id ASC
+LIMIT
+    100;
+"""
+
+# 索引を使わない部分一致（距離順）
+SQL_LIKE = """
+SELECT
+    id,
+    round(? * sqrt(pow(latitude - ?, 2) + pow((longitude - ?) * ?, 2)), 6) AS distance
+FROM
+    restaurants
+WHERE
+    is_complete = 1
+    AND name LIKE ?
+ORDER BY
+    distance ASC,
+    id ASC
+LIMIT
+    100;
+"""
+
+
+def shop_name(rng: random.Random) -> str:
+    """
+    店名の合成
+    """
+    name = f"{rng.choice(PREFIXES)}{rng.choice(CORES)} {rng.choice(NAMES)}"
+    if rng.random() < 0.7:
+        name += f" {rng.choice(PLACES)}店"
+    if rng.random() < 0.3:
+        name += f" {rng.randint(1, 99)}号"
+    return name
+
+
+def create(n: int) -> tuple[sqlite3.Connection, list[str]]:
+    """
+    飲食店テーブルと店名のn-gram索引の合成
+
+    Parameters
+    ----------
+    n: int
+        件数
+
+    Returns
+    -------
+    tuple[sqlite3.Connection, list[str]]
+        接続, 店名の一覧
+    """
+    conn = sqlite3.connect(":memory:")
+
+    # 数学関数が組み込まれていないSQLiteのみPythonの関数を登録する（計測を歪めないため）
+    try:
+        conn.execute("SELECT sqrt(1), pow(1, 1);")
+    except sqlite3.OperationalError:
+        for name, f in [("sqrt", math.sqrt), ("pow", math.pow)]:
+            conn.create_function(name, -1 if name == "pow" else 1, f, deterministic=True)
+
+    conn.execute(
+        """
+CREATE TABLE restaurants (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    latitude REAL,
+    longitude REAL,
+    grid_cell INTEGER,
+    is_complete INTEGER
+);
+"""
+    )
+    conn.execute(
+        """
+CREATE TABLE restaurant_name_grams (
+    gram TEXT,
+    id TEXT,
+    PRIMARY KEY (gram, id)
+) WITHOUT ROWID;
+"""
+    )
+
+    rng = random.Random(0)
+    names = []
+    for start in range(0, n, INSERT_CHUNK_SIZE):
+        rows = []
+        grams = []
+        for i in range(start, min(start + INSERT_CHUNK_SIZE, n)):
+            id = f"J{i:09d}"
+            name = shop_name(rng)
+            lat0, lng0 = rng.choice(CITIES)
+            lat = round(rng.gauss(lat0, 0.08), 6)
+            lng = round(rng.gauss(lng0, 0.08), 6)
+            names.append(name)
+            rows.append((id, name, lat, lng, cell_id(lat, lng), 1))
+            grams.extend((g, id) for g in name_grams(name))
+        conn.executemany("INSERT INTO restaurants VALUES (?, ?, ?, ?, ?, ?);", rows)
+        conn.executemany(
+            "INSERT OR IGNORE INTO restaurant_name_grams VALUES (?, ?);", grams
+        )
+    conn.execute("CREATE INDEX idx_grid ON restaurants (is_complete, grid_cell);")
+    conn.execute("CREATE INDEX idx_id_gram ON restaurant_name_grams (id, gram);")
+    conn.execute("ANALYZE;")
+
+    return conn, names
+
+
+def queries(names: list[str]) -> list[str]:
+    """
+    検索語（店名の一部を切り出したもの。1文字の検索を1割含む）
+    """
+    rng = random.Random(1)
+    results = []
+    for _ in range(QUERIES):
+        s = normalize_name(rng.choice(names))
+        size = 1 if rng.random() < 0.1 else rng.randint(2, min(6, len(s)))
+        start = rng.randint(0, len(s) - size)
+        results.append(s[start : start + size])
+    return results
+
+
+def gram_condition(q: str) -> tuple[str, list, int]:
+    """
+    n-gramの一致条件（search_restaurantsと同じ）
+    """
+    grams = query_grams(q)
+    if len(grams[0]) == 1:
+        # SQLiteのLIKEは大文字小文字を区別しないため索引を使えない。前方一致はGLOBで代用する
+        return "n.gram GLOB ?", [f"{grams[0]}*"], 1
+
+    min_hits = len(grams) if len(grams) <= 2 else len(grams) - 1
+    return f"n.gram IN ({', '.join(['?'] * len(grams))})", grams, min_hits
+
+
+def postings(conn: sqlite3.Connection, q: str) -> list[tuple[str, list]]:
+    """
+    読む転置リスト（search_restaurantsのpostings_gramsと同じ）
+    """
+    gram_where, gram_params, min_hits = gram_condition(q)
+    grams = query_grams(q)
+    if len(grams[0]) == 1:
+        return [(gram_where, gram_params)]
+
+    sizes = {
+        g: conn.execute(SQL_POSTINGS_SIZE, [g, POSTINGS_MAX + 1]).fetchone()[0]
+        for g in grams
+    }
+    grams = sorted(grams, key=lambda g: (sizes[g], g))[: len(grams) - min_hits + 1]
+    return [("n.gram = ?", [g]) for g in grams]
+
+
+def run_search(conn: sqlite3.Connection, q: str) -> list:
+    gram_where, gram_params, min_hits = gram_condition(q)
+    lat, lng = CITIES[0]
+    lists = postings(conn, q)
+    sql = SQL_SEARCH.format(
+        gram_where=gram_where,
+        postings=" UNION ALL ".join(
+            [
+                f"SELECT * FROM (SELECT n.id FROM restaurant_name_grams n WHERE {w} LIMIT ?)"
+                for w, _ in lists
+            ]
+        ),
+    )
+    params = [*gram_params, KM_PER_DEG, lat, lng, math.cos(math.radians(lat))]
+    for _, p in lists:
+        params.extend([*p, POSTINGS_MAX])
+    params.append(min_hits)
+    return conn.execute(sql, params).fetchall()
+
+
+def run_postings_all(conn: sqlite3.Connection, q: str) -> list:
+    gram_where, gram_params, min_hits = gram_condition(q)
+    lat, lng = CITIES[0]
+    params = [KM_PER_DEG, lat, lng, math.cos(math.radians(lat)), *gram_params, min_hits]
+    return conn.execute(SQL_POSTINGS_ALL.format(gram_where=gram_where), params).fetchall()
+
+
+def run_area(conn: sqlite3.Connection, q: str) -> list:
+    gram_where, gram_params, min_hits = gram_condition(q)
+    lat, lng = CITIES[0]
+    d_lat = RADIUS / KM_PER_DEG
+    d_lng = d_lat / math.cos(math.radians(lat))
+    bbox = (lat - d_lat, lat + d_lat, lng - d_lng, lng + d_lng)
+    ranges = cover_ranges(*bbox)
+    grid_where = " OR ".join(["r.grid_cell BETWEEN ? AND ?"] * len(ranges))
+    params = [*gram_params, KM_PER_DEG, lat, lng, math.cos(math.radians(lat))]
+    for rg in ranges:
+        params.extend(rg)
+    params.extend([*bbox, min_hits])
+    sql = SQL_AREA.format(gram_where=gram_where, grid_where=grid_where)
+    return conn.execute(sql, params).fetchall()
+
+
+def run_like(conn: sqlite3.Connection, q: str) -> list:
+    lat, lng = CITIES[0]
+    params = [KM_PER_DEG, lat, lng, math.cos(math.radians(lat)), f"%{q}%"]
+    return conn.execute(SQL_LIKE, params).fetchall()
+
+
+def main(sizes: list[int]) -> None:
+    for n in sizes:
+        start = time.perf_counter()
+        conn, names = create(n)
+        print(f"{n}件 索引の作成 {time.perf_counter() - start:.1f}s")
+        qs = queries(names)
+
+        for name, f in [
+            ("n-gram 全国", run_search),
+            ("n-gram 範囲", run_area),
+            ("転置リスト全件", run_postings_all),
+            ("LIKE", run_like),
+        ]:
+            f(conn, qs[0])
+            times = []
+            for q in qs:
+                start = time.perf_counter()
+                f(conn, q)
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            p95 = times[int(len(times) * 0.95)]
+            print(
+                f"{n}件 {name:<12} 平均 {statistics.mean(times):7.2f}ms "
+                f"中央値 {statistics.median(times):7.2f}ms p95 {p95:7.2f}ms"
+            )
+
+        # 転置リストの上限による取りこぼし（全件読んだ場合の上位20件のうち、含まれる割合）
+        recalls = []
+        for q in qs:
+            expected = {r[0] for r in run_postings_all(conn, q)[:20]}
+            actual = {r[0] for r in run_search(conn, q)[:20]}
+            recalls.append(len(expected & actual) / max(len(expected), 1))
+        print(f"{n}件 n-gram 全国の上位20件の再現率 {statistics.mean(recalls):.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100000, 1000000])
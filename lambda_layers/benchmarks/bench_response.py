@@ -0,0 +1,139 @@
+"""
+応答の変換・圧縮のベンチマーク
+
+飲食店一覧APIの1,000件の応答について、現在の変換（Restaurantモデル → __dict__ → json.dumps）と、
+行・列ごとの形式 × JSON（orjson）・MessagePack × 圧縮なし・gzip・brotliの組み合わせの
+サイズと変換時間を比較する
+
+Usage:
+    python bench_response.py [件数]
+
+Examples:
+    python bench_response.py 1000
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/api_response"))
+
+from pydantic import BaseModel
+from response_encoder import (
+    MEDIA_TYPE_JSON,
+    MEDIA_TYPE_MSGPACK,
+    compress,
+    serialize,
+    to_columnar,
+)
+
+# 計測回数
+REPEAT = 200
+
+GENRES = ["居酒屋", "和食", "洋食", "イタリアン・フレンチ", "中華", "焼肉・ホルモン", "カフェ・スイーツ"]
+PARKINGS = ["なし", "あり ：10台", "あり ：近隣にコインパーキングあり"]
+
+
+class Restaurant(BaseModel):
+    """
+    飲食店データ（get_restaurantsと同じ）
+    """
+
+    id: str
+    name: str
+    latitude: float
+    longitude: float
+    genre_name: str
+    parking: str
+    is_thumbnail: int
+    distance: float
+
+
+def rows(n: int) -> list[dict]:
+    """
+    DBから取得した形式の飲食店データの合成
+
+    Parameters
+    ----------
+    n: int
+        件数
+
+    Returns
+    -------
+    list[dict]
+    """
+    rng = random.Random(0)
+    return [
+        {
+            "id": f"J{rng.randrange(10**9):09d}",
+            "name": f"{rng.choice(GENRES)}の店 {i}号店",
+            "latitude": f"{rng.uniform(35.6, 35.8):.6f}",
+            "longitude": f"{rng.uniform(139.6, 139.9):.6f}",
+            "genre_name": rng.choice(GENRES),
+            "parking": rng.choice(PARKINGS),
+            "is_thumbnail": rng.randint(0, 1),
+            "distance": rng.uniform(0, 3),
+        }
+        for i in range(n)
+    ]
+
+
+def current(data: list[dict]) -> bytes:
+    body = json.dumps(
+        [
+            Restaurant(
+                id=r["id"],
+                name=r["name"],
+                latitude=float(r["latitude"]),
+                longitude=float(r["longitude"]),
+                genre_name=r["genre_name"],
+                parking=r["parking"],
+                is_thumbnail=r["is_thumbnail"],
+                distance=r["distance"],
+            ).__dict__
+            for r in data
+        ]
+    )
+    return body.encode("utf-8")
+
+
+def measure(f) -> tuple[float, bytes]:
+    """
+    1回あたりの時間（ミリ秒）と結果
+    """
+    f()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        body = f()
+    return (time.perf_counter() - start) / REPEAT * 1000, body
+
+
+def main(n: int) -> None:
+    data = rows(n)
+
+    # 変換前の飲食店データ（スナップショットの結果と同じ形式）
+    dicts = [
+        {**r, "latitude": float(r["latitude"]), "longitude": float(r["longitude"])}
+        for r in data
+    ]
+
+    ms, body = measure(lambda: current(data))
+    print(f"{'現在（pydantic＋json）':<28} {len(body):>8}B {ms:7.2f}ms")
+
+    for shape in ["rows", "columnar"]:
+        for media_type in [MEDIA_TYPE_JSON, MEDIA_TYPE_MSGPACK]:
+            for encoding in [None, "gzip", "br"]:
+
+                def f() -> bytes:
+                    d = to_columnar(dicts) if shape == "columnar" else dicts
+                    return compress(serialize(d, media_type), encoding)[0]
+
+                ms, body = measure(f)
+                name = f"{shape} {media_type.split('/')[1]} {encoding or '-'}"
+                print(f"{name:<28} {len(body):>8}B {ms:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,251 @@
+"""
+範囲検索のベンチマーク
+
+SQLite上に合成した飲食店テーブルで、haversine＋緯度経度の範囲指定による検索と、
+グリッドのセルの被覆＋正距円筒近似による検索、スナップショットによる検索を比較する。
+両方の検索結果（上位1000件）の一致率も出力する
+
+Usage:
+    python bench_spatial.py [件数...]
+
+Examples:
+    python bench_spatial.py 100000 1000000
+"""
+
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src/geo"))
+
+from grid import KM_PER_DEG, cell_id, cover_ranges
+from snapshot import RestaurantSnapshot, build
+
+# 飲食店を集中させる都市の中心（緯度, 経度）
+CITIES = [
+    (35.681, 139.767),
+    (34.702, 135.496),
+    (35.170, 136.882),
+    (43.068, 141.351),
+    (33.590, 130.421),
+    (34.985, 135.758),
+    (34.395, 132.459),
+    (38.260, 140.882),
+]
+
+# 検索回数
+QUERIES = 200
+
+# 現在の検索（haversine＋緯度経度の範囲指定）
+SQL_HAVERSINE = """
+SELECT
+    id,
+    (
+        6371 * acos(
+            cos(radians(?)) * cos(radians(latitude)) * cos(radians(longitude) - radians(?))
+            + sin(radians(?)) * sin(radians(latitude))
+        )
+    ) AS distance
+FROM
+    restaurants
+WHERE
+    is_complete = 1
+    AND latitude BETWEEN ? AND ?
+    AND longitude BETWEEN ? AND ?
+ORDER BY
+    distance ASC
+LIMIT
+    1000;
+"""
+
+# グリッドのセルの被覆＋正距円筒近似
+# SQLiteはORの区間をセルのインデックスで引かないことがあるため明示する（MySQLは範囲アクセスになる）
+SQL_GRID = """
+SELECT
+    id,
+    (
+        ? * sqrt(pow(latitude - ?, 2) + pow((longitude - ?) * ?, 2))
+    ) AS distance
+FROM
+    restaurants {indexed_by}
+WHERE
+    is_complete = 1
+    {cell_where}
+    AND latitude BETWEEN ? AND ?
+    AND longitude BETWEEN ? AND ?
+ORDER BY
+    distance ASC
+LIMIT
+    1000;
+"""
+
+
+def create(n: int) -> sqlite3.Connection:
+    """
+    飲食店テーブルの合成
+
+    Parameters
+    ----------
+    n: int
+        件数
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+    conn = sqlite3.connect(":memory:")
+    for name, f in [
+        ("acos", lambda x: math.acos(min(1.0, max(-1.0, x)))),
+        ("cos", math.cos),
+        ("sin", math.sin),
+        ("radians", math.radians),
+        ("sqrt", math.sqrt),
+        ("pow", math.pow),
+    ]:
+        conn.create_function(name, -1 if name == "pow" else 1, f, deterministic=True)
+
+    conn.execute(
+        """
+CREATE TABLE restaurants (
+    id INTEGER PRIMARY KEY,
+    latitude REAL,
+    longitude REAL,
+    grid_cell INTEGER,
+    is_complete INTEGER
+);
+"""
+    )
+
+    rng = random.Random(0)
+    rows = []
+    for i in range(n):
+        lat0, lng0 = rng.choice(CITIES)
+        lat = round(rng.gauss(lat0, 0.08), 6)
+        lng = round(rng.gauss(lng0, 0.08), 6)
+        rows.append((i, lat, lng, cell_id(lat, lng), 1))
+    conn.executemany("INSERT INTO restaurants VALUES (?, ?, ?, ?, ?);", rows)
+
+    # 現在の検索でも最善になるよう緯度にもインデックスを張る
+    conn.execute("CREATE INDEX idx_latitude ON restaurants (is_complete, latitude);")
+    conn.execute("CREATE INDEX idx_grid_cell ON restaurants (is_complete, grid_cell);")
+    conn.execute("ANALYZE;")
+
+    return conn
+
+
+def create_snapshot(conn: sqlite3.Connection, dir: str) -> RestaurantSnapshot:
+    """
+    合成した飲食店テーブルからスナップショットを作成
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+    dir: str
+        作業ディレクトリ
+
+    Returns
+    -------
+    RestaurantSnapshot
+    """
+    restaurants = [
+        {
+            "id": str(id),
+            "name": f"店{id}",
+            "latitude": lat,
+            "longitude": lng,
+            "genre_name": "居酒屋",
+            "parking": "なし",
+            "is_thumbnail": 1,
+        }
+        for id, lat, lng in conn.execute("SELECT id, latitude, longitude FROM restaurants;")
+    ]
+    path = os.path.join(dir, "restaurants.snapshot")
+    with open(path, "wb") as f:
+        f.write(build(restaurants))
+
+    return RestaurantSnapshot(path)
+
+
+def viewports() -> list[tuple[float, float, float, float, float, float]]:
+    """
+    検索する表示範囲
+
+    Returns
+    -------
+    list[tuple]
+        中心の緯度, 中心の経度, 最小緯度, 最大緯度, 最小経度, 最大経度
+    """
+    rng = random.Random(1)
+    results = []
+    for _ in range(QUERIES):
+        lat0, lng0 = rng.choice(CITIES)
+        lat = lat0 + rng.uniform(-0.05, 0.05)
+        lng = lng0 + rng.uniform(-0.05, 0.05)
+        h = rng.uniform(0.005, 0.03)
+        w = h * 1.5
+        results.append((lat, lng, lat - h, lat + h, lng - w, lng + w))
+
+    return results
+
+
+def run_haversine(conn: sqlite3.Connection, v: tuple) -> list[int]:
+    lat, lng, lat_min, lat_max, lng_min, lng_max = v
+    params = [lat, lng, lat, lat_min, lat_max, lng_min, lng_max]
+    return [r[0] for r in conn.execute(SQL_HAVERSINE, params)]
+
+
+def run_grid(conn: sqlite3.Connection, v: tuple) -> list[int]:
+    lat, lng, lat_min, lat_max, lng_min, lng_max = v
+    ranges = cover_ranges(lat_min, lat_max, lng_min, lng_max)
+    cell_where = ""
+    if ranges is not None:
+        cell_where = f"AND ({' OR '.join(['grid_cell BETWEEN ? AND ?'] * len(ranges))})"
+    params = [KM_PER_DEG, lat, lng, math.cos(math.radians(lat))]
+    for r in ranges or []:
+        params.extend(r)
+    params.extend([lat_min, lat_max, lng_min, lng_max])
+    indexed_by = "" if ranges is None else "INDEXED BY idx_grid_cell"
+    sql = SQL_GRID.format(cell_where=cell_where, indexed_by=indexed_by)
+    return [r[0] for r in conn.execute(sql, params)]
+
+
+def main(sizes: list[int], dir: str) -> None:
+    vs = viewports()
+    for n in sizes:
+        conn = create(n)
+        snapshot = create_snapshot(conn, dir)
+
+        def run_snapshot(conn: sqlite3.Connection, v: tuple) -> list[int]:
+            return [int(r["id"]) for r in snapshot.query(*v)]
+
+        results = {}
+        for name, f in [
+            ("haversine", run_haversine),
+            ("grid", run_grid),
+            ("snapshot", run_snapshot),
+        ]:
+            # ウォームアップ
+            f(conn, vs[0])
+
+            start = time.perf_counter()
+            results[name] = [f(conn, v) for v in vs]
+            elapsed = time.perf_counter() - start
+            print(f"{n}件 {name:<10} {elapsed / len(vs) * 1000:8.2f}ms/件")
+
+        # 上位1000件の一致率（近似による順位の入れ替わりのみ）
+        for name in ["grid", "snapshot"]:
+            same = total = 0
+            for a, b in zip(results["haversine"], results[name]):
+                same += len(set(a) & set(b))
+                total += len(a)
+            print(f"{n}件 {name}の一致率：{same / total * 100 if total > 0 else 100:.2f}%")
+        conn.close()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as dir:
+        main([int(a) for a in sys.argv[1:]] or [100000, 1000000], dir)
@@ -42,6 +42,11 @@ make_lambda_layers() {
         # ソースコードの配置
         cp $dir/*.py $python_dir
 
+        # インデックスなどのデータファイルがあれば配置
+        if compgen -G "$dir/*.idx" > /dev/null; then
+            cp $dir/*.idx $python_dir
+        fi
+
         # requirements.txtがあればpip install
         if [ -f "${dir}/requirements.txt" ]; then
             pip install --upgrade -r "${dir}/requirements.txt" -t "$python_dir"
@@ -0,0 +1,294 @@
+import base64
+import gzip
+import hashlib
+import brotli
+import msgpack
+import orjson
+
+# 応答の形式
+MEDIA_TYPE_JSON = "application/json"
+MEDIA_TYPE_MSGPACK = "application/msgpack"
+
+# MessagePackとみなすAcceptの値
+MSGPACK_ACCEPTS = (MEDIA_TYPE_MSGPACK, "application/x-msgpack")
+
+# API GatewayのBinaryMediaTypes（backend.yml）と揃える
+# API GatewayはAcceptの最初の値がこれに一致する場合のみBase64の応答をバイナリに戻す
+BINARY_MEDIA_TYPES = (MEDIA_TYPE_JSON, *MSGPACK_ACCEPTS)
+
+# これより小さい応答は圧縮しない（バイト）
+COMPRESS_MIN_BYTES = 1024
+
+# 圧縮レベル。Lambdaの実行時間と転送量の釣り合いで決める
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+
+def negotiate(headers: dict | None) -> tuple[str, str | None]:
+    """
+    リクエストヘッダーから応答の形式と圧縮方式を決定
+
+    Base64で返す（MessagePack・圧縮）のは、Acceptの最初の値がBINARY_MEDIA_TYPESの場合のみとする
+
+    >>> negotiate({"Accept": "application/msgpack", "Accept-Encoding": "gzip, br"})
+    ('application/msgpack', 'br')
+    >>> negotiate({"Accept": "*/*", "Accept-Encoding": "gzip, br"})
+    ('application/json', None)
+
+    Parameters
+    ----------
+    headers: dict | None
+        リクエストヘッダー
+
+    Returns
+    -------
+    tuple[str, str | None]
+        応答の形式, 圧縮方式（br・gzip。圧縮しない場合はNone）
+    """
+    lowered = {k.lower(): v for k, v in (headers or {}).items()}
+
+    accept = lowered.get("accept", "")
+    media_type = MEDIA_TYPE_JSON
+
+    # API Gatewayがバイナリに戻さないため、テキストのJSONで返す
+    if accept.split(",")[0].split(";")[0].strip().lower() not in BINARY_MEDIA_TYPES:
+        return media_type, None
+
+    if any(t in accept for t in MSGPACK_ACCEPTS):
+        media_type = MEDIA_TYPE_MSGPACK
+
+    # q値は見ず、brotliを優先する
+    encodings = {
+        e.split(";")[0].strip() for e in lowered.get("accept-encoding", "").split(",")
+    }
+    encoding = None
+    if "br" in encodings:
+        encoding = "br"
+    elif "gzip" in encodings:
+        encoding = "gzip"
+
+    return media_type, encoding
+
+
+def to_columnar(rows: list[dict]) -> dict[str, list]:
+    """
+    行ごとの辞書のリストを列ごとのリストに変換
+
+    キー名が1回ずつしか出現しないため、件数が多いほど小さくなる
+
+    Parameters
+    ----------
+    rows: list[dict]
+        同じキーを持つ辞書のリスト
+
+    Returns
+    -------
+    dict[str, list]
+        キー → 値のリスト
+    """
+    if len(rows) == 0:
+        return {}
+
+    return {k: [r[k] for r in rows] for k in rows[0]}
+
+
+def serialize(data, media_type: str) -> bytes:
+    """
+    応答の形式に変換
+
+    Parameters
+    ----------
+    data
+        応答のデータ
+    media_type: str
+        応答の形式
+
+    Returns
+    -------
+    bytes
+    """
+    if media_type == MEDIA_TYPE_MSGPACK:
+        return msgpack.packb(data)
+
+    return orjson.dumps(data)
+
+
+def compress(body: bytes, encoding: str | None) -> tuple[bytes, str | None]:
+    """
+    圧縮
+
+    Parameters
+    ----------
+    body: bytes
+        応答の本文
+    encoding: str | None
+        圧縮方式
+
+    Returns
+    -------
+    tuple[bytes, str | None]
+        本文, 実際に使った圧縮方式（小さい応答は圧縮しない）
+    """
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), encoding
+
+    raise Exception(f"未対応の圧縮方式。{encoding}")
+
+
+def set_body(
+    response: dict,
+    body: bytes,
+    media_type: str,
+    encoding: str | None,
+    etag: str | None = None,
+) -> None:
+    """
+    API Gatewayへの応答に本文を設定
+
+    圧縮した場合とMessagePackの場合はBase64にしてisBase64Encodedを立てる
+
+    Parameters
+    ----------
+    response: dict
+        API Gatewayへの応答
+    body: bytes
+        応答の本文（serializeの結果）
+    media_type: str
+        応答の形式
+    encoding: str | None
+        圧縮方式
+    etag: str | None
+        ETag（make_etagの結果）。Noneなら付けない
+    """
+    body, encoding = compress(body, encoding)
+
+    headers = response.setdefault("headers", {})
+    headers["Content-Type"] = media_type
+    headers["Vary"] = "Origin, Accept, Accept-Encoding"
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if etag is not None:
+        set_etag(response, etag)
+
+    if encoding is None and media_type == MEDIA_TYPE_JSON:
+        response["body"] = body.decode("utf-8")
+        response["isBase64Encoded"] = False
+    else:
+        response["body"] = base64.b64encode(body).decode("ascii")
+        response["isBase64Encoded"] = True
+
+
+def make_etag(*parts) -> str:
+    """
+    強いETag
+
+    書き込み時に更新されるバージョンと、応答の形式・圧縮方式などの表現を表す値から作る
+
+    >>> make_etag("J000000001", 3, "application/json", "br")
+    '"fa43774b44c9b66bced4b0fa5a7b1e2d"'
+
+    Parameters
+    ----------
+    *parts
+        応答の内容を決める値
+
+    Returns
+    -------
+    str
+        引用符で囲んだETag
+    """
+    raw = "#".join(str(p) for p in parts)
+    return f'"{hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def is_not_modified(headers: dict | None, etag: str) -> bool:
+    """
+    If-None-MatchがETagと一致するか
+
+    If-None-Matchは弱い比較のため、W/は無視する
+
+    Parameters
+    ----------
+    headers: dict | None
+        リクエストヘッダー
+    etag: str
+        現在のETag
+
+    Returns
+    -------
+    bool
+    """
+    lowered = {k.lower(): v for k, v in (headers or {}).items()}
+    value = lowered.get("if-none-match")
+    if not value:
+        return False
+    if value.strip() == "*":
+        return True
+
+    tags = {t.strip().removeprefix("W/") for t in value.split(",")}
+    return etag in tags
+
+
+def set_etag(response: dict, etag: str) -> None:
+    """
+    API Gatewayへの応答にETagを設定
+
+    フロントエンドから読めるよう、Access-Control-Expose-Headersにも含める
+
+    Parameters
+    ----------
+    response: dict
+        API Gatewayへの応答
+    etag: str
+        ETag
+    """
+    headers = response.setdefault("headers", {})
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "no-cache"
+    headers["Access-Control-Expose-Headers"] = "ETag"
+
+
+def set_not_modified(response: dict, etag: str) -> None:
+    """
+    API Gatewayへの応答を304（本文なし）にする
+
+    Parameters
+    ----------
+    response: dict
+        API Gatewayへの応答
+    etag: str
+        ETag
+    """
+    response["statusCode"] = 304
+    response["body"] = ""
+    response["isBase64Encoded"] = False
+
+    headers = response.setdefault("headers", {})
+    headers["Vary"] = "Origin, Accept, Accept-Encoding"
+    set_etag(response, etag)
+
+
+def request_body(evt: dict) -> str:
+    """
+    リクエストの本文
+
+    API Gatewayでバイナリを扱う設定にしているため、Base64で渡される場合がある
+
+    Parameters
+    ----------
+    evt: dict
+        イベントパラメータ
+
+    Returns
+    -------
+    str
+    """
+    body = evt["body"] or ""
+    if evt.get("isBase64Encoded"):
+        return base64.b64decode(body).decode("utf-8")
+
+    return body
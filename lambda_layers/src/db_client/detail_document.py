@@ -0,0 +1,216 @@
+import json
+import boto3
+from db_client import DbClient
+
+# 詳細のドキュメントをCloudFrontでキャッシュする秒数
+DETAIL_MAX_AGE = 300
+
+# delete_objectsで一度に削除できる最大件数
+DELETE_MAX = 1000
+
+
+def select_version(db_client: DbClient, id: str) -> int | None:
+    """
+    飲食店のバージョンを取得
+
+    スクレイピング・緯度経度の一括取得で更新するたびに上がる。詳細のETagに使う
+
+    Parameters
+    ----------
+    db_client: DbClient
+        DBクライアント
+    id: str
+        飲食店ID
+
+    Returns
+    -------
+    int | None
+        バージョン。完了済みの飲食店がなければNone
+    """
+    sql = """
+SELECT
+    version
+FROM
+    restaurants
+WHERE
+    id = ?
+    AND is_complete = 1;
+"""
+    res = db_client.select(sql, [id])
+    if len(res["data"]) == 0:
+        return None
+
+    return int(res["data"][0]["version"])
+
+
+def select_detail(db_client: DbClient, id: str) -> dict | None:
+    """
+    飲食店の詳細をDBから取得
+
+    Parameters
+    ----------
+    db_client: DbClient
+        DBクライアント
+    id: str
+        飲食店ID
+
+    Returns
+    -------
+    dict | None
+        詳細（get_restaurant_detailの応答と同じ形式）。完了済みの飲食店がなければNone
+    """
+    return select_details(db_client, [id]).get(id)
+
+
+def select_details(db_client: DbClient, ids: list[str]) -> dict[str, dict]:
+    """
+    複数の飲食店の詳細をDBからまとめて取得
+
+    画像を結合すると飲食店の列（営業時間のHTMLなど）が画像の枚数分繰り返されるため、
+    画像は飲食店ごとに[順番, 代替テキスト]のJSON配列にまとめ、1行・1回のSQLで取得する
+
+    Parameters
+    ----------
+    db_client: DbClient
+        DBクライアント
+    ids: list[str]
+        飲食店ID
+
+    Returns
+    -------
+    dict[str, dict]
+        飲食店ID → 詳細。完了済みの飲食店がないIDは含まない
+    """
+    if len(ids) == 0:
+        return {}
+
+    # SQL
+    sql = f"""
+SELECT
+    r.id,
+    r.name,
+    g1.name AS genre,
+    g2.name AS sub_genre,
+    r.address,
+    r.latitude,
+    r.longitude,
+    r.open_hours,
+    r.close_days,
+    r.parking,
+    (
+        SELECT
+            JSON_ARRAYAGG(JSON_ARRAY(i.order_num, i.name))
+        FROM
+            images i
+        WHERE
+            i.id = r.id
+    ) AS images
+FROM
+    restaurants r
+    INNER JOIN genre_master g1 ON r.genre_code = g1.code
+    LEFT JOIN genre_master g2 ON r.sub_genre_code = g2.code
+WHERE
+    r.id IN ({', '.join(['?'] * len(ids))})
+    AND r.is_complete = 1;
+"""
+
+    res = db_client.select(sql, ids)
+
+    details = {}
+    for r in res["data"]:
+        # JSON列は文字列で返される。JSON_ARRAYAGGは順序を保証しないため並べ直す
+        images = r["images"]
+        if isinstance(images, str):
+            images = json.loads(images)
+        images = sorted((int(order_num), alt) for order_num, alt in images or [])
+
+        details[r["id"]] = {
+            "name": r["name"],
+            "genre": r["genre"],
+            "sub_genre": r["sub_genre"],
+            "address": r["address"],
+            "latitude": float(r["latitude"]),
+            "longitude": float(r["longitude"]),
+            "open_hours": r["open_hours"],
+            "close_days": r["close_days"],
+            "parking": r["parking"],
+            "images": [{"order_num": order_num, "alt": alt} for order_num, alt in images],
+        }
+
+    # 指定された順に並べる
+    return {id: details[id] for id in ids if id in details}
+
+
+class DetailDocuments:
+    """
+    飲食店の詳細のドキュメント（S3の{接頭辞}{飲食店ID}.json）
+
+    スクレイピングで飲食店を更新した際に保存し、CloudFrontから配信する。
+    フロントエンドはまずドキュメントを取得し、なければget_restaurant_detailを呼ぶ
+    """
+
+    def __init__(self, bucket: str, prefix: str):
+
+        # バケット名
+        self._bucket = bucket
+
+        # キーの接頭辞
+        self._prefix = prefix
+
+        self._s3 = boto3.client("s3")
+
+    def key(self, id: str) -> str:
+        """
+        ドキュメントのキー
+
+        Parameters
+        ----------
+        id: str
+            飲食店ID
+
+        Returns
+        -------
+        str
+        """
+        return f"{self._prefix}{id}.json"
+
+    def put(self, id: str, detail: dict) -> int:
+        """
+        ドキュメントの保存
+
+        Parameters
+        ----------
+        id: str
+            飲食店ID
+        detail: dict
+            詳細（select_detailの結果）
+
+        Returns
+        -------
+        int
+            保存したバイト数
+        """
+        body = json.dumps(detail, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._s3.put_object(
+            Bucket=self._bucket,
+            Key=self.key(id),
+            Body=body,
+            ContentType="application/json; charset=utf-8",
+            CacheControl=f"public, max-age={DETAIL_MAX_AGE}",
+        )
+        return len(body)
+
+    def delete(self, ids: list[str]) -> None:
+        """
+        ドキュメントの削除（次にget_restaurant_detailが呼ばれた際に作り直される）
+
+        Parameters
+        ----------
+        ids: list[str]
+            飲食店ID
+        """
+        for i in range(0, len(ids), DELETE_MAX):
+            objects = [{"Key": self.key(id)} for id in ids[i : i + DELETE_MAX]]
+            self._s3.delete_objects(
+                Bucket=self._bucket, Delete={"Objects": objects, "Quiet": True}
+            )
@@ -0,0 +1,167 @@
+import time
+from db_client import DbClient
+
+# master_versionsテーブルでのジャンルマスタの名前
+MASTER_NAME_GENRE = "genre_master"
+
+
+class GenreResolver:
+    """
+    ジャンル名・ジャンルコードの相互変換
+
+    コンテナごとに一度genre_masterを読み込み、名前・コードそれぞれの辞書で引く。
+    master_versionsのバージョンが変わっていれば読み込み直す
+    """
+
+    def __init__(self, db_client: DbClient, check_interval: float = 300):
+
+        # DBクライアント
+        self._db_client = db_client
+
+        # バージョンを確認する間隔（秒）
+        self._check_interval = check_interval
+
+        # 最後にバージョンを確認した時刻
+        self._checked_at = None
+
+        # 読み込んだときのバージョン
+        self._version = None
+
+        # 名前→コード、コード→名前
+        self._codes: dict[str, str] = {}
+        self._names: dict[str, str] = {}
+
+    @property
+    def version(self) -> int | None:
+        """
+        読み込んだときのバージョン。未読み込みならNone
+        """
+        return self._version
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        バージョンが変わっていれば読み込み直す
+
+        前回の確認から確認間隔が経っていなければ何もしない
+
+        Parameters
+        ----------
+        force: bool
+            確認間隔に関わらずバージョンを確認する
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._checked_at is not None
+            and now - self._checked_at < self._check_interval
+        ):
+            return
+
+        version = get_master_version(self._db_client, MASTER_NAME_GENRE)
+        self._checked_at = now
+        if version == self._version:
+            return
+
+        sql = f"""
+SELECT
+    code,
+    name
+FROM
+    genre_master;
+"""
+        res = self._db_client.select(sql, [])
+        self._codes = {r["name"]: r["code"] for r in res["data"]}
+        self._names = {r["code"]: r["name"] for r in res["data"]}
+        self._version = version
+
+    def get_code(self, name: str | None) -> str | None:
+        """
+        ジャンル名からコードを取得
+
+        Parameters
+        ----------
+        name: str | None
+            ジャンル名
+
+        Returns
+        -------
+        str | None
+            該当がなければNone
+        """
+        self.refresh()
+        if name is None:
+            return None
+
+        return self._codes.get(name)
+
+    def get_name(self, code: str | None) -> str | None:
+        """
+        ジャンルコードから名前を取得
+
+        Parameters
+        ----------
+        code: str | None
+            ジャンルコード
+
+        Returns
+        -------
+        str | None
+            該当がなければNone
+        """
+        self.refresh()
+        if code is None:
+            return None
+
+        return self._names.get(code)
+
+
+def get_master_version(db_client: DbClient, name: str) -> int:
+    """
+    マスタデータのバージョンを取得
+
+    Parameters
+    ----------
+    db_client: DbClient
+        DBクライアント
+    name: str
+        マスタ名
+
+    Returns
+    -------
+    int
+        未登録なら0
+    """
+    sql = f"""
+SELECT
+    version
+FROM
+    master_versions
+WHERE
+    name = ?;
+"""
+    res = db_client.select(sql, [name])
+    if len(res["data"]) == 0:
+        return 0
+
+    return int(res["data"][0]["version"])
+
+
+def bump_master_version(db_client: DbClient, name: str) -> None:
+    """
+    マスタデータのバージョンを上げる
+
+    Parameters
+    ----------
+    db_client: DbClient
+        DBクライアント
+    name: str
+        マスタ名
+    """
+    sql = f"""
+INSERT INTO
+    master_versions (name, version)
+VALUES
+    (?, 1)
+ON DUPLICATE KEY UPDATE version = version + 1;
+"""
+    db_client.handle(sql, [name])
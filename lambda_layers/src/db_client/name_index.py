@@ -0,0 +1,148 @@
+import unicodedata
+from db_client import DbClient
+
+# 1回のINSERTで登録するn-gramの最大件数
+INSERT_CHUNK_SIZE = 1000
+
+# 1回のDELETEで古いn-gramを削除する飲食店の最大件数
+DELETE_CHUNK_SIZE = 100
+
+# カタカナ → ひらがな（「ラーメン」と「らーめん」を同じに扱う）
+KATAKANA_TO_HIRAGANA = {c: c - 0x60 for c in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize_name(name: str) -> str:
+    """
+    店名の正規化
+
+    全角・半角の統一（NFKC）、小文字化、カタカナのひらがな化、空白の除去を行う
+
+    >>> normalize_name("ＢＡＲ　ラーメン 一番")
+    'barらーめん一番'
+
+    Parameters
+    ----------
+    name: str
+        店名
+
+    Returns
+    -------
+    str
+    """
+    s = unicodedata.normalize("NFKC", name).lower().translate(KATAKANA_TO_HIRAGANA)
+    return "".join(s.split())
+
+
+def name_grams(name: str) -> set[str]:
+    """
+    店名の索引に登録するn-gram
+
+    文字のbi-gramに加え、1文字での検索用に最後の1文字（uni-gram）を登録する。
+    1文字の検索はn-gramの前方一致で引く
+
+    >>> sorted(name_grams("鳥貴族"))
+    ['族', '貴族', '鳥貴']
+
+    Parameters
+    ----------
+    name: str
+        店名（正規化前）
+
+    Returns
+    -------
+    set[str]
+    """
+    s = normalize_name(name)
+    if len(s) == 0:
+        return set()
+
+    grams = {s[i : i + 2] for i in range(len(s) - 1)}
+    grams.add(s[-1])
+    return grams
+
+
+def query_grams(query: str) -> list[str]:
+    """
+    検索語のbi-gram
+
+    Parameters
+    ----------
+    query: str
+        検索語（正規化前）
+
+    Returns
+    -------
+    list[str]
+        重複を除いたbi-gram。1文字の場合はその1文字のみ
+    """
+    s = normalize_name(query)
+    if len(s) <= 1:
+        return [s] if len(s) == 1 else []
+
+    return sorted({s[i : i + 2] for i in range(len(s) - 1)})
+
+
+class NameIndex:
+    """
+    店名のn-gram転置索引（restaurant_name_gramsテーブル）
+
+    店名が変わった（または未登録の）飲食店のみ、その飲食店のn-gramを入れ替える
+    """
+
+    def __init__(self, db_client: DbClient):
+
+        # DBクライアント
+        self._db_client = db_client
+
+    def upsert(self, names: dict[str, str]) -> None:
+        """
+        飲食店のn-gramを入れ替える
+
+        新しいn-gramを先に登録してから、古いn-gramのみ削除する。
+        入れ替え中・途中で失敗した場合も、飲食店は新旧いずれかの店名で検索できる
+
+        Parameters
+        ----------
+        names: dict[str, str]
+            飲食店ID → 店名（店名が変わった飲食店のみ渡す）
+        """
+        if len(names) == 0:
+            return
+
+        grams = {id: sorted(name_grams(name)) for id, name in names.items()}
+
+        # 新しいn-gramを登録（既にあるものは無視）
+        rows = [(g, id) for id, gs in grams.items() for g in gs]
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[i : i + INSERT_CHUNK_SIZE]
+            sql = f"""
+INSERT IGNORE INTO
+    restaurant_name_grams (gram, id)
+VALUES
+    {', '.join(['(?, ?)'] * len(chunk))};
+"""
+            params = []
+            for g, id in chunk:
+                params.extend([g, id])
+            self._db_client.handle(sql, params)
+
+        # 新しい店名にないn-gramを削除
+        ids = list(grams)
+        for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+            conditions = []
+            params = []
+            for id in ids[i : i + DELETE_CHUNK_SIZE]:
+                if len(grams[id]) == 0:
+                    conditions.append("id = ?")
+                else:
+                    conditions.append(
+                        f"(id = ? AND gram NOT IN ({', '.join(['?'] * len(grams[id]))}))"
+                    )
+                params.extend([id, *grams[id]])
+            sql = f"""
+DELETE FROM
+    restaurant_name_grams
+WHERE
+    {' OR '.join(conditions)};
+"""
+            self._db_client.handle(sql, params)
@@ -0,0 +1,282 @@
+import math
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+# 1コマの分数
+SLOT_MINUTES = 15
+
+# 1日のコマ数
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+# 1週間（月曜0時から）のコマ数と、営業中のビットを並べたバイト数
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+BITMAP_BYTES = WEEK_SLOTS // 8
+
+# 曜日（月曜が0）
+WEEKDAYS = "月火水木金土日"
+
+# 日本標準時（夏時間がないため固定の時差とする）
+JST = timezone(timedelta(hours=9), "JST")
+
+# 営業時間の行の区切り（<br>・改行）とタグ
+LINE_SEPARATOR = re.compile(r"<br\s*/?>|\n", re.IGNORECASE)
+TAG = re.compile(r"<[^>]*>")
+
+# 括弧内の補足（ラストオーダーなど）
+NOTE = re.compile(r"\([^)]*\)")
+
+# 時間帯（例：17:00~翌0:00）。NFKC後の文字で判定する
+TIME_RANGE = re.compile(r"(\d{1,2}):(\d{2})\s*[~〜\-]\s*(翌)?(\d{1,2}):(\d{2})")
+
+# 曜日の接尾辞（「月曜日」の「日」を日曜と読まないよう、曜日を取り出す前に除く）
+WEEKDAY_SUFFIX = re.compile(r"曜日?")
+
+# 曜日の範囲（例：月~金）。接尾辞を除いた後の文字で判定する
+WEEKDAY_RANGE = re.compile(rf"([{WEEKDAYS}])\s*[~〜\-]\s*([{WEEKDAYS}])")
+
+# 曜日と区切りのみの定休日（例：月、火）
+WEEKDAY_LIST = re.compile(rf"[{WEEKDAYS}曜、・,\s]+")
+
+# 祝日に関する語。祝日の暦を持たないため、祝日の営業時間は扱わない
+HOLIDAY_WORDS = ("祝前日", "祝後日", "祝日", "祝")
+
+# 全ての曜日を表す語
+EVERYDAY_WORDS = ("毎日", "全日", "年中無休")
+
+# 曜日の範囲を表す語
+WEEKDAY_WORDS = {"平日": "月~金", "週末": "土日", "休日": "土日"}
+
+
+def parse_schedule(open_hours: str, close_days: str) -> bytes | None:
+    """
+    営業時間・定休日のHTMLを1週間の15分ごとの営業中のビットに変換
+
+    曜日ごとの時間帯、翌日にまたがる時間帯（翌2:00・26:00）、毎週の定休日を扱う。
+    曜日の指定がない行は前の行と同じ曜日（最初の行なら全ての曜日）とする。
+    祝日・祝前日の時間帯と、第n曜日・不定休などの毎週でない休みは扱わない
+
+    >>> b = parse_schedule("月~金: 17:00~翌0:00 (L.O. 23:00)<br/>土、日、祝日: 16:00~23:00", "不定休")
+    >>> is_open(b, week_slot(datetime(2026, 10, 19, 23, 45)))  # 月曜23:45
+    True
+    >>> is_open(b, week_slot(datetime(2026, 10, 25, 23, 0)))  # 日曜23:00
+    False
+    >>> b = parse_schedule("11:00~翌2:00", "日曜日")
+    >>> is_open(b, week_slot(datetime(2026, 10, 25, 12, 0))), is_open(b, week_slot(datetime(2026, 10, 25, 1, 0)))
+    (False, True)
+    >>> b = parse_schedule("月~金: 11:30~14:30<br>17:00~22:00<br>土: 11:30~15:00", "")
+    >>> is_open(b, week_slot(datetime(2026, 10, 23, 18, 0))), is_open(b, week_slot(datetime(2026, 10, 24, 18, 0)))
+    (True, False)
+
+    Parameters
+    ----------
+    open_hours: str
+        営業時間（HTML）
+    close_days: str
+        定休日（HTML）
+
+    Returns
+    -------
+    bytes | None
+        月曜0時からのコマごとのビット（上位ビットから）。時間帯が読み取れなければNone
+    """
+    closed = closed_weekdays(close_days or "")
+
+    bits = bytearray(BITMAP_BYTES)
+    found = False
+    previous = set(range(7))
+    for line in lines(open_hours or ""):
+        ranges = list(TIME_RANGE.finditer(line))
+        if len(ranges) == 0:
+            continue
+
+        # 曜日の指定がなければ前の行の続き（例：月~金: 11:30~14:30<br>17:00~23:00）
+        days = parse_weekdays(line[: ranges[0].start()])
+        if days is not None and len(days) == 0:
+            days = previous
+        previous = days
+        if days is None:
+            continue
+
+        for m in ranges:
+            start = int(m[1]) * 60 + int(m[2])
+            end = int(m[4]) * 60 + int(m[5])
+            if m[3] is not None or end <= start:
+                end += 24 * 60
+            end = min(end, start + 24 * 60)
+
+            found = True
+            for day in days - closed:
+                base = day * SLOTS_PER_DAY
+                for s in range(start // SLOT_MINUTES, math.ceil(end / SLOT_MINUTES)):
+                    i = (base + s) % WEEK_SLOTS
+                    bits[i >> 3] |= 0x80 >> (i & 7)
+
+    if not found:
+        return None
+
+    return bytes(bits)
+
+
+def lines(html: str) -> list[str]:
+    """
+    HTMLを行に分け、タグと括弧内の補足を除いて正規化
+
+    Parameters
+    ----------
+    html: str
+
+    Returns
+    -------
+    list[str]
+        注記（※）と空行は含まない
+    """
+    results = []
+    for line in LINE_SEPARATOR.split(html):
+        line = unicodedata.normalize("NFKC", TAG.sub("", line))
+        line = NOTE.sub("", line).strip()
+        if line == "" or line.startswith("※"):
+            continue
+        results.append(line)
+
+    return results
+
+
+def parse_weekdays(text: str) -> set[int] | None:
+    """
+    時間帯の前の曜日の指定を解析
+
+    >>> sorted(parse_weekdays("月曜日~金曜日: "))
+    [0, 1, 2, 3, 4]
+    >>> sorted(parse_weekdays("土、日、祝日: ")), parse_weekdays("祝日: "), parse_weekdays("ランチ ")
+    ([5, 6], None, set())
+
+    Parameters
+    ----------
+    text: str
+        例：月~金:、土、日、祝日:
+
+    Returns
+    -------
+    set[int] | None
+        曜日（月曜が0）。指定がなければ空、祝日のみの指定ならNone
+    """
+    for word in EVERYDAY_WORDS:
+        if word in text:
+            return set(range(7))
+    for word, replaced in WEEKDAY_WORDS.items():
+        text = text.replace(word, replaced)
+
+    holiday = False
+    for word in HOLIDAY_WORDS:
+        if word in text:
+            holiday = True
+            text = text.replace(word, "")
+    text = WEEKDAY_SUFFIX.sub("", text)
+
+    days = set()
+    for m in WEEKDAY_RANGE.finditer(text):
+        start, end = WEEKDAYS.index(m[1]), WEEKDAYS.index(m[2])
+        days.update(d % 7 for d in range(start, start + (end - start) % 7 + 1))
+    days.update(WEEKDAYS.index(c) for c in WEEKDAY_RANGE.sub("", text) if c in WEEKDAYS)
+
+    if len(days) == 0 and holiday:
+        return None
+
+    return days
+
+
+def closed_weekdays(close_days: str) -> set[int]:
+    """
+    毎週の定休日
+
+    >>> sorted(closed_weekdays("月曜日")), sorted(closed_weekdays("火曜日、水曜日"))
+    ([0], [1, 2])
+    >>> sorted(closed_weekdays("日曜・祝日<br>第3月曜日")), closed_weekdays("不定休")
+    ([6], set())
+
+    Parameters
+    ----------
+    close_days: str
+        定休日（HTML）
+
+    Returns
+    -------
+    set[int]
+        曜日（月曜が0）。第n曜日・不定休などは含まない
+    """
+    days = set()
+    for line in lines(close_days):
+        if "第" in line or "不定" in line:
+            continue
+        for word in HOLIDAY_WORDS:
+            line = line.replace(word, "")
+        if "曜" in line or WEEKDAY_LIST.fullmatch(line):
+            line = WEEKDAY_SUFFIX.sub("", line)
+            days.update(WEEKDAYS.index(c) for c in line if c in WEEKDAYS)
+
+    return days
+
+
+def week_slot(dt: datetime) -> int:
+    """
+    日時の1週間の中でのコマ
+
+    タイムゾーンのない日時は日本時間とみなす
+
+    >>> week_slot(datetime(2026, 10, 20, 12, 10))  # 火曜12:10
+    144
+
+    Parameters
+    ----------
+    dt: datetime
+
+    Returns
+    -------
+    int
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(JST)
+
+    return dt.weekday() * SLOTS_PER_DAY + (dt.hour * 60 + dt.minute) // SLOT_MINUTES
+
+
+def is_open(bits: bytes | None, slot: int) -> bool:
+    """
+    コマが営業中か
+
+    Parameters
+    ----------
+    bits: bytes | None
+        parse_scheduleの結果。Noneは営業時間が不明
+    slot: int
+        week_slotの結果
+
+    Returns
+    -------
+    bool
+        営業時間が不明ならFalse
+    """
+    if bits is None:
+        return False
+
+    return bits[slot >> 3] & (0x80 >> (slot & 7)) != 0
+
+
+def hex_digit(slot: int) -> tuple[int, int]:
+    """
+    16進数の文字列で保存した場合の、コマの位置とビット
+
+    DBでSUBSTRINGとビット演算で判定するために使う
+
+    Parameters
+    ----------
+    slot: int
+        week_slotの結果
+
+    Returns
+    -------
+    tuple[int, int]
+        文字の位置（1から）, その文字の値でのビット
+    """
+    return slot // 4 + 1, 8 >> (slot % 4)
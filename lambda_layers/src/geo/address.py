@@ -0,0 +1,100 @@
+import re
+import unicodedata
+
+# 数字の間で区切りとして使われるハイフン類
+_DASHES = "‐‑‒–—―−ー─━-"
+
+# 漢数字
+_KANJI_DIGITS = {
+    "〇": 0,
+    "一": 1,
+    "二": 2,
+    "三": 3,
+    "四": 4,
+    "五": 5,
+    "六": 6,
+    "七": 7,
+    "八": 8,
+    "九": 9,
+}
+
+
+def normalize_address(address: str) -> str:
+    """
+    住所の正規化
+
+    表記揺れを吸収してキャッシュのキーを揃える。
+    - 全角英数字・記号を半角に（NFKC）
+    - 数字の間のハイフン類を「-」に統一
+    - 漢数字の丁目・条を算用数字に
+    - 「丁目」「番地」「番」「号」「の」を「-」区切りに
+    - 番地より後ろの建物名・階数を除去
+    - 空白を除去
+
+    Parameters
+    ----------
+    address: str
+        住所
+
+    Returns
+    -------
+    str
+
+    Examples
+    --------
+    >>> normalize_address("北海道札幌市北区北七条西４丁目１－２ とりまるビル２Ｆ")
+    '北海道札幌市北区北7条西4-1-2'
+    """
+    s = unicodedata.normalize("NFKC", address).strip()
+
+    # 数字の間のハイフン類
+    s = re.sub(rf"(?<=\d)\s*[{_DASHES}]\s*(?=\d)", "-", s)
+
+    # 漢数字の丁目と、札幌等の「北七条西」の形の条
+    s = re.sub(
+        r"([〇一二三四五六七八九十]+)丁目",
+        lambda m: f"{kanji_to_int(m.group(1))}丁目",
+        s,
+    )
+    s = re.sub(
+        r"(?<=[東西南北])([〇一二三四五六七八九十]+)条(?=[東西南北])",
+        lambda m: f"{kanji_to_int(m.group(1))}条",
+        s,
+    )
+
+    # 丁目・番地・号の区切り
+    s = re.sub(r"(\d+)\s*丁目\s*", r"\1-", s)
+    s = re.sub(r"(\d+)\s*番地?(?!町)\s*", r"\1-", s)
+    s = re.sub(r"(\d+)\s*号", r"\1", s)
+    s = re.sub(r"(?<=\d)-?の(?=\d)", "-", s)
+    s = re.sub(r"-+", "-", s)
+
+    # 番地の後ろ（建物名・階数）を除去
+    m = re.search(r"\d+(?:-\d+)+", s)
+    if m is not None:
+        s = s[: m.end()]
+
+    return re.sub(r"\s+", "", s).rstrip("-")
+
+
+def kanji_to_int(kanji: str) -> int:
+    """
+    漢数字（99まで）を数値に変換
+
+    Parameters
+    ----------
+    kanji: str
+        漢数字
+
+    Returns
+    -------
+    int
+    """
+    if "十" not in kanji:
+        n = 0
+        for c in kanji:
+            n = n * 10 + _KANJI_DIGITS[c]
+        return n
+
+    tens, _, ones = kanji.partition("十")
+    return (_KANJI_DIGITS[tens] if tens else 1) * 10 + (_KANJI_DIGITS[ones] if ones else 0)
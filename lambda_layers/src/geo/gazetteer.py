@@ -0,0 +1,255 @@
+"""
+住所辞書（位置参照情報）によるオフラインのジオコーディング
+
+国土交通省の位置参照情報のCSV（大字・町丁目レベル、街区レベル）から
+正規化した住所をキーとするソート済み配列のインデックスを作成し、
+mmapで開いて最長一致で緯度経度を引く
+
+インデックスの形式（リトルエンディアン）
+    ヘッダー: マジック(4バイト), 件数n(uint32), キー領域のバイト数(uint32)
+    オフセット: (n + 1) x uint32。キー領域内の各キーの開始位置
+    レコード: n x (緯度float32, 経度float32, 階層uint8)
+    キー領域: UTF-8のキーをバイト順にソートして連結
+
+Usage:
+    python gazetteer.py <出力先> <CSV> [<CSV> ...]
+
+Examples:
+    python gazetteer.py gazetteer.idx ./csv/*.csv
+"""
+
+import csv
+import mmap
+import os
+import struct
+import sys
+from address import normalize_address
+
+# マジック
+MAGIC = b"GZT1"
+
+# ヘッダー
+HEADER = struct.Struct("<4sII")
+
+# オフセット
+OFFSET = struct.Struct("<I")
+
+# レコード
+RECORD = struct.Struct("<ffB")
+
+# 階層：町域（大字）
+LEVEL_TOWN = 1
+
+# 階層：丁目
+LEVEL_CHOME = 2
+
+# 階層：街区
+LEVEL_BLOCK = 3
+
+# インデックスの既定の配置先（レイヤー内）
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.idx")
+
+
+class Gazetteer:
+    """
+    住所辞書
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count, keys_size = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise Exception(f"住所辞書の形式が不正です。{path}")
+
+        # 各領域の開始位置
+        self._offsets_pos = HEADER.size
+        self._records_pos = self._offsets_pos + OFFSET.size * (self._count + 1)
+        self._keys_pos = self._records_pos + RECORD.size * self._count
+
+    @classmethod
+    def open(cls, path: str | None = None) -> "Gazetteer | None":
+        """
+        住所辞書を開く
+
+        Parameters
+        ----------
+        path: str | None
+            インデックスのパス。Noneなら環境変数GAZETTEER_PATH、なければレイヤー内
+
+        Returns
+        -------
+        Gazetteer | None
+            インデックスがなければNone
+        """
+        if path is None:
+            path = os.environ.get("GAZETTEER_PATH", DEFAULT_PATH)
+        if not os.path.exists(path):
+            return None
+
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def lookup(self, address: str) -> dict | None:
+        """
+        住所から緯度経度を取得
+
+        正規化した住所の先頭から最も長く一致するキーの座標を返す。
+        数字の途中で区切れる一致（「西4」と「西40」など）は採用しない
+
+        Parameters
+        ----------
+        address: str
+            住所
+
+        Returns
+        -------
+        dict | None
+            lat: float 緯度
+            lng: float 経度
+            level: int 一致した階層
+            key: str 一致したキー
+            一致しなければNone
+        """
+        s = normalize_address(address)
+        for n in range(len(s), 0, -1):
+            # 数字の途中で区切れる場合はスキップ
+            if n < len(s) and s[n - 1].isdigit() and s[n].isdigit():
+                continue
+
+            i = self.__find(s[:n].encode("utf-8"))
+            if i is None:
+                continue
+
+            lat, lng, level = RECORD.unpack_from(
+                self._mm, self._records_pos + RECORD.size * i
+            )
+            return {"lat": lat, "lng": lng, "level": level, "key": s[:n]}
+
+        return None
+
+    def __key(self, i: int) -> bytes:
+        """
+        i番目のキー
+
+        Parameters
+        ----------
+        i: int
+
+        Returns
+        -------
+        bytes
+        """
+        start, end = struct.unpack_from("<II", self._mm, self._offsets_pos + OFFSET.size * i)
+        return self._mm[self._keys_pos + start : self._keys_pos + end]
+
+    def __find(self, key: bytes) -> int | None:
+        """
+        キーの二分探索
+
+        Parameters
+        ----------
+        key: bytes
+
+        Returns
+        -------
+        int | None
+            一致したキーの位置。なければNone
+        """
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = self.__key(mid)
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return mid
+
+        return None
+
+
+def build(csv_paths: list[str], out_path: str) -> int:
+    """
+    位置参照情報のCSVからインデックスを作成
+
+    大字・町丁目レベルと街区レベルのCSVを列名で判別する。
+    同じキーが複数あれば座標を平均し、丁目しかない町域は丁目の平均を町域の座標とする
+
+    Parameters
+    ----------
+    csv_paths: list[str]
+        CSVのパス（Shift_JIS）
+    out_path: str
+        出力先
+
+    Returns
+    -------
+    int
+        登録件数
+    """
+    # キーごとの座標の合計・件数・階層
+    entries: dict[str, list] = {}
+    towns: dict[str, list] = {}
+
+    def add(d: dict, key: str, lat: float, lng: float, level: int) -> None:
+        e = d.setdefault(key, [0.0, 0.0, 0, level])
+        e[0] += lat
+        e[1] += lng
+        e[2] += 1
+
+    for path in csv_paths:
+        with open(path, "r", encoding="cp932", newline="") as f:
+            for row in csv.DictReader(f):
+                lat = float(row["緯度"])
+                lng = float(row["経度"])
+                base = row["都道府県名"] + row["市区町村名"]
+
+                # 街区レベル
+                if "街区符号・地番" in row:
+                    town = row["大字・丁目名"] + row.get("小字・通称名", "")
+                    key = normalize_address(f"{base}{town}{row['街区符号・地番']}番")
+                    add(entries, key, lat, lng, LEVEL_BLOCK)
+                    continue
+
+                # 大字・町丁目レベル
+                name = row["大字町丁目名"]
+                if row.get("大字・字・丁目区分コード") == "3":
+                    add(entries, normalize_address(base + name), lat, lng, LEVEL_CHOME)
+                    town = name[: name.rfind("丁目")].rstrip("〇一二三四五六七八九十0123456789")
+                    add(towns, normalize_address(base + town), lat, lng, LEVEL_TOWN)
+                else:
+                    add(entries, normalize_address(base + name), lat, lng, LEVEL_TOWN)
+
+    # 丁目のみの町域
+    for key, e in towns.items():
+        entries.setdefault(key, e)
+
+    # キーのバイト順にソートして書き出し
+    items = sorted((k.encode("utf-8"), e) for k, e in entries.items() if k != "")
+    keys = b"".join(k for k, _ in items)
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(items), len(keys)))
+        pos = 0
+        for k, _ in items:
+            f.write(OFFSET.pack(pos))
+            pos += len(k)
+        f.write(OFFSET.pack(pos))
+        for _, (lat, lng, n, level) in items:
+            f.write(RECORD.pack(lat / n, lng / n, level))
+        f.write(keys)
+
+    return len(items)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("ex)python gazetteer.py gazetteer.idx ./csv/*.csv")
+        sys.exit(1)
+
+    count = build(sys.argv[2:], sys.argv[1])
+    print(f"{count}件を登録しました。{sys.argv[1]}")
@@ -0,0 +1,414 @@
+import time
+import urllib.parse
+from collections import OrderedDict
+from decimal import Decimal
+import boto3
+import requests
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from address import normalize_address
+from gazetteer import Gazetteer, LEVEL_CHOME
+
+# Google Geocoding APIのURL
+GEOCODING_API_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# batch_get_itemで一度に取得できる最大件数
+BATCH_GET_MAX = 100
+
+# batch_write_itemで一度に書き込める最大件数
+BATCH_WRITE_MAX = 25
+
+# 未処理分の再試行回数。超えた分は捨て、件数をstatsで返す
+BATCH_RETRY_MAX = 5
+
+
+class Geocoder:
+    """
+    住所から緯度経度を取得
+
+    コンテナ内のLRU → DynamoDB → 住所辞書（オフライン） → Google Geocoding APIの順に参照し、
+    取得できた階層より手前のキャッシュへ書き戻す。
+    住所辞書の結果は再計算が安価なため、DynamoDBには保存しない。
+    キーは正規化した住所とし、正規化前の住所で登録された既存のDynamoDBの項目も参照する
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        api_key_path: str,
+        lru_size: int = 2048,
+        gazetteer: Gazetteer | None = None,
+        gazetteer_min_level: int = LEVEL_CHOME,
+    ):
+
+        # DynamoDBのテーブル名
+        self._table_name = table_name
+
+        # GCP APIキーのSSMパラメータ名
+        self._api_key_path = api_key_path
+
+        # GCP APIキー。初回のAPI呼び出し時に取得
+        self._api_key = None
+
+        # LRUキャッシュ
+        self._lru: OrderedDict[str, dict] = OrderedDict()
+        self._lru_size = lru_size
+
+        # 住所辞書と、採用する最低の階層
+        self._gazetteer = gazetteer
+        self._gazetteer_min_level = gazetteer_min_level
+
+        self._dynamodb = boto3.client("dynamodb")
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+        self.reset_stats()
+
+    def get_latlng(self, address: str) -> dict:
+        """
+        住所から緯度経度を取得
+
+        Parameters
+        ----------
+        address: str
+            住所
+
+        Returns
+        -------
+        dict
+            lat: float 緯度
+            lng: float 経度
+        """
+        return self.get_latlngs([address])[address]
+
+    def get_latlngs(self, addresses: list[str]) -> dict[str, dict]:
+        """
+        複数の住所からまとめて緯度経度を取得
+
+        Parameters
+        ----------
+        addresses: list[str]
+            住所リスト
+
+        Returns
+        -------
+        dict[str, dict]
+            住所（正規化前）ごとの緯度経度
+        """
+        # 正規化した住所ごとに元の住所をまとめる
+        keys = self.__group(addresses)
+
+        # キャッシュ（LRU・DynamoDB・住所辞書）
+        results = self.__find_cached(keys)
+
+        # Google Geocoding API
+        misses = [k for k in keys if k not in results]
+        if len(misses) > 0:
+            fetched = {}
+            try:
+                for k in misses:
+                    latlng = self.fetch_from_api(k)
+                    self._stats["api_calls"] += 1
+                    results[k] = latlng
+                    fetched[k] = latlng
+            finally:
+                # 途中で失敗しても取得できた分は保存する
+                if len(fetched) > 0:
+                    self.put_latlngs(fetched)
+
+        return {a: results[k] for k, arr in keys.items() for a in arr}
+
+    def get_cached_latlngs(self, addresses: list[str]) -> dict[str, dict]:
+        """
+        APIを呼ばずにキャッシュ（LRU・DynamoDB・住所辞書）から緯度経度を取得
+
+        Parameters
+        ----------
+        addresses: list[str]
+            住所リスト
+
+        Returns
+        -------
+        dict[str, dict]
+            取得できた正規化後の住所ごとの緯度経度
+        """
+        return self.__find_cached(self.__group(addresses))
+
+    def put_latlngs(self, latlngs: dict[str, dict]) -> None:
+        """
+        APIで取得した緯度経度をLRUとDynamoDBへ保存
+
+        Parameters
+        ----------
+        latlngs: dict[str, dict]
+            正規化後の住所ごとの緯度経度
+        """
+        for k, latlng in latlngs.items():
+            self.__lru_put(k, latlng)
+        self.__batch_put(list(latlngs.items()))
+
+    def fetch_from_api(self, address: str) -> dict:
+        """
+        Google Geocoding APIで住所から緯度経度を取得
+
+        Parameters
+        ----------
+        address: str
+            住所
+
+        Returns
+        -------
+        dict
+            lat: float 緯度
+            lng: float 経度
+        """
+        if self._api_key is None:
+            res = boto3.client("ssm").get_parameter(
+                Name=self._api_key_path, WithDecryption=True
+            )
+            self._api_key = res["Parameter"]["Value"]
+
+        url_params = {"address": address, "key": self._api_key}
+        url = f"{GEOCODING_API_URL}?{urllib.parse.urlencode(url_params)}"
+        data = requests.get(url).json()
+        try:
+            location = data["results"][0]["geometry"]["location"]
+        except (KeyError, IndexError):
+            raise Exception(
+                f"緯度経度の取得に失敗。\n{address}\nstatus: {data.get('status')}"
+            )
+
+        return {"lat": location["lat"], "lng": location["lng"]}
+
+    def stats(self) -> dict:
+        """
+        キャッシュのヒット状況
+
+        Returns
+        -------
+        dict
+            lookups: int 正規化後の住所の件数
+            lru_hits: int LRUでのヒット数
+            dynamodb_hits: int DynamoDBでのヒット数
+            gazetteer_hits: int 住所辞書でのヒット数
+            api_calls: int Google Geocoding APIの呼び出し数
+            dynamodb_unprocessed_reads: int 再試行しても取得できなかったDynamoDBの件数
+            dynamodb_unprocessed_writes: int 再試行しても保存できなかったDynamoDBの件数（次回もAPIを呼ぶ）
+            hit_rate: float キャッシュのヒット率（%）
+        """
+        s = dict(self._stats)
+        hits = s["lru_hits"] + s["dynamodb_hits"] + s["gazetteer_hits"]
+        s["hit_rate"] = hits / s["lookups"] * 100 if s["lookups"] > 0 else 0.0
+        return s
+
+    def reset_stats(self) -> None:
+        """
+        ヒット状況のリセット
+        """
+        self._stats = {
+            "lookups": 0,
+            "lru_hits": 0,
+            "dynamodb_hits": 0,
+            "gazetteer_hits": 0,
+            "api_calls": 0,
+            "dynamodb_unprocessed_reads": 0,
+            "dynamodb_unprocessed_writes": 0,
+        }
+
+    def __group(self, addresses: list[str]) -> dict[str, list[str]]:
+        """
+        正規化した住所ごとに元の住所をまとめる
+
+        Parameters
+        ----------
+        addresses: list[str]
+            住所リスト
+
+        Returns
+        -------
+        dict[str, list[str]]
+        """
+        keys: dict[str, list[str]] = {}
+        for a in addresses:
+            keys.setdefault(normalize_address(a), []).append(a)
+        self._stats["lookups"] += len(keys)
+
+        return keys
+
+    def __find_cached(self, keys: dict[str, list[str]]) -> dict[str, dict]:
+        """
+        LRU → DynamoDB → 住所辞書の順に参照
+
+        Parameters
+        ----------
+        keys: dict[str, list[str]]
+            正規化した住所ごとの元の住所
+
+        Returns
+        -------
+        dict[str, dict]
+            取得できた正規化後の住所ごとの緯度経度
+        """
+        # LRU
+        results: dict[str, dict] = {}
+        for key in keys:
+            latlng = self.__lru_get(key)
+            if latlng is not None:
+                self._stats["lru_hits"] += 1
+                results[key] = latlng
+
+        # DynamoDB
+        misses = [k for k in keys if k not in results]
+        if len(misses) > 0:
+            legacy = {a: k for k in misses for a in keys[k] if a != k}
+            items = self.__batch_get(misses + list(legacy.keys()))
+            to_migrate = []
+            for k in misses:
+                latlng = items.get(k)
+                if latlng is None:
+                    # 正規化前の住所で登録されていれば正規化後のキーで登録し直す
+                    latlng = next(
+                        (items[a] for a in keys[k] if a in items and a in legacy), None
+                    )
+                    if latlng is not None:
+                        to_migrate.append((k, latlng))
+                if latlng is not None:
+                    self._stats["dynamodb_hits"] += 1
+                    results[k] = latlng
+                    self.__lru_put(k, latlng)
+            if len(to_migrate) > 0:
+                self.__batch_put(to_migrate)
+
+        # 住所辞書
+        misses = [k for k in keys if k not in results]
+        if self._gazetteer is not None:
+            for k in misses:
+                found = self._gazetteer.lookup(k)
+                if found is None or found["level"] < self._gazetteer_min_level:
+                    continue
+                self._stats["gazetteer_hits"] += 1
+                latlng = {"lat": found["lat"], "lng": found["lng"]}
+                results[k] = latlng
+                self.__lru_put(k, latlng)
+
+        return results
+
+    def __lru_get(self, key: str) -> dict | None:
+        """
+        LRUから取得
+
+        Parameters
+        ----------
+        key: str
+            正規化した住所
+
+        Returns
+        -------
+        dict | None
+        """
+        latlng = self._lru.get(key)
+        if latlng is not None:
+            self._lru.move_to_end(key)
+
+        return latlng
+
+    def __lru_put(self, key: str, latlng: dict) -> None:
+        """
+        LRUへ格納
+
+        Parameters
+        ----------
+        key: str
+            正規化した住所
+        latlng: dict
+            緯度経度
+        """
+        self._lru[key] = latlng
+        self._lru.move_to_end(key)
+        if len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
+
+    def __batch_get(self, addresses: list[str]) -> dict[str, dict]:
+        """
+        DynamoDBからまとめて取得
+
+        Parameters
+        ----------
+        addresses: list[str]
+            住所リスト
+
+        Returns
+        -------
+        dict[str, dict]
+            登録されていた住所ごとの緯度経度
+        """
+        results = {}
+        addresses = list(dict.fromkeys(addresses))
+        for i in range(0, len(addresses), BATCH_GET_MAX):
+            request = {
+                self._table_name: {
+                    "Keys": [
+                        {"address": {"S": a}} for a in addresses[i : i + BATCH_GET_MAX]
+                    ]
+                }
+            }
+
+            # 未処理分は待ってから再試行
+            for retry in range(BATCH_RETRY_MAX):
+                res = self._dynamodb.batch_get_item(RequestItems=request)
+                for item in res["Responses"].get(self._table_name, []):
+                    results[item["address"]["S"]] = {
+                        "lat": float(self._deserializer.deserialize(item["lat"])),
+                        "lng": float(self._deserializer.deserialize(item["lng"])),
+                    }
+                request = res.get("UnprocessedKeys", {})
+                if len(request) == 0 or retry + 1 == BATCH_RETRY_MAX:
+                    break
+                time.sleep(0.1 * 2**retry)
+
+            # 再試行しても残った分は未登録として扱う（住所辞書・APIで取得する）
+            if len(request) > 0:
+                count = len(request[self._table_name]["Keys"])
+                self._stats["dynamodb_unprocessed_reads"] += count
+                print(f"DynamoDBから取得できなかった住所があります。{count}件")
+
+        return results
+
+    def __batch_put(self, latlngs: list[tuple[str, dict]]) -> None:
+        """
+        DynamoDBへまとめて保存
+
+        Parameters
+        ----------
+        latlngs: list[tuple[str, dict]]
+            正規化した住所と緯度経度の組
+        """
+        s = self._serializer
+        for i in range(0, len(latlngs), BATCH_WRITE_MAX):
+            request = {
+                self._table_name: [
+                    {
+                        "PutRequest": {
+                            "Item": {
+                                "address": s.serialize(a),
+                                "lat": s.serialize(Decimal(str(latlng["lat"]))),
+                                "lng": s.serialize(Decimal(str(latlng["lng"]))),
+                            }
+                        }
+                    }
+                    for a, latlng in latlngs[i : i + BATCH_WRITE_MAX]
+                ]
+            }
+
+            # 未処理分は待ってから再試行
+            for retry in range(BATCH_RETRY_MAX):
+                res = self._dynamodb.batch_write_item(RequestItems=request)
+                request = res.get("UnprocessedItems", {})
+                if len(request) == 0 or retry + 1 == BATCH_RETRY_MAX:
+                    break
+                time.sleep(0.1 * 2**retry)
+
+            # 再試行しても残った分は保存しない（LRUには残る）
+            if len(request) > 0:
+                count = len(request[self._table_name])
+                self._stats["dynamodb_unprocessed_writes"] += count
+                print(f"DynamoDBへ保存できなかった住所があります。{count}件")
@@ -0,0 +1,214 @@
+import math
+
+# グリッドの1辺（マイクロ度）。0.01度 ≒ 緯度方向1.1km
+CELL_MICRO_DEG = 10000
+
+# 経度方向のセル数
+LNG_CELLS = 360 * 1000000 // CELL_MICRO_DEG
+
+# 被覆する緯度方向の行数の上限。超える場合は被覆せず範囲指定のみで検索する
+MAX_COVER_ROWS = 50
+
+# 緯度1度あたりの距離（km）
+KM_PER_DEG = 6371 * math.pi / 180
+
+
+def to_micro(deg: float) -> int:
+    """
+    度をマイクロ度の整数に変換
+
+    DBのDECIMAL型（小数6桁まで）と同じ値になるよう、浮動小数点の誤差を丸める
+
+    Parameters
+    ----------
+    deg: float
+        度
+
+    Returns
+    -------
+    int
+    """
+    return round(deg * 1000000)
+
+
+def cell_row(lat: float) -> int:
+    """
+    緯度からグリッドの行番号を取得
+
+    Parameters
+    ----------
+    lat: float
+        緯度
+
+    Returns
+    -------
+    int
+    """
+    return (to_micro(lat) + 90 * 1000000) // CELL_MICRO_DEG
+
+
+def cell_col(lng: float) -> int:
+    """
+    経度からグリッドの列番号を取得
+
+    Parameters
+    ----------
+    lng: float
+        経度
+
+    Returns
+    -------
+    int
+    """
+    return (to_micro(lng) + 180 * 1000000) // CELL_MICRO_DEG
+
+
+def cell_id(lat: float, lng: float) -> int:
+    """
+    緯度経度からグリッドのセルIDを取得
+
+    行優先で採番するため、同じ行の隣り合うセルは連番になる。
+    DBでは FLOOR((latitude + 90) * 100) * 36000 + FLOOR((longitude + 180) * 100) と同じ値
+
+    >>> cell_id(35.681236, 139.767125)
+    452479976
+
+    Parameters
+    ----------
+    lat: float
+        緯度
+    lng: float
+        経度
+
+    Returns
+    -------
+    int
+    """
+    return cell_row(lat) * LNG_CELLS + cell_col(lng)
+
+
+def row_south(row: int) -> float:
+    """
+    グリッドの行の南端の緯度
+
+    Parameters
+    ----------
+    row: int
+        行番号
+
+    Returns
+    -------
+    float
+    """
+    return row * CELL_MICRO_DEG / 1000000 - 90
+
+
+def col_west(col: int) -> float:
+    """
+    グリッドの列の西端の経度
+
+    Parameters
+    ----------
+    col: int
+        列番号
+
+    Returns
+    -------
+    float
+    """
+    return col * CELL_MICRO_DEG / 1000000 - 180
+
+
+def ring_ranges(row: int, col: int, r: int) -> list[tuple[int, int]]:
+    """
+    中心のセルから距離rのリング上のセルIDの区間
+
+    Parameters
+    ----------
+    row: int
+        中心の行番号
+    col: int
+        中心の列番号
+    r: int
+        リングの距離（セル数）
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        セルIDの区間（両端を含む）
+    """
+    if r == 0:
+        c = row * LNG_CELLS + col
+        return [(c, c)]
+
+    # 上下の行は連続した区間、間の行は左右の2セル
+    results = []
+    for rr in (row - r, row + r):
+        results.append((rr * LNG_CELLS + col - r, rr * LNG_CELLS + col + r))
+    for rr in range(row - r + 1, row + r):
+        results.append((rr * LNG_CELLS + col - r, rr * LNG_CELLS + col - r))
+        results.append((rr * LNG_CELLS + col + r, rr * LNG_CELLS + col + r))
+
+    return results
+
+
+def cover_ranges(
+    lat_min: float, lat_max: float, lng_min: float, lng_max: float
+) -> list[tuple[int, int]] | None:
+    """
+    範囲を覆うセルIDの区間を取得
+
+    Parameters
+    ----------
+    lat_min: float
+        最小緯度
+    lat_max: float
+        最大緯度
+    lng_min: float
+        最小経度
+    lng_max: float
+        最大経度
+
+    Returns
+    -------
+    list[tuple[int, int]] | None
+        行ごとのセルIDの区間（両端を含む）。行数が上限を超える場合はNone
+    """
+    row_min = cell_row(lat_min)
+    row_max = cell_row(lat_max)
+    if row_max - row_min + 1 > MAX_COVER_ROWS:
+        return None
+
+    col_min = cell_col(lng_min)
+    col_max = cell_col(lng_max)
+
+    return [
+        (r * LNG_CELLS + col_min, r * LNG_CELLS + col_max)
+        for r in range(row_min, row_max + 1)
+    ]
+
+
+def approx_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    正距円筒近似による2点間の距離（km）
+
+    地図の表示範囲程度の距離ではhaversineとの差は無視できる
+
+    Parameters
+    ----------
+    lat1: float
+        緯度1
+    lng1: float
+        経度1
+    lat2: float
+        緯度2
+    lng2: float
+        経度2
+
+    Returns
+    -------
+    float
+    """
+    x = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return KM_PER_DEG * math.hypot(x, y)
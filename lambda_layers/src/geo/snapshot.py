@@ -0,0 +1,816 @@
+import bisect
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+import boto3
+from botocore.exceptions import ClientError
+from grid import (
+    KM_PER_DEG,
+    LNG_CELLS,
+    cell_col,
+    cell_id,
+    cell_row,
+    col_west,
+    cover_ranges,
+    ring_ranges,
+    row_south,
+)
+
+# ファイル識別子
+MAGIC = b"RSS1"
+
+# ヘッダー（識別子, バージョン, 件数, セル数, 文字列数, 文字列の合計バイト数）
+# バージョンは内容のハッシュ（飲食店が変わらなければ同じ値）
+HEADER = struct.Struct("<4sQIIII")
+
+# 返却する最大件数
+LIMIT_DEFAULT = 1000
+
+# 駐車場ありの場合の駐車場欄の先頭（例：「あり ：10台」）
+PARKING_AVAILABLE_PREFIX = "あり"
+
+# 距離を丸める単位（km）。DBと同じく小数6桁
+DISTANCE_UNIT = 0.000001
+
+# クラスタの階層（基本のセルを何個分まとめるか）。0.04度〜2.56度
+CLUSTER_FACTORS = (4, 16, 64, 256)
+
+# 1回の応答に含めるクラスタのセル数の目安。これを超えない最も細かい階層を使う
+CLUSTER_MAX_CELLS = 400
+
+# クラスタの階層（階層の倍率, クラスタ数）
+CLUSTER_LEVEL = struct.Struct("<II")
+
+# 1週間の営業時間のバイト数（15分ごとの営業中のビット。opening_hoursと同じ形式）
+OPENING_HOURS_BYTES = 84
+
+
+class RestaurantSnapshot:
+    """
+    完了済み飲食店のスナップショット
+
+    セルID順に並べた列ごとの配列（緯度経度はfloat32、文字列は文字列表の番号）をmmapで参照する。
+    ファイル形式は以下をリトルエンディアンで連結したもの
+        ヘッダー
+        セルID uint32 × セル数（昇順）
+        セルの先頭行 uint32 × (セル数 + 1)
+        緯度 float32 × 件数
+        経度 float32 × 件数
+        ID・店名・ジャンル・駐車場 uint32 × 件数 × 4（文字列表の番号）
+        サムネイルの有無 uint8 × 件数（4バイト境界まで埋める）
+        文字列の開始位置 uint32 × (文字列数 + 1)
+        文字列（UTF-8）（4バイト境界まで埋める）
+        クラスタの階層数 uint32（以降は省略可）
+        階層ごとに
+            倍率 uint32, クラスタ数 uint32
+            セルID uint32 × クラスタ数（昇順）
+            件数 uint32 × クラスタ数
+            重心の緯度・経度 float32 × クラスタ数 × 2
+            最も多いジャンル uint32 × クラスタ数（文字列表の番号）
+        営業時間の種類数 uint32（以降は省略可）
+        営業時間の番号 uint32 × 件数（0は不明）
+        営業時間 84バイト × 種類数（同じ営業時間は1つにまとめる）
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n, n_cells, n_strings, n_bytes = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise Exception(f"スナップショットの形式が不正。{path}")
+        self.version = version
+        self._n = n
+
+        view = memoryview(self._mm)
+        pos = HEADER.size
+
+        def take(fmt: str, count: int, size: int) -> memoryview:
+            nonlocal pos
+            v = view[pos : pos + count * size].cast(fmt)
+            pos += count * size
+            return v
+
+        self._cells = take("I", n_cells, 4)
+        self._starts = take("I", n_cells + 1, 4)
+        self._lats = take("f", n, 4)
+        self._lngs = take("f", n, 4)
+        self._ids = take("I", n, 4)
+        self._names = take("I", n, 4)
+        self._genres = take("I", n, 4)
+        self._parkings = take("I", n, 4)
+        self._thumbnails = take("B", n, 1)
+        pos += -n % 4
+        self._str_offsets = take("I", n_strings + 1, 4)
+        self._str_base = pos
+        pos += n_bytes + -n_bytes % 4
+
+        # クラスタの階層（倍率の昇順）
+        self._levels = []
+        if pos < len(self._mm):
+            (n_levels,) = struct.unpack_from("<I", self._mm, pos)
+            pos += 4
+            for _ in range(n_levels):
+                factor, n_clusters = CLUSTER_LEVEL.unpack_from(self._mm, pos)
+                pos += CLUSTER_LEVEL.size
+                self._levels.append(
+                    (
+                        factor,
+                        take("I", n_clusters, 4),
+                        take("I", n_clusters, 4),
+                        take("f", n_clusters, 4),
+                        take("f", n_clusters, 4),
+                        take("I", n_clusters, 4),
+                    )
+                )
+
+        # 営業時間（ない古いスナップショットではNone）
+        self._schedules = None
+        self._schedule_table = None
+        if pos < len(self._mm):
+            (n_schedules,) = struct.unpack_from("<I", self._mm, pos)
+            pos += 4
+            self._schedules = take("I", n, 4)
+            self._schedule_table = take("B", n_schedules, OPENING_HOURS_BYTES)
+
+        # 文字列表は件数が少ない（ジャンル・駐車場）ものが大半のため、引いた分だけ保持する
+        self._str_cache: dict[int, str] = {}
+
+        # 飲食店がある行・列の範囲（近い順の検索の打ち切りに使う）
+        if n_cells > 0:
+            self._row_min = self._cells[0] // LNG_CELLS
+            self._row_max = self._cells[-1] // LNG_CELLS
+            cols = [c % LNG_CELLS for c in self._cells]
+            self._col_min = min(cols)
+            self._col_max = max(cols)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def has_opening_hours(self) -> bool:
+        """
+        営業時間で絞り込めるか
+        """
+        return self._schedules is not None
+
+    def query(
+        self,
+        lat: float,
+        lng: float,
+        lat_min: float,
+        lat_max: float,
+        lng_min: float,
+        lng_max: float,
+        limit: int = LIMIT_DEFAULT,
+        genres: list[str] | None = None,
+        parking: bool | None = None,
+        thumbnail: bool | None = None,
+        after: tuple[float, str] | None = None,
+        open_slot: int | None = None,
+    ) -> list[dict]:
+        """
+        範囲内の飲食店を中心からの距離・IDの順に取得
+
+        Parameters
+        ----------
+        lat: float
+            中心の緯度
+        lng: float
+            中心の経度
+        lat_min: float
+            最小緯度
+        lat_max: float
+            最大緯度
+        lng_min: float
+            最小経度
+        lng_max: float
+            最大経度
+        limit: int
+            最大件数
+        genres: list[str] | None
+            ジャンル名。指定時はいずれかに一致するもののみ
+        parking: bool | None
+            駐車場の有無。指定時は一致するもののみ
+        thumbnail: bool | None
+            サムネイルの有無。指定時は一致するもののみ
+        after: tuple[float, str] | None
+            前のページの最後の飲食店の距離（km）とID。指定時はそれより後のもののみ
+        open_slot: int | None
+            1週間の中でのコマ（opening_hours.week_slot）。指定時は営業中のもののみ
+
+        Returns
+        -------
+        list[dict]
+            get_restaurantsの飲食店データと同じ形式
+        """
+        lats = self._lats
+        lngs = self._lngs
+        cos_lat = math.cos(math.radians(lat))
+        genre_set = None if genres is None else set(genres)
+        filtered = (
+            genre_set is not None
+            or parking is not None
+            or thumbnail is not None
+            or open_slot is not None
+        )
+
+        # 前のページの最後の距離の前後（距離の二乗（度））。この間のみ（距離, ID）で比較する
+        if after is not None:
+            after_lo = ((after[0] - DISTANCE_UNIT) / KM_PER_DEG) ** 2
+            after_hi = ((after[0] + DISTANCE_UNIT) / KM_PER_DEG) ** 2
+
+        # 範囲内の行と距離の二乗（度）
+        found = []
+        for start, end in self.__row_ranges(lat_min, lat_max, lng_min, lng_max):
+            for i in range(start, end):
+                la = lats[i]
+                if la < lat_min or la > lat_max:
+                    continue
+                ln = lngs[i]
+                if ln < lng_min or ln > lng_max:
+                    continue
+                if filtered and not self.__match(i, genre_set, parking, thumbnail, open_slot):
+                    continue
+                x = (ln - lng) * cos_lat
+                y = la - lat
+                d = x * x + y * y
+                if after is not None and d <= after_hi:
+                    if d < after_lo or (self.__distance(d), self.__id(i)) <= after:
+                        continue
+                found.append((d, i))
+
+        # 距離の二乗で絞ってから、丸めた距離が最後と同じものを含めて（距離, ID）で並べ直す
+        top = heapq.nsmallest(limit, found)
+        if len(top) == limit:
+            bound = ((self.__distance(top[-1][0]) + DISTANCE_UNIT) / KM_PER_DEG) ** 2
+            top = [t for t in found if t[0] <= bound]
+        keyed = sorted((self.__distance(d), self.__id(i), i) for d, i in top)
+
+        return [self.__to_dict(i, distance) for distance, _, i in keyed[:limit]]
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        radius: float | None = None,
+        genres: list[str] | None = None,
+        parking: bool | None = None,
+        thumbnail: bool | None = None,
+        open_slot: int | None = None,
+    ) -> list[dict]:
+        """
+        中心から近い順にk件を取得
+
+        中心のセルからリング状に広げて探索し、
+        探索済みの範囲の外にk件目より近い飲食店がないと確定した時点で打ち切る
+
+        Parameters
+        ----------
+        lat: float
+            中心の緯度
+        lng: float
+            中心の経度
+        k: int
+            件数
+        radius: float | None
+            最大距離（km）
+        genres: list[str] | None
+            ジャンル名。指定時はいずれかに一致するもののみ
+        parking: bool | None
+            駐車場の有無。指定時は一致するもののみ
+        thumbnail: bool | None
+            サムネイルの有無。指定時は一致するもののみ
+        open_slot: int | None
+            1週間の中でのコマ（opening_hours.week_slot）。指定時は営業中のもののみ
+
+        Returns
+        -------
+        list[dict]
+            get_restaurantsの飲食店データと同じ形式
+        """
+        if self._n == 0:
+            return []
+
+        lats = self._lats
+        lngs = self._lngs
+        cos_lat = math.cos(math.radians(lat))
+        genre_set = None if genres is None else set(genres)
+        filtered = (
+            genre_set is not None
+            or parking is not None
+            or thumbnail is not None
+            or open_slot is not None
+        )
+        radius_deg2 = None if radius is None else (radius / KM_PER_DEG) ** 2
+
+        row = cell_row(lat)
+        col = cell_col(lng)
+
+        # k件目までの距離の二乗（度）を符号反転して持つ最大ヒープ
+        heap: list[tuple[float, int]] = []
+        r = 0
+        while True:
+            for lo, hi in ring_ranges(row, col, r):
+                i = bisect.bisect_left(self._cells, lo)
+                j = bisect.bisect_right(self._cells, hi)
+                for p in range(self._starts[i], self._starts[j]):
+                    x = (lngs[p] - lng) * cos_lat
+                    y = lats[p] - lat
+                    d = x * x + y * y
+                    if radius_deg2 is not None and d > radius_deg2:
+                        continue
+                    if len(heap) == k and d >= -heap[0][0]:
+                        continue
+                    if filtered and not self.__match(p, genre_set, parking, thumbnail, open_slot):
+                        continue
+                    if len(heap) == k:
+                        heapq.heapreplace(heap, (-d, p))
+                    else:
+                        heapq.heappush(heap, (-d, p))
+
+            # 探索済みの範囲の外にある飲食店までの最短距離（度）
+            bound = min(
+                lat - row_south(row - r),
+                row_south(row + r + 1) - lat,
+                (lng - col_west(col - r)) * cos_lat,
+                (col_west(col + r + 1) - lng) * cos_lat,
+            )
+            if len(heap) == k and -heap[0][0] <= bound * bound:
+                break
+            if radius_deg2 is not None and bound * bound >= radius_deg2:
+                break
+            if (
+                row - r <= self._row_min
+                and row + r >= self._row_max
+                and col - r <= self._col_min
+                and col + r >= self._col_max
+            ):
+                break
+            r += 1
+
+        return [
+            self.__to_dict(p, self.__distance(-d)) for d, p in sorted(heap, reverse=True)
+        ]
+
+    def count(
+        self, lat_min: float, lat_max: float, lng_min: float, lng_max: float
+    ) -> int:
+        """
+        範囲を覆うセルに属する飲食店の件数
+
+        セル単位で数えるため、範囲内の件数以上の値になる
+
+        Parameters
+        ----------
+        lat_min: float
+            最小緯度
+        lat_max: float
+            最大緯度
+        lng_min: float
+            最小経度
+        lng_max: float
+            最大経度
+
+        Returns
+        -------
+        int
+        """
+        return sum(
+            end - start
+            for start, end in self.__row_ranges(lat_min, lat_max, lng_min, lng_max)
+        )
+
+    def clusters(
+        self, lat_min: float, lat_max: float, lng_min: float, lng_max: float
+    ) -> list[dict] | None:
+        """
+        範囲を覆うクラスタを取得
+
+        範囲を覆うセル数が目安を超えない最も細かい階層を使う
+
+        Parameters
+        ----------
+        lat_min: float
+            最小緯度
+        lat_max: float
+            最大緯度
+        lng_min: float
+            最小経度
+        lng_max: float
+            最大経度
+
+        Returns
+        -------
+        list[dict] | None
+            latitude, longitude 重心, count 件数, genre_name 最も多いジャンル。
+            クラスタがないスナップショットではNone
+        """
+        if len(self._levels) == 0:
+            return None
+
+        row_min = cell_row(lat_min)
+        row_max = cell_row(lat_max)
+        col_min = cell_col(lng_min)
+        col_max = cell_col(lng_max)
+
+        # 階層の選択（すべて超える場合は最も粗い階層）
+        level = self._levels[-1]
+        for lv in self._levels:
+            f = lv[0]
+            cells = (row_max // f - row_min // f + 1) * (col_max // f - col_min // f + 1)
+            if cells <= CLUSTER_MAX_CELLS:
+                level = lv
+                break
+        factor, keys, counts, lats, lngs, genres = level
+
+        results = []
+        for row in range(row_min // factor, row_max // factor + 1):
+            lo = row * LNG_CELLS + col_min // factor
+            hi = row * LNG_CELLS + col_max // factor
+            i = bisect.bisect_left(keys, lo)
+            j = bisect.bisect_right(keys, hi)
+            for p in range(i, j):
+                results.append(
+                    {
+                        "latitude": round(lats[p], 6),
+                        "longitude": round(lngs[p], 6),
+                        "count": counts[p],
+                        "genre_name": self.__str(genres[p]),
+                    }
+                )
+
+        return results
+
+    def __to_dict(self, i: int, distance: float) -> dict:
+        """
+        行を飲食店データに変換
+
+        Parameters
+        ----------
+        i: int
+            行番号
+        distance: float
+            中心からの距離（km）
+
+        Returns
+        -------
+        dict
+        """
+        return {
+            "id": self.__id(i),
+            "name": self.__str(self._names[i]),
+            "latitude": round(self._lats[i], 6),
+            "longitude": round(self._lngs[i], 6),
+            "genre_name": self.__str(self._genres[i]),
+            "parking": self.__str(self._parkings[i]),
+            "is_thumbnail": self._thumbnails[i],
+            "distance": distance,
+        }
+
+    def __match(
+        self,
+        i: int,
+        genre_set: set[str] | None,
+        parking: bool | None,
+        thumbnail: bool | None,
+        open_slot: int | None,
+    ) -> bool:
+        """
+        行が絞り込みの条件に一致するか
+
+        Parameters
+        ----------
+        i: int
+            行番号
+        genre_set: set[str] | None
+            ジャンル名
+        parking: bool | None
+            駐車場の有無
+        thumbnail: bool | None
+            サムネイルの有無
+        open_slot: int | None
+            1週間の中でのコマ
+
+        Returns
+        -------
+        bool
+        """
+        if thumbnail is not None and thumbnail != (self._thumbnails[i] == 1):
+            return False
+        if genre_set is not None and self.__str(self._genres[i]) not in genre_set:
+            return False
+        if parking is not None and parking != self.__str(self._parkings[i]).startswith(
+            PARKING_AVAILABLE_PREFIX
+        ):
+            return False
+        if open_slot is not None:
+            if self._schedules is None:
+                raise Exception("営業時間がないスナップショット")
+            pos = self._schedules[i] * OPENING_HOURS_BYTES + (open_slot >> 3)
+            if self._schedule_table[pos] & (0x80 >> (open_slot & 7)) == 0:
+                return False
+
+        return True
+
+    def __id(self, i: int) -> str:
+        """
+        行のID
+
+        IDは行ごとに異なり引き直すことが少ないため、文字列表のキャッシュには入れない
+
+        Parameters
+        ----------
+        i: int
+            行番号
+
+        Returns
+        -------
+        str
+        """
+        index = self._ids[i]
+        start = self._str_base + self._str_offsets[index]
+        end = self._str_base + self._str_offsets[index + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    @staticmethod
+    def __distance(d: float) -> float:
+        """
+        距離の二乗（度）から距離（km）を求める
+
+        ページ送りで前のページの最後と比較できるよう、DBと同じく小数6桁に丸める
+
+        Parameters
+        ----------
+        d: float
+            距離の二乗（度）
+
+        Returns
+        -------
+        float
+        """
+        return round(KM_PER_DEG * math.sqrt(d), 6)
+
+    def __row_ranges(
+        self, lat_min: float, lat_max: float, lng_min: float, lng_max: float
+    ) -> list[tuple[int, int]]:
+        """
+        範囲を覆うセルに属する行の区間
+
+        行はセルID順に並んでいるため、グリッドの1行分のセルは連続した行になる。
+        行数がcover_rangesの上限を超える広い範囲も、飲食店のある行に絞ってグリッドの行ごとに探す
+        （全件を走査すると、表示範囲ではなく全国の件数に比例するため）
+
+        Returns
+        -------
+        list[tuple[int, int]]
+            行の区間（終端を含まない）
+        """
+        ranges = cover_ranges(lat_min, lat_max, lng_min, lng_max)
+        if ranges is None:
+            if self._n == 0:
+                return []
+            row_min = max(cell_row(lat_min), self._cells[0] // LNG_CELLS)
+            row_max = min(cell_row(lat_max), self._cells[-1] // LNG_CELLS)
+            col_min, col_max = cell_col(lng_min), cell_col(lng_max)
+            ranges = [
+                (r * LNG_CELLS + col_min, r * LNG_CELLS + col_max)
+                for r in range(row_min, row_max + 1)
+            ]
+
+        results = []
+        for lo, hi in ranges:
+            i = bisect.bisect_left(self._cells, lo)
+            j = bisect.bisect_right(self._cells, hi)
+            if i < j:
+                results.append((self._starts[i], self._starts[j]))
+
+        return results
+
+    def __str(self, index: int) -> str:
+        """
+        文字列表から取得
+
+        Parameters
+        ----------
+        index: int
+            文字列表の番号
+
+        Returns
+        -------
+        str
+        """
+        s = self._str_cache.get(index)
+        if s is None:
+            start = self._str_base + self._str_offsets[index]
+            end = self._str_base + self._str_offsets[index + 1]
+            s = self._mm[start:end].decode("utf-8")
+            self._str_cache[index] = s
+
+        return s
+
+
+def build(restaurants: list[dict]) -> bytes:
+    """
+    スナップショットの作成
+
+    バージョンは内容（バージョンを0としたもの）のハッシュとする
+
+    Parameters
+    ----------
+    restaurants: list[dict]
+        id, name, latitude, longitude, genre_name, parking, is_thumbnail,
+        open_slots（営業時間の16進数。省略・Noneは不明）
+
+    Returns
+    -------
+    bytes
+    """
+    # 文字列表
+    strings: dict[str, int] = {}
+
+    def intern(s: str | None) -> int:
+        s = s or ""
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    # セルID順に並べる
+    rows = sorted(
+        (
+            (cell_id(float(r["latitude"]), float(r["longitude"])), r)
+            for r in restaurants
+        ),
+        key=lambda t: (t[0], t[1]["id"]),
+    )
+    n = len(rows)
+
+    cells = []
+    starts = []
+    for i, (c, _) in enumerate(rows):
+        if len(cells) == 0 or cells[-1] != c:
+            cells.append(c)
+            starts.append(i)
+    starts.append(n)
+
+    lats = [float(r["latitude"]) for _, r in rows]
+    lngs = [float(r["longitude"]) for _, r in rows]
+    ids = [intern(r["id"]) for _, r in rows]
+    names = [intern(r["name"]) for _, r in rows]
+    genres = [intern(r["genre_name"]) for _, r in rows]
+    parkings = [intern(r["parking"]) for _, r in rows]
+    thumbnails = bytes(int(r["is_thumbnail"]) for _, r in rows)
+
+    # 営業時間（0番は不明として全て0）
+    table: dict[str, int] = {"0" * OPENING_HOURS_BYTES * 2: 0}
+    schedules = []
+    for _, r in rows:
+        h = r.get("open_slots")
+        if h is None:
+            schedules.append(0)
+            continue
+        h = h.lower()
+        if h not in table:
+            table[h] = len(table)
+        schedules.append(table[h])
+
+    # クラスタの集計
+    clusters = [struct.pack("<I", len(CLUSTER_FACTORS))]
+    for f in CLUSTER_FACTORS:
+        agg: dict[int, list] = {}
+        for (c, _), la, ln, g in zip(rows, lats, lngs, genres):
+            key = (c // LNG_CELLS // f) * LNG_CELLS + c % LNG_CELLS // f
+            a = agg.get(key)
+            if a is None:
+                a = agg[key] = [0, 0.0, 0.0, {}]
+            a[0] += 1
+            a[1] += la
+            a[2] += ln
+            a[3][g] = a[3].get(g, 0) + 1
+        keys = sorted(agg)
+        m = len(keys)
+        clusters.extend(
+            [
+                CLUSTER_LEVEL.pack(f, m),
+                struct.pack(f"<{m}I", *keys),
+                struct.pack(f"<{m}I", *[agg[k][0] for k in keys]),
+                struct.pack(f"<{m}f", *[agg[k][1] / agg[k][0] for k in keys]),
+                struct.pack(f"<{m}f", *[agg[k][2] / agg[k][0] for k in keys]),
+                struct.pack(f"<{m}I", *[max(agg[k][3], key=agg[k][3].get) for k in keys]),
+            ]
+        )
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    blob = b"".join(encoded)
+
+    sizes = (n, len(cells), len(encoded), len(blob))
+    body = b"".join(
+        [
+            struct.pack(f"<{len(cells)}I", *cells),
+            struct.pack(f"<{len(starts)}I", *starts),
+            struct.pack(f"<{n}f", *lats),
+            struct.pack(f"<{n}f", *lngs),
+            struct.pack(f"<{n}I", *ids),
+            struct.pack(f"<{n}I", *names),
+            struct.pack(f"<{n}I", *genres),
+            struct.pack(f"<{n}I", *parkings),
+            thumbnails,
+            b"\0" * (-n % 4),
+            struct.pack(f"<{len(offsets)}I", *offsets),
+            blob,
+            b"\0" * (-len(blob) % 4),
+            *clusters,
+            struct.pack("<I", len(table)),
+            struct.pack(f"<{n}I", *schedules),
+            *[bytes.fromhex(h) for h in table],
+        ]
+    )
+
+    h = hashlib.blake2b(HEADER.pack(MAGIC, 0, *sizes), digest_size=8)
+    h.update(body)
+    version = int.from_bytes(h.digest(), "little")
+
+    return HEADER.pack(MAGIC, version, *sizes) + body
+
+
+def read_version(header: bytes) -> int:
+    """
+    スナップショットの先頭（HEADER.sizeバイト以上）からバージョンを取得
+
+    Parameters
+    ----------
+    header: bytes
+
+    Returns
+    -------
+    int
+    """
+    magic, version, *_ = HEADER.unpack_from(header, 0)
+    if magic != MAGIC:
+        raise Exception("スナップショットの形式が不正")
+
+    return version
+
+
+class SnapshotLoader:
+    """
+    S3のスナップショットをコンテナ内に読み込む
+
+    確認間隔ごとにS3のETagを確認し、変わっていれば読み込み直す
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        path: str = "/tmp/restaurants.snapshot",
+        check_interval: float = 60,
+    ):
+        self._bucket = bucket
+        self._key = key
+        self._path = path
+        self._check_interval = check_interval
+
+        self._s3 = boto3.client("s3")
+        self._snapshot = None
+        self._etag = None
+        self._checked_at = None
+
+    def get(self) -> RestaurantSnapshot | None:
+        """
+        スナップショットを取得
+
+        Returns
+        -------
+        RestaurantSnapshot | None
+            S3にまだなければNone
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self._check_interval:
+            return self._snapshot
+        self._checked_at = now
+
+        try:
+            res = self._s3.head_object(Bucket=self._bucket, Key=self._key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return self._snapshot
+            raise
+
+        if res["ETag"] != self._etag:
+            # 読み込み中のスナップショットを壊さないよう別名で取得してから置き換える
+            tmp_path = f"{self._path}.tmp"
+            self._s3.download_file(self._bucket, self._key, tmp_path)
+            os.replace(tmp_path, self._path)
+            self._snapshot = RestaurantSnapshot(self._path)
+            self._etag = res["ETag"]
+
+        return self._snapshot
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import time
+import zlib
+from collections import OrderedDict
+import boto3
+from grid import cell_col, cell_row, col_west, row_south
+
+# 表示範囲を何タイル分に丸めるか（縦横それぞれ）
+SNAP_TILES = 4
+
+# 無効化に使うバージョンの階層（基本のセルを何個分まとめるか）
+VERSION_FACTORS = (16, 256)
+
+# 1回に確認するバージョンのタイル数の上限。超える場合は粗い階層を使う
+VERSION_TILES_MAX = 16
+
+# batch_get_itemで一度に取得できる最大件数
+BATCH_GET_MAX = 100
+
+# 未処理分の再試行回数
+BATCH_RETRY_MAX = 5
+
+
+class TileCache:
+    """
+    表示範囲をタイルに丸めた応答のキャッシュ
+
+    コンテナ内のLRU → DynamoDB（TTL付き）の順に参照する。
+    キーには範囲が含まれるタイルのバージョンを含め、
+    スクレイピングで飲食店が更新されるとそのタイルのバージョンを上げて無効化する。
+    テーブル名を指定しない場合はLRUのみとし、TTLでのみ無効化する
+    """
+
+    def __init__(
+        self,
+        table_name: str | None = None,
+        lru_size: int = 256,
+        ttl: int = 300,
+        version_check_interval: float = 10,
+    ):
+
+        # DynamoDBのテーブル名
+        self._table_name = table_name or None
+
+        # LRU（キー → (有効期限, 応答)）
+        self._lru: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lru_size = lru_size
+
+        # 応答の有効期間（秒）
+        self._ttl = ttl
+
+        # バージョンを確認し直す間隔（秒）と、確認済みのバージョン
+        self._version_check_interval = version_check_interval
+        self._versions: dict[str, tuple[float, int]] = {}
+
+        self._dynamodb = boto3.client("dynamodb") if self._table_name else None
+
+        self.reset_stats()
+
+    @property
+    def versioned(self) -> bool:
+        """
+        タイルのバージョンで無効化するか（DynamoDBを使う場合のみ）
+        """
+        return self._dynamodb is not None
+
+    def snap(
+        self, lat_min: float, lat_max: float, lng_min: float, lng_max: float
+    ) -> tuple[float, float, float, float]:
+        """
+        表示範囲をタイルの境界まで広げる
+
+        タイルの大きさは範囲が縦横それぞれ数タイルに収まるよう、基本のセルの2のべき乗倍とする
+
+        Parameters
+        ----------
+        lat_min: float
+            最小緯度
+        lat_max: float
+            最大緯度
+        lng_min: float
+            最小経度
+        lng_max: float
+            最大経度
+
+        Returns
+        -------
+        tuple[float, float, float, float]
+            最小緯度, 最大緯度, 最小経度, 最大経度
+        """
+        row_min, row_max = cell_row(lat_min), cell_row(lat_max)
+        col_min, col_max = cell_col(lng_min), cell_col(lng_max)
+        span = max(row_max - row_min + 1, col_max - col_min + 1)
+
+        f = 1
+        while span > SNAP_TILES * f:
+            f *= 2
+
+        return (
+            round(row_south(row_min // f * f), 6),
+            round(row_south((row_max // f + 1) * f), 6),
+            round(col_west(col_min // f * f), 6),
+            round(col_west((col_max // f + 1) * f), 6),
+        )
+
+    def key(
+        self, bbox: tuple[float, float, float, float], params: dict
+    ) -> str:
+        """
+        キャッシュのキー
+
+        Parameters
+        ----------
+        bbox: tuple[float, float, float, float]
+            丸めた範囲
+        params: dict
+            範囲以外の検索条件
+
+        Returns
+        -------
+        str
+        """
+        versions = self.__versions(bbox)
+        raw = json.dumps([bbox, params, versions], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        """
+        キャッシュから取得
+
+        Parameters
+        ----------
+        key: str
+            キャッシュのキー
+
+        Returns
+        -------
+        bytes | None
+            応答。なければNone
+        """
+        # LRU
+        start = time.perf_counter()
+        entry = self._lru.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._lru[key]
+            entry = None
+        self._stats["lru_ms"] += (time.perf_counter() - start) * 1000
+        if entry is not None:
+            self._lru.move_to_end(key)
+            self._stats["lru_hits"] += 1
+            return entry[1]
+
+        # DynamoDB
+        if self._dynamodb is not None:
+            start = time.perf_counter()
+            res = self._dynamodb.get_item(
+                TableName=self._table_name, Key={"key": {"S": f"c#{key}"}}
+            )
+            self._stats["dynamodb_ms"] += (time.perf_counter() - start) * 1000
+            item = res.get("Item")
+            if item is not None and int(item["expire_at"]["N"]) > time.time():
+                body = zlib.decompress(item["body"]["B"])
+                self._stats["dynamodb_hits"] += 1
+                self.__lru_put(key, body)
+                return body
+
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, body: bytes) -> None:
+        """
+        キャッシュへ保存
+
+        Parameters
+        ----------
+        key: str
+            キャッシュのキー
+        body: bytes
+            応答
+        """
+        self.__lru_put(key, body)
+
+        if self._dynamodb is not None:
+            self._dynamodb.put_item(
+                TableName=self._table_name,
+                Item={
+                    "key": {"S": f"c#{key}"},
+                    "body": {"B": zlib.compress(body)},
+                    "expire_at": {"N": str(int(time.time()) + self._ttl)},
+                },
+            )
+
+    def invalidate(self, points: list[tuple[float, float]]) -> None:
+        """
+        地点を含むタイルのバージョンを上げて、そのタイルを含むキャッシュを無効化
+
+        Parameters
+        ----------
+        points: list[tuple[float, float]]
+            緯度と経度の組
+        """
+        if self._dynamodb is None:
+            return
+
+        keys = set()
+        for lat, lng in points:
+            row, col = cell_row(lat), cell_col(lng)
+            for f in VERSION_FACTORS:
+                keys.add(f"v#{f}#{row // f}#{col // f}")
+
+        for k in sorted(keys):
+            self._dynamodb.update_item(
+                TableName=self._table_name,
+                Key={"key": {"S": k}},
+                UpdateExpression="ADD version :one",
+                ExpressionAttributeValues={":one": {"N": "1"}},
+            )
+
+    def stats(self) -> dict:
+        """
+        キャッシュのヒット状況
+
+        Returns
+        -------
+        dict
+            lru_hits: int LRUでのヒット数
+            dynamodb_hits: int DynamoDBでのヒット数
+            misses: int ヒットしなかった数
+            lru_ms: float LRUの参照時間の合計（ミリ秒）
+            dynamodb_ms: float DynamoDBの参照時間の合計（ミリ秒）
+            hit_rate: float ヒット率（%）
+        """
+        s = dict(self._stats)
+        lookups = s["lru_hits"] + s["dynamodb_hits"] + s["misses"]
+        hits = s["lru_hits"] + s["dynamodb_hits"]
+        s["hit_rate"] = hits / lookups * 100 if lookups > 0 else 0.0
+        return s
+
+    def reset_stats(self) -> None:
+        """
+        ヒット状況のリセット
+        """
+        self._stats = {
+            "lru_hits": 0,
+            "dynamodb_hits": 0,
+            "misses": 0,
+            "lru_ms": 0.0,
+            "dynamodb_ms": 0.0,
+        }
+
+    def __versions(self, bbox: tuple[float, float, float, float]) -> list[int]:
+        """
+        範囲に含まれるタイルのバージョン
+
+        確認し直す間隔内であればコンテナ内の値を使う
+
+        Parameters
+        ----------
+        bbox: tuple[float, float, float, float]
+            丸めた範囲
+
+        Returns
+        -------
+        list[int]
+        """
+        if self._dynamodb is None:
+            return []
+
+        lat_min, lat_max, lng_min, lng_max = bbox
+        row_min, row_max = cell_row(lat_min), cell_row(lat_max)
+        col_min, col_max = cell_col(lng_min), cell_col(lng_max)
+
+        # タイル数が上限を超えない最も細かい階層
+        for f in VERSION_FACTORS:
+            rows = range(row_min // f, row_max // f + 1)
+            cols = range(col_min // f, col_max // f + 1)
+            if len(rows) * len(cols) <= VERSION_TILES_MAX:
+                break
+        keys = [f"v#{f}#{r}#{c}" for r in rows for c in cols]
+
+        # 確認し直す必要のあるものだけDynamoDBから取得
+        now = time.monotonic()
+        stale = [
+            k
+            for k in keys
+            if k not in self._versions
+            or now - self._versions[k][0] >= self._version_check_interval
+        ]
+        for i in range(0, len(stale), BATCH_GET_MAX):
+            chunk = stale[i : i + BATCH_GET_MAX]
+            found = {}
+            request = {
+                self._table_name: {
+                    "Keys": [{"key": {"S": k}} for k in chunk],
+                    "ProjectionExpression": "#k, version",
+                    "ExpressionAttributeNames": {"#k": "key"},
+                }
+            }
+
+            # 未処理分は待ってから再試行
+            for retry in range(BATCH_RETRY_MAX):
+                res = self._dynamodb.batch_get_item(RequestItems=request)
+                for item in res["Responses"].get(self._table_name, []):
+                    found[item["key"]["S"]] = int(item["version"]["N"])
+                request = res.get("UnprocessedKeys", {})
+                if len(request) == 0:
+                    break
+                time.sleep(0.1 * 2**retry)
+            else:
+                raise Exception("タイルのバージョンの取得に失敗。")
+
+            # 未登録のタイルは更新されたことがないためバージョン0
+            for k in chunk:
+                self._versions[k] = (now, found.get(k, 0))
+
+        return [self._versions[k][1] for k in keys]
+
+    def __lru_put(self, key: str, body: bytes) -> None:
+        """
+        LRUへ格納
+
+        Parameters
+        ----------
+        key: str
+            キャッシュのキー
+        body: bytes
+            応答
+        """
+        self._lru[key] = (time.monotonic() + self._ttl, body)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import math
+
+# 飲食店を個別に含めるズームレベル。これより拡大した表示ではこのタイルを拡大して使う
+POINT_ZOOM = 14
+
+# クラスタを含めるズームレベル
+CLUSTER_ZOOMS = range(6, POINT_ZOOM)
+
+# クラスタのタイル内の分割数（2のべき乗の指数。3は8×8）
+BIN_BITS = 3
+
+# Webメルカトルで表示できる緯度の上限
+MAX_LAT = 85.05112878
+
+# 座標の計算に使うズームレベル（クラスタの最も細かい分割と同じ）
+BASE_ZOOM = POINT_ZOOM + BIN_BITS
+
+
+def pixel(lat: float, lng: float, z: int = BASE_ZOOM) -> tuple[int, int]:
+    """
+    緯度経度をズームレベルzのタイル番号に変換
+
+    >>> pixel(35.681236, 139.767125, 14)
+    (14552, 6451)
+
+    Parameters
+    ----------
+    lat: float
+        緯度
+    lng: float
+        経度
+    z: int
+        ズームレベル
+
+    Returns
+    -------
+    tuple[int, int]
+        x, y
+    """
+    n = 1 << z
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = int((lng + 180) / 360 * n)
+    s = math.sin(math.radians(lat))
+    y = int((0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def render(restaurants: list[dict]) -> dict[str, bytes]:
+    """
+    飲食店をz/x/yのタイルピラミッド（GeoJSON）に描画
+
+    POINT_ZOOMのタイルには飲食店を個別に、それより縮小したタイルには
+    タイルを分割した区画ごとのクラスタ（件数・重心・最も多いジャンル）を含める。
+    内容が同じなら同じバイト列になるよう、地物はID・区画の順に並べる
+
+    Parameters
+    ----------
+    restaurants: list[dict]
+        id, name, latitude, longitude, genre_name, parking, is_thumbnail
+
+    Returns
+    -------
+    dict[str, bytes]
+        タイルのパス（z/x/y.geojson） → 内容
+    """
+    shift = BASE_ZOOM - POINT_ZOOM
+    points: dict[tuple[int, int], list] = {}
+    bins: dict[tuple[int, int, int], list] = {}
+    for r in sorted(restaurants, key=lambda r: r["id"]):
+        lat = float(r["latitude"])
+        lng = float(r["longitude"])
+        px, py = pixel(lat, lng)
+
+        points.setdefault((px >> shift, py >> shift), []).append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]},
+                "properties": {
+                    "id": r["id"],
+                    "name": r["name"],
+                    "genre_name": r["genre_name"],
+                    "parking": r["parking"],
+                    "is_thumbnail": int(r["is_thumbnail"]),
+                },
+            }
+        )
+
+        # 区画はズームレベルz + BIN_BITSのタイルに相当する
+        for z in CLUSTER_ZOOMS:
+            s = BASE_ZOOM - z - BIN_BITS
+            key = (z, px >> s, py >> s)
+            b = bins.get(key)
+            if b is None:
+                b = bins[key] = [0, 0.0, 0.0, {}]
+            b[0] += 1
+            b[1] += lat
+            b[2] += lng
+            b[3][r["genre_name"]] = b[3].get(r["genre_name"], 0) + 1
+
+    tiles: dict[str, list] = {}
+    for (x, y), features in points.items():
+        tiles[f"{POINT_ZOOM}/{x}/{y}.geojson"] = features
+    for z, bx, by in sorted(bins):
+        count, lat_sum, lng_sum, genres = bins[(z, bx, by)]
+        path = f"{z}/{bx >> BIN_BITS}/{by >> BIN_BITS}.geojson"
+        tiles.setdefault(path, []).append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [round(lng_sum / count, 6), round(lat_sum / count, 6)],
+                },
+                "properties": {
+                    "count": count,
+                    "genre_name": max(sorted(genres), key=genres.get),
+                },
+            }
+        )
+
+    return {
+        path: json.dumps(
+            {"type": "FeatureCollection", "features": features},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        for path, features in tiles.items()
+    }
+
+
+def digest(body: bytes) -> str:
+    """
+    タイルの内容のハッシュ（変更の検出用）
+
+    Parameters
+    ----------
+    body: bytes
+        タイルの内容
+
+    Returns
+    -------
+    str
+    """
+    return hashlib.md5(body).hexdigest()
@@ -0,0 +1,284 @@
+import re
+from pydantic import BaseModel
+from html_parser import HtmlParser
+
+
+class Abstract(BaseModel):
+    """
+    概要情報構造体
+    """
+
+    id: str
+    name: str
+    thumbnail_url: str | None
+
+
+class Image(BaseModel):
+    """
+    画像構造体
+    """
+
+    url: str
+    alt: str
+
+
+class Detail(BaseModel):
+    """
+    詳細情報構造体
+    """
+
+    genre: str
+    sub_genre: str | None
+    address: str
+    latitude: float
+    longitude: float
+    open_hours: str
+    close_days: str
+    parking: str
+
+
+class HotpepperExtractor:
+    """
+    ホットペッパーのページから情報を抽出
+
+    HTTP通信は行わず、取得済みのHTMLのみを扱う
+    """
+
+    def __init__(self, backend: str | None = None):
+        self._parser = HtmlParser(backend)
+
+    def get_page_num(self, content: bytes | str) -> int:
+        """
+        一覧ページからページ数を取得
+
+        Parameters
+        ----------
+        content: bytes | str
+            一覧ページのHTML
+
+        Returns
+        -------
+        int
+            ページ数
+        """
+        soup = self._parser.parse(content, ["searchResultPageLink"])
+
+        lh27 = soup.select_one(".searchResultPageLink .lh27")
+        if lh27 is None:
+            raise Exception(
+                f"ページ数の取得に失敗しました。.searchResultPageLink .lh27がありません。"
+            )
+        match = re.search(r"1/([0-9]+)ページ", lh27.text)
+        if match is None:
+            raise Exception(
+                f"「1/([0-9]+)ページ」の形でページ数を取得できませんでした。{lh27.text}"
+            )
+
+        return int(match.group(1))
+
+    def get_abstracts(self, content: bytes | str, url: str) -> list[Abstract]:
+        """
+        一覧ページから概要情報を取得
+
+        Parameters
+        ----------
+        content: bytes | str
+            一覧ページのHTML
+        url: str
+            一覧ページのURL。エラーメッセージ用
+
+        Returns
+        -------
+        list[Abstract]
+        """
+        soup = self._parser.parse(content, ["shopDetailCoreInner"])
+
+        restaurants = soup.select(".shopDetailCoreInner")
+        if len(restaurants) == 0:
+            raise Exception(f"「.shopDetailCoreInner」が存在しません。{url}")
+
+        # サムネ画像と飲食店IDを小エリア名を取得
+        results = []
+        for r in restaurants:
+            # サムネ画像
+            thumbnail_url = None
+            img = r.select_one(".shopPhotoMain img")
+            if img is not None:
+                thumbnail_url = img.get("src")
+
+            # 飲食店ID
+            link = r.select_one(".shopDetailStoreName a")
+            if link is None:
+                raise Exception(f"「.shopDetailStoreName a」が存在しません。{url}")
+            match = re.search(r"/str(J\d+)/", link.get("href"))
+            if match is None:
+                raise Exception(f"飲食店IDの取得に失敗しました。{str(link)}")
+            id = match.group(1)
+
+            # 飲食店名
+            name = link.text.strip()
+
+            # 結果配列に格納
+            results.append(
+                Abstract(
+                    id=id,
+                    name=name,
+                    thumbnail_url=thumbnail_url,
+                )
+            )
+
+        return results
+
+    def get_images(self, content: bytes | str, id: str) -> list[Image]:
+        """
+        写真一覧ページから画像情報を取得
+
+        Parameters
+        ----------
+        content: bytes | str
+            写真一覧ページのHTML
+        id: str
+            飲食店ID。エラーメッセージ用
+
+        Returns
+        -------
+        list[Image]
+        """
+        soup = self._parser.parse(content, ["jsc-photo-list", "jsc-photo-list-elm"])
+
+        # 「.jsc-photo-list」と「.jsc-photo-list-elm」での検索
+        jsc_photo_list = soup.select(".jsc-photo-list")
+        jsc_photo_list_elm = soup.select(".jsc-photo-list-elm")
+
+        # いずれも取得できていなければエラー
+        if len(jsc_photo_list) == 0 and len(jsc_photo_list_elm) == 0:
+            raise Exception(f"飲食店画像一覧の取得に失敗。{id}")
+
+        # 画像URLとaltを格納
+        img_infos: list[Image] = []
+        for elm in jsc_photo_list:
+            img_path = elm.get("data-src")
+            if img_path is None:
+                raise Exception(f"飲食店画像URLの取得に失敗。{str(elm)}")
+
+            # URLが相対パスの場合と絶対パスの場合がある
+            if img_path.startswith("https://"):
+                img_url = img_path
+            else:
+                img_url = f"https://www.hotpepper.jp{img_path}"
+            img_infos.append(Image(url=img_url, alt=elm.get("data-alt")))
+        for elm in jsc_photo_list_elm:
+            img_infos.append(Image(url=elm.get("data-src"), alt=elm.get("data-alt")))
+
+        return img_infos
+
+    def get_detail(self, content: bytes | str, url: str) -> Detail:
+        """
+        詳細ページから詳細情報を取得
+
+        緯度・経度は住所から別途取得するため、0で返す
+
+        Parameters
+        ----------
+        content: bytes | str
+            詳細ページのHTML
+        url: str
+            詳細ページのURL。エラーメッセージ用
+
+        Returns
+        -------
+        Detail
+        """
+        # 返り値の初期化
+        result = {
+            "genre": "",
+            "sub_genre": None,
+            "address": "",
+            "latitude": 0,
+            "longitude": 0,
+            "open_hours": "",
+            "close_days": "",
+            "parking": "",
+        }
+
+        soup = self._parser.parse(content, ["jscShopInfoInnerSection", "infoTable"])
+
+        # ジャンル・サブジャンル
+        section_blocks = soup.select(".jscShopInfoInnerSection .shopInfoInnerSectionBlock")
+        if len(section_blocks) == 0:
+            raise Exception(f"ジャンル・サブジャンルの取得失敗。{url}")
+        for dl_tag in section_blocks:
+            dt = dl_tag.select_one("dt")
+            if dt is None:
+                raise Exception(
+                    f"ジャンル・サブジャンルのセクションタイトルの取得失敗。{url}\n{str(dl_tag)}"
+                )
+
+            # ジャンルでなければスキップ
+            if dt.text != "ジャンル":
+                continue
+
+            genre_titles_dom = dl_tag.select(".shopInfoInnerItem")
+            if len(genre_titles_dom) == 0:
+                raise Exception(
+                    f"ジャンル・サブジャンルの値の取得失敗。{url}\n「.shopInfoInnerItemTitle」が存在しない。"
+                )
+
+            # ジャンル
+            genre_link = genre_titles_dom[0].select_one("a")
+            if genre_link is None:
+                raise Exception(f"ジャンルの値の取得失敗。{url}\n<a>が存在しない。")
+            result["genre"] = genre_link.text.strip()
+
+            # サブジャンル
+            # JSレンダリングされているため取得不可
+
+        # 住所・営業時間・定休日
+        info_tables = soup.select(".infoTable")
+        if len(info_tables) == 0:
+            raise Exception(
+                f"住所・営業時間・定休日の取得失敗。{url}\nページ下部に詳細情報がない。"
+            )
+        for table in info_tables:
+
+            # 飲食店情報の表でなければスキップ
+            if table["summary"] != "お店情報" and table["summary"] != "設備":
+                continue
+
+            # 行の取得
+            trs = table.select("tr")
+            if len(trs) == 0:
+                raise Exception(f"お店情報の表に行がない。{url}")
+
+            # 項目名
+            for tr in trs:
+                th = tr.select_one("th")
+                if th is None:
+                    raise Exception(f"お店情報に項目がない行がある。{url}")
+
+                # 取得対象でなければスキップ
+                item_name = th.text.strip()
+                if item_name not in ["住所", "営業時間", "定休日", "駐車場"]:
+                    continue
+
+                td = tr.select_one("td")
+                if td is None:
+                    raise Exception(f"住所の取得に失敗。{url}\n{str(tr)}")
+
+                # 住所
+                if item_name == "住所":
+                    result["address"] = td.text.strip()
+
+                # 営業時間
+                if item_name == "営業時間":
+                    result["open_hours"] = td.decode_contents(formatter="html").strip()
+
+                # 定休日
+                if item_name == "定休日":
+                    result["close_days"] = td.decode_contents(formatter="html").strip()
+
+                # 駐車場
+                if item_name == "駐車場":
+                    result["parking"] = td.text.strip()
+
+        return Detail(**result)
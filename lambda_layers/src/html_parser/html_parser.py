@@ -0,0 +1,201 @@
+import os
+from bs4 import BeautifulSoup, SoupStrainer
+
+# バックエンド：selectolax（lexbor）で対象ブロックを切り出してからBeautifulSoupに渡す
+BACKEND_SELECTOLAX = "selectolax"
+
+# バックエンド：lxml
+BACKEND_LXML = "lxml"
+
+# バックエンド：標準ライブラリのhtml.parser
+BACKEND_HTML_PARSER = "html.parser"
+
+# 自動選択時の優先順
+BACKEND_PRIORITY = [BACKEND_SELECTOLAX, BACKEND_LXML, BACKEND_HTML_PARSER]
+
+
+class HtmlParser:
+    """
+    HTMLパーサー
+
+    バックエンドを差し替え可能にし、対象ブロックのみをBeautifulSoupのツリーにする。
+    返り値はいずれのバックエンドでもBeautifulSoupなので、呼び出し側のselectはそのまま使える。
+    """
+
+    def __init__(self, backend: str | None = None):
+
+        # 指定がなければ環境変数、それもなければ自動選択
+        if backend is None:
+            backend = os.environ.get("HTML_PARSER_BACKEND", "auto")
+
+        self._backend = self.__resolve_backend(backend)
+
+        # BeautifulSoupのツリービルダー
+        # selectolaxは切り出しにのみ使うため、ツリーの構築はlxml、なければhtml.parser
+        self._tree_builder = self._backend
+        if self._backend == BACKEND_SELECTOLAX:
+            self._tree_builder = (
+                BACKEND_LXML
+                if self.is_available(BACKEND_LXML)
+                else BACKEND_HTML_PARSER
+            )
+
+    @property
+    def backend(self) -> str:
+        """
+        使用中のバックエンド名
+
+        Returns
+        -------
+        str
+        """
+        return self._backend
+
+    def parse(self, content: bytes | str, classes: list[str] | None = None) -> BeautifulSoup:
+        """
+        HTMLを解析
+
+        Parameters
+        ----------
+        content: bytes | str
+            HTML
+        classes: list[str] | None
+            ツリーにするブロックのクラス名リスト。Noneならページ全体
+
+        Returns
+        -------
+        BeautifulSoup
+        """
+        # ページ全体
+        if classes is None:
+            return BeautifulSoup(content, self._tree_builder)
+
+        # selectolaxで対象ブロックを切り出す
+        if self._backend == BACKEND_SELECTOLAX:
+            return BeautifulSoup(
+                self.__extract_blocks(content, classes), self._tree_builder
+            )
+
+        # SoupStrainerで対象ブロックのみを構築
+        targets = set(classes)
+        strainer = SoupStrainer(class_=lambda v: self.__has_class(v, targets))
+        return BeautifulSoup(content, self._tree_builder, parse_only=strainer)
+
+    @staticmethod
+    def is_available(backend: str) -> bool:
+        """
+        バックエンドが使用可能か
+
+        Parameters
+        ----------
+        backend: str
+            バックエンド名
+
+        Returns
+        -------
+        bool
+        """
+        try:
+            if backend == BACKEND_SELECTOLAX:
+                import selectolax.lexbor  # noqa: F401
+            elif backend == BACKEND_LXML:
+                import lxml.etree  # noqa: F401
+            elif backend != BACKEND_HTML_PARSER:
+                return False
+        except ImportError:
+            return False
+
+        return True
+
+    def __resolve_backend(self, backend: str) -> str:
+        """
+        バックエンドの決定
+
+        Parameters
+        ----------
+        backend: str
+            バックエンド名。"auto"なら使用可能なものを優先順に選択
+
+        Returns
+        -------
+        str
+
+        Raises
+        ------
+        Exception
+        """
+        if backend == "auto":
+            for b in BACKEND_PRIORITY:
+                if self.is_available(b):
+                    return b
+
+        if backend not in BACKEND_PRIORITY:
+            raise Exception(f"HTMLパーサーのバックエンドが不正です。{backend}")
+
+        # 明示指定で使用できなければエラー
+        if not self.is_available(backend):
+            raise Exception(f"HTMLパーサーのバックエンドが使用できません。{backend}")
+
+        return backend
+
+    def __extract_blocks(self, content: bytes | str, classes: list[str]) -> str:
+        """
+        selectolaxで対象ブロックのHTMLを切り出す
+
+        Parameters
+        ----------
+        content: bytes | str
+            HTML
+        classes: list[str]
+            クラス名リスト
+
+        Returns
+        -------
+        str
+            対象ブロックを文書順に連結したHTML
+        """
+        from selectolax.lexbor import LexborHTMLParser
+
+        tree = LexborHTMLParser(content)
+        nodes = tree.css(", ".join([f".{c}" for c in classes]))
+
+        # 入れ子で一致したブロックは外側に含まれるため除外
+        node_ids = {n.mem_id for n in nodes}
+        blocks = []
+        for n in nodes:
+            parent = n.parent
+            is_nested = False
+            while parent is not None:
+                if parent.mem_id in node_ids:
+                    is_nested = True
+                    break
+                parent = parent.parent
+            if not is_nested:
+                blocks.append(n.html)
+
+        return "".join(blocks)
+
+    @staticmethod
+    def __has_class(value: str | list | None, targets: set[str]) -> bool:
+        """
+        class属性に対象のクラス名が含まれるか
+
+        解析中のclass属性は空白区切りの文字列のため、分割して比較する
+
+        Parameters
+        ----------
+        value: str | list | None
+            class属性
+        targets: set[str]
+            対象のクラス名
+
+        Returns
+        -------
+        bool
+        """
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+
+        return not targets.isdisjoint(value)
@@ -0,0 +1,87 @@
+import json
+import boto3
+from botocore.config import Config
+
+# 1回の送信に含める最大件数。超えた分は件数のみ送る
+ERRORS_MAX = 20
+
+# メッセージの最大文字数（非同期呼び出しのペイロードの上限256KBに収める）
+ERROR_MSG_MAX_CHARS = 2000
+
+# 送信のタイムアウト（秒）と試行回数。ハンドラーの応答を待たせない
+INVOKE_CONFIG = Config(
+    connect_timeout=1, read_timeout=2, retries={"max_attempts": 2, "mode": "standard"}
+)
+
+
+class ErrorReporter:
+    """
+    エラーをコンテナ内に溜め、1回の呼び出しごとにまとめてerror_commonへ送る
+
+    送信は非同期呼び出し（InvocationType="Event"）のため、error_commonの処理（ログ・LINE通知）を待たない。
+    送信に失敗した場合は溜めたまま次の呼び出しで送り直す
+    """
+
+    def __init__(self, function_arn: str, max_errors: int = ERRORS_MAX):
+
+        # 送信先（error_common）のARN
+        self._function_arn = function_arn
+
+        # 溜めておく最大件数
+        self._max_errors = max_errors
+
+        # 溜めたエラーと、上限を超えて捨てた件数
+        self._errors: list[dict] = []
+        self._dropped = 0
+
+        # Lambdaクライアント（最初の送信時に作成）
+        self._client = None
+
+    def __len__(self) -> int:
+        return len(self._errors)
+
+    def record(self, function_name: str, msg: str) -> None:
+        """
+        エラーを記録
+
+        上限を超えた場合は、原因に近い先のエラーを残し、後のエラーは件数のみ数える
+
+        Parameters
+        ----------
+        function_name: str
+            エラーが発生したLambda関数名
+        msg: str
+            メッセージ
+        """
+        if len(self._errors) >= self._max_errors:
+            self._dropped += 1
+            return
+
+        self._errors.append(
+            {"function_name": function_name, "msg": msg[:ERROR_MSG_MAX_CHARS]}
+        )
+
+    def flush(self) -> None:
+        """
+        溜めたエラーをまとめて送信
+
+        送信に失敗しても例外は投げない
+        """
+        if len(self._errors) == 0:
+            return
+
+        payload = {"errors": self._errors, "dropped": self._dropped}
+        try:
+            if self._client is None:
+                self._client = boto3.client("lambda", config=INVOKE_CONFIG)
+            self._client.invoke(
+                FunctionName=self._function_arn,
+                InvocationType="Event",
+                Payload=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            )
+        except Exception as e:
+            print(f"エラーの送信に失敗しました。{e}")
+            return
+
+        self._errors = []
+        self._dropped = 0
@@ -0,0 +1,116 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import boto3
+
+# プロファイルの出力先ディレクトリ（S3の指定がない場合）
+PROFILE_DIR = "/tmp/profiles"
+
+# ログに出力する関数の件数
+PROFILE_LOG_LINES = 30
+
+
+def profile_handler(handler):
+    """
+    Lambdaハンドラーのプロファイリング
+
+    環境変数PROFILE_SAMPLE_RATE（0〜1）の割合で呼び出しをcProfileで計測し、
+    pstats形式で保存する。未設定・0なら計測しない。
+    PROFILE_S3_BUCKETがあればS3（PROFILE_S3_PREFIX配下）に、なければ/tmpに保存する。
+    ファイル名は関数名とリクエストIDとする
+
+    Parameters
+    ----------
+    handler: Callable
+        lambda_handler
+
+    Returns
+    -------
+    Callable
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+
+        # 計測対象でなければそのまま実行
+        if not is_sampled():
+            return handler(event, context)
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(handler, event, context)
+        finally:
+            # プロファイルの保存に失敗しても処理結果には影響させない
+            try:
+                save_profile(profile, context)
+            except Exception as e:
+                print(f"プロファイルの保存に失敗しました。{e}")
+
+    return wrapper
+
+
+def is_sampled() -> bool:
+    """
+    今回の呼び出しを計測するか
+
+    Returns
+    -------
+    bool
+    """
+    try:
+        rate = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    except ValueError:
+        return False
+
+    return rate > 0 and random.random() < rate
+
+
+def save_profile(profile: cProfile.Profile, context) -> str:
+    """
+    プロファイルの保存
+
+    累積時間の上位をログにも出力する
+
+    Parameters
+    ----------
+    profile: cProfile.Profile
+        計測結果
+    context: LambdaContext
+        Lambdaコンテキスト
+
+    Returns
+    -------
+    str
+        保存先のパスまたはS3のURI
+    """
+    file_name = f"{context.function_name}_{context.aws_request_id}.pstats"
+
+    # 累積時間の上位をログに出力
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats("cumulative").print_stats(PROFILE_LOG_LINES)
+    print(stream.getvalue())
+
+    # /tmpへ保存
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, file_name)
+    stats.dump_stats(path)
+
+    # S3の指定がなければ/tmpのみ
+    bucket = os.environ.get("PROFILE_S3_BUCKET", "")
+    if bucket == "":
+        print(f"プロファイルを保存しました。{path}")
+        return path
+
+    # S3へアップロード
+    prefix = os.environ.get("PROFILE_S3_PREFIX", "profiles").strip("/")
+    key = f"{prefix}/{file_name}"
+    boto3.client("s3").upload_file(path, bucket, key)
+    os.remove(path)
+
+    uri = f"s3://{bucket}/{key}"
+    print(f"プロファイルを保存しました。{uri}")
+    return uri
@@ -0,0 +1,164 @@
+import json
+import time
+from contextlib import contextmanager
+
+
+class Stage:
+    """
+    処理段階ごとの計測値
+    """
+
+    def __init__(self):
+        # 所要時間（ミリ秒）
+        self.duration = 0.0
+
+        # 実行回数
+        self.count = 0
+
+        # 扱ったバイト数
+        self.bytes = 0
+
+    def add_bytes(self, n: int) -> None:
+        """
+        バイト数を加算
+
+        Parameters
+        ----------
+        n: int
+            バイト数
+        """
+        self.bytes += n
+
+
+class StageTimer:
+    """
+    処理段階ごとの所要時間・回数・バイト数を計測し、
+    CloudWatch埋め込みメトリクスフォーマット（EMF）で1レコードにまとめて出力する
+
+    同じ段階を複数回計測した場合は合算する
+    """
+
+    def __init__(self, namespace: str):
+        # メトリクスの名前空間
+        self._namespace = namespace
+
+        # 段階名ごとの計測値
+        self._stages: dict[str, Stage] = {}
+
+        # 段階に属さないメトリクス。名前ごとの値と単位
+        self._metrics: dict[str, tuple[float, str]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        段階の計測
+
+        例外が発生した場合も、そこまでの所要時間を記録する
+
+        Parameters
+        ----------
+        name: str
+            段階名
+
+        Yields
+        ------
+        Stage
+            バイト数の加算用
+        """
+        s = self._stages.setdefault(name, Stage())
+        start = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.duration += (time.perf_counter() - start) * 1000
+            s.count += 1
+
+    def put_metric(self, name: str, value: float, unit: str = "Count") -> None:
+        """
+        段階に属さないメトリクスを記録
+
+        同じ名前で記録した場合は上書きする
+
+        Parameters
+        ----------
+        name: str
+            メトリクス名
+        value: float
+            値
+        unit: str
+            単位
+        """
+        self._metrics[name] = (value, unit)
+
+    def emit(self, dimensions: dict[str, str]) -> None:
+        """
+        計測値をEMFで標準出力に書き出し、リセットする
+
+        Parameters
+        ----------
+        dimensions: dict[str, str]
+            ディメンション。関数名など
+        """
+        # 計測していなければ何もしない
+        if len(self._stages) == 0 and len(self._metrics) == 0:
+            return
+
+        print(json.dumps(self.to_emf(dimensions), ensure_ascii=False))
+        self._stages = {}
+        self._metrics = {}
+
+    def to_emf(self, dimensions: dict[str, str]) -> dict:
+        """
+        EMFのレコードを作成
+
+        Parameters
+        ----------
+        dimensions: dict[str, str]
+            ディメンション
+
+        Returns
+        -------
+        dict
+        """
+        metrics = []
+        values = {}
+        total = 0.0
+        for name, s in self._stages.items():
+            metrics.extend(
+                [
+                    {"Name": f"{name}_duration", "Unit": "Milliseconds"},
+                    {"Name": f"{name}_count", "Unit": "Count"},
+                ]
+            )
+            values[f"{name}_duration"] = round(s.duration, 3)
+            values[f"{name}_count"] = s.count
+            total += s.duration
+
+            # バイト数は記録した段階のみ
+            if s.bytes > 0:
+                metrics.append({"Name": f"{name}_bytes", "Unit": "Bytes"})
+                values[f"{name}_bytes"] = s.bytes
+
+        # 計測した段階の合計
+        metrics.append({"Name": "stages_duration", "Unit": "Milliseconds"})
+        values["stages_duration"] = round(total, 3)
+
+        # 段階に属さないメトリクス
+        for name, (value, unit) in self._metrics.items():
+            metrics.append({"Name": name, "Unit": unit})
+            values[name] = value
+
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self._namespace,
+                        "Dimensions": [list(dimensions.keys())],
+                        "Metrics": metrics,
+                    }
+                ],
+            },
+            **dimensions,
+            **values,
+        }